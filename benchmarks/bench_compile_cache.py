@@ -0,0 +1,58 @@
+import tempfile
+from time import perf_counter
+
+from ergo_python_appkit.appkit import ErgoAppKit
+from paideia_contracts.contracts.staking import compilation
+from paideia_contracts.contracts.staking import (
+    AHTConfig,
+    EGIOConfig,
+    Ergo_Crux_LPConfig,
+    NETAConfig,
+    PaideiaConfig,
+    PaideiaTestConfig,
+    ergopadv5testConfig,
+)
+
+configs = [
+    PaideiaConfig,
+    PaideiaTestConfig,
+    ergopadv5testConfig,
+    EGIOConfig,
+    NETAConfig,
+    AHTConfig,
+    Ergo_Crux_LPConfig,
+]
+
+
+def buildAll(appKit: ErgoAppKit) -> float:
+    # Measure the disk cache, not the in-process contract registry
+    compilation.contractRegistry.clear()
+    start = perf_counter()
+    for config in configs:
+        config(appKit)
+    return perf_counter() - start
+
+
+if __name__ == "__main__":
+    appKit = ErgoAppKit(
+        "http://213.239.193.208:9053", "mainnet", "https://api.ergoplatform.com/"
+    )
+    ergoTreeFromTemplate = compilation.ergoTreeFromTemplate
+    compilation.ergoTreeFromTemplate = lambda appKit, script, mapping: None
+    with tempfile.TemporaryDirectory() as cacheDir:
+        # First pass only warms up the JVM so cold/warm compare cache effects
+        compilation.ergoTreeCache = None
+        buildAll(appKit)
+        compilation.ergoTreeCache = compilation.ErgoTreeCache(cacheDir)
+        cold = buildAll(appKit)
+        warm = buildAll(appKit)
+    compilation.ergoTreeCache = None
+    compilation.ergoTreeFromTemplate = ergoTreeFromTemplate
+    templates = buildAll(appKit)
+    print(f"{len(configs)} configs, {len(configs) * 8} contracts")
+    print(f"cold cache: {cold:.3f}s ({cold / len(configs) * 1000:.1f}ms per config)")
+    print(f"warm cache: {warm:.3f}s ({warm / len(configs) * 1000:.1f}ms per config)")
+    print(f"speedup:    {cold / warm:.1f}x")
+    print(
+        f"templates:  {templates:.3f}s ({templates / len(configs) * 1000:.1f}ms per config, {cold / templates:.1f}x)"
+    )
@@ -0,0 +1,47 @@
+import random
+from time import perf_counter
+
+from ergo_python_appkit.appkit import ErgoAppKit
+from paideia_contracts.contracts.staking import PaideiaTestConfig
+from paideia_contracts.contracts.staking.planner import CompoundPlanner
+from paideia_contracts.contracts.staking.records import EmissionRecord, StakeRecord
+
+txOperator = "9hxT7sAZEmLWGNp3gN8RRw4qS1NxDMsCtuJkrQ5oEq5w1g7s97U"
+
+
+if __name__ == "__main__":
+    appKit = ErgoAppKit(
+        "http://213.239.193.208:9053", "mainnet", "https://api.ergoplatform.com/"
+    )
+    config = PaideiaTestConfig(appKit, lazy=True)
+    planner = CompoundPlanner(config, txOperator)
+    rng = random.Random(0)
+    for count in [100, 1000, 10000]:
+        stakeBoxes = [
+            StakeRecord(
+                boxId=None,
+                checkpoint=5,
+                stakeTime=1650000000000 + i,
+                amountStaked=rng.randint(1000, 10**12),
+                stakeKey=rng.randbytes(32).hex(),
+            )
+            for i in range(count)
+        ]
+        emission = EmissionRecord(
+            boxId=None,
+            emissionRemaining=293000000,
+            amountStaked=sum(s.amountStaked for s in stakeBoxes),
+            checkpoint=5,
+            stakers=count,
+            emissionAmount=293000000,
+        )
+        start = perf_counter()
+        batches = planner.plan(emission, stakeBoxes)
+        elapsed = perf_counter() - start
+        print(
+            f"{count} stake boxes: {len(batches)} txs "
+            f"(lower bound {planner.minimumBatches(emission, stakeBoxes)}), "
+            f"planned in {elapsed * 1000:.1f} ms"
+        )
+        for batch in batches[:2]:
+            print(f"  {len(batch)} boxes, {batch.size} bytes, cost {batch.cost}")
@@ -0,0 +1,29 @@
+from time import perf_counter
+
+from ergo_python_appkit.appkit import ErgoAppKit
+from paideia_contracts.contracts.staking import compilation
+from paideia_contracts.contracts.staking import PaideiaTestConfig
+
+if __name__ == "__main__":
+    appKit = ErgoAppKit(
+        "http://213.239.193.208:9053", "mainnet", "https://api.ergoplatform.com/"
+    )
+    registry = compilation.contractRegistry
+    PaideiaTestConfig(appKit)
+    first = registry.stats()
+    rounds = 100
+    start = perf_counter()
+    for _ in range(rounds):
+        PaideiaTestConfig(appKit)
+    elapsed = perf_counter() - start
+    stats = registry.stats()
+    print(
+        f"{rounds} identical configs: {elapsed:.3f}s ({elapsed / rounds * 1000:.2f}ms per config)"
+    )
+    print(
+        f"contracts held: {stats['contracts']}, serialized tree bytes: {stats['treeBytes']}"
+    )
+    print(f"hits: {stats['hits']}, misses: {stats['misses']}")
+    print(
+        f"jvm heap growth: {(stats['jvmHeapUsed'] - first['jvmHeapUsed']) / 1024:.1f}KiB"
+    )
@@ -0,0 +1,60 @@
+import random
+from time import perf_counter
+
+from ergo_python_appkit.appkit import ErgoAppKit
+from paideia_contracts.contracts.staking import PaideiaTestConfig, dust
+from paideia_contracts.contracts.staking.planner import ConsolidationPlanner
+
+txOperator = "9hxT7sAZEmLWGNp3gN8RRw4qS1NxDMsCtuJkrQ5oEq5w1g7s97U"
+
+
+def fixedPointSelection(values, reward, minerFee):
+    # The selection ConsolidateDustTransaction used before
+    dustCollected = 99999999999999999999999
+    done = False
+    while not done:
+        currentDustCollected = -1 * minerFee
+        filtered = []
+        done = True
+        for value in values:
+            if value < dustCollected:
+                currentDustCollected += value - reward
+                filtered.append(value)
+            else:
+                done = False
+        values = filtered
+        if dustCollected != currentDustCollected:
+            done = False
+        dustCollected = currentDustCollected
+    return values
+
+
+if __name__ == "__main__":
+    appKit = ErgoAppKit(
+        "http://213.239.193.208:9053", "mainnet", "https://api.ergoplatform.com/"
+    )
+    config = PaideiaTestConfig(appKit, lazy=True)
+    planner = ConsolidationPlanner(config, txOperator)
+    reward = config.dustCollectionReward
+    minerFee = config.dustCollectionMinerFee
+    rng = random.Random(0)
+    values = [rng.randint(1, int(1e7)) for _ in range(10000)]
+    # Few large boxes, the old selection drops one box per pass
+    skewed = [int(6e5)] * 9990 + [int(1e7) - i for i in range(10)]
+    for name, case in [("uniform", values), ("skewed", skewed)]:
+        start = perf_counter()
+        selected = fixedPointSelection(case, reward, minerFee)
+        fixedPointTime = perf_counter() - start
+        start = perf_counter()
+        batches = dust.consolidationBatches(case, reward, minerFee, planner.maxInputs)
+        elapsed = perf_counter() - start
+        print(
+            f"{name}, 10000 dust boxes: fixed point {fixedPointTime * 1000:.1f} ms "
+            f"for 1 tx of {len(selected)} inputs ({planner.size(len(selected))} bytes, "
+            f"cost {planner.costModel.cost(len(selected))})"
+        )
+        print(
+            f"  sorted {elapsed * 1000:.1f} ms for {len(batches)} txs of at most "
+            f"{planner.maxInputs} inputs, {sum(len(b) for b in batches)} boxes "
+            f"consolidated"
+        )
@@ -0,0 +1,78 @@
+import os
+from time import perf_counter
+from typing import List
+
+from ergo_python_appkit.appkit import ErgoAppKit
+from paideia_contracts.contracts.staking import compilation
+from paideia_contracts.contracts.staking import (
+    PaideiaTestConfig,
+    StakingConfig,
+    compileStakingConfigs,
+)
+
+
+def poolConfig(appKit: ErgoAppKit) -> StakingConfig:
+    # Same parameters BootstrapStaking uses, with fresh token ids so nothing is shared
+    return StakingConfig(
+        version="latest",
+        appKit=appKit,
+        stakeStateNFT=os.urandom(32).hex(),
+        stakePoolNFT=os.urandom(32).hex(),
+        emissionNFT=os.urandom(32).hex(),
+        stakeTokenId=os.urandom(32).hex(),
+        stakedTokenId=os.urandom(32).hex(),
+        stakePoolKey=os.urandom(32).hex(),
+        stakedTokenName="Bench",
+        stakedTokenDecimals=4,
+        proxyToStakingIncentive=int(1e8),
+        proxyAddToStakingIncentive=int(1e7),
+        proxyExecutorReward=int(2e6),
+        proxyMinerFee=int(2e6),
+        dustCollectionReward=int(5e5),
+        dustCollectionMinerFee=int(1e6),
+        emitReward=int(3e6),
+        emitMinerFee=int(1e6),
+        baseCompoundReward=int(5e5),
+        baseCompoundMinerFee=int(1e6),
+        variableCompoundReward=int(15e4),
+        variableCompoundMinerFee=int(1e5),
+        lazy=True,
+    )
+
+
+def sequential(configs: List[StakingConfig]) -> float:
+    compilation.contractRegistry.clear()
+    start = perf_counter()
+    for config in configs:
+        config.compileContracts()
+    return perf_counter() - start
+
+
+def parallel(configs: List[StakingConfig], maxWorkers: int) -> float:
+    compilation.contractRegistry.clear()
+    start = perf_counter()
+    compileStakingConfigs(configs, maxWorkers)
+    return perf_counter() - start
+
+
+if __name__ == "__main__":
+    appKit = ErgoAppKit(
+        "http://213.239.193.208:9053", "mainnet", "https://api.ergoplatform.com/"
+    )
+    # Time the compiler itself, a warm disk cache would hide it
+    compilation.ergoTreeCache = None
+    PaideiaTestConfig(appKit)
+    print(f"cpus: {os.cpu_count()}")
+    seq = sequential([poolConfig(appKit)])
+    print(f"1 config, sequential:      {seq:.3f}s")
+    for maxWorkers in [2, 4, 8]:
+        par = parallel([poolConfig(appKit)], maxWorkers)
+        print(f"1 config, {maxWorkers} workers:       {par:.3f}s ({seq / par:.2f}x)")
+    pools = 4
+    seq = sequential([poolConfig(appKit) for _ in range(pools)])
+    print(f"{pools} pools, sequential:      {seq:.3f}s")
+    for maxWorkers in [4, 8]:
+        par = parallel([poolConfig(appKit) for _ in range(pools)], maxWorkers)
+        print(
+            f"{pools} pools, {maxWorkers} workers:       {par:.3f}s ({seq / par:.2f}x)"
+        )
@@ -0,0 +1,53 @@
+import os
+from time import perf_counter
+
+from ergo_python_appkit.appkit import ErgoAppKit
+from paideia_contracts.contracts.plasma_staking import (
+    PlasmaStakingConfig,
+    PlasmaStakingState,
+)
+
+plasmaStakingConfig = PlasmaStakingConfig(
+    nftId="29d6c2d943d7f5a2800095dba6b6168f1602d355480218f4a8a8c6575245a907",
+    stakedTokenId="0cd8c9f416e5b1ca9f986a7f10a84191dfb85941619e49e53c0dc30ebf83324b",
+    emissionAmount=100000,
+    emissionDelay=10,
+    cycleLength=3600000,
+)
+
+
+if __name__ == "__main__":
+    # Starts the jvm with the plasma jars
+    appKit = ErgoAppKit(
+        "http://213.239.193.208:9053", "mainnet", "https://api.ergoplatform.com/"
+    )
+    state = PlasmaStakingState(plasmaStakingConfig=plasmaStakingConfig)
+    state.stakeMany({os.urandom(32).hex(): 1000 for _ in range(100000)})
+    for count in [10, 100, 1000, 10000]:
+        single = PlasmaStakingState(plasmaStakingConfig=plasmaStakingConfig)
+        single.stakeMany({key: 1000 for key in state.getKeys(0, 100000)})
+        keys = [os.urandom(32).hex() for _ in range(count)]
+        start = perf_counter()
+        singleBytes = 0
+        for key in keys:
+            singleBytes += len(single.stake(key, 1000).proof().bytes())
+        singleTime = perf_counter() - start
+        start = perf_counter()
+        result = state.stakeMany({key: 1000 for key in keys})
+        bulkTime = perf_counter() - start
+        print(
+            f"stake {count} keys into 100000: one op per key {singleTime:.2f} s, "
+            f"{singleBytes / count:.0f} proof bytes per key, one batch "
+            f"{bulkTime:.2f} s, "
+            f"{PlasmaStakingState.proofBytesPerKey(result, count):.0f} bytes per key"
+        )
+        result = state.changeStakes({key: 2000 for key in keys})
+        print(
+            f"  changeStakes {PlasmaStakingState.proofBytesPerKey(result, count):.0f} "
+            f"bytes per key"
+        )
+        result = state.unstakeMany(keys)
+        print(
+            f"  unstakeMany {PlasmaStakingState.proofBytesPerKey(result, count):.0f} "
+            f"bytes per key"
+        )
@@ -0,0 +1,79 @@
+import random
+import tracemalloc
+
+from ergo_python_appkit.appkit import ErgoAppKit
+import java
+from paideia_contracts.contracts.plasma_staking import (
+    PlasmaStakingConfig,
+    PlasmaStakingHistory,
+    PlasmaStakingState,
+)
+
+plasmaStakingConfig = PlasmaStakingConfig(
+    nftId="29d6c2d943d7f5a2800095dba6b6168f1602d355480218f4a8a8c6575245a907",
+    stakedTokenId="0cd8c9f416e5b1ca9f986a7f10a84191dfb85941619e49e53c0dc30ebf83324b",
+    emissionAmount=100000,
+    emissionDelay=10,
+    cycleLength=3600000,
+)
+stakers = 100000
+# Stakers changing their stake and new stakers between two snapshots
+changed = 1000
+joined = 100
+
+
+def heapUsed() -> int:
+    runtime = java.lang.Runtime.getRuntime()
+    java.lang.System.gc()
+    return runtime.totalMemory() - runtime.freeMemory()
+
+
+def live(rng: random.Random) -> PlasmaStakingState:
+    state = PlasmaStakingState(plasmaStakingConfig=plasmaStakingConfig)
+    state.stakeMany({rng.randbytes(32).hex(): 1000 for _ in range(stakers)})
+    return state
+
+
+def cycle(state: PlasmaStakingState, rng: random.Random) -> None:
+    keys = rng.sample(list(state.getKeys(0, state.numberOfStakers)), changed)
+    state.changeStakes({key: rng.randint(1, 10000) for key in keys})
+    state.stakeMany({rng.randbytes(32).hex(): 1000 for _ in range(joined)})
+
+
+if __name__ == "__main__":
+    # Starts the jvm with the plasma jars
+    appKit = ErgoAppKit(
+        "http://213.239.193.208:9053", "mainnet", "https://api.ergoplatform.com/"
+    )
+    emissionDelay = plasmaStakingConfig.emissionDelay
+    baseline = heapUsed()
+    state = live(random.Random(0))
+    liveHeap = heapUsed() - baseline
+    print(f"live state, {stakers} stakers: {liveHeap / 2**20:.1f} MiB")
+
+    # A full state per snapshot
+    rng = random.Random(1)
+    copies = []
+    for _ in range(emissionDelay):
+        copies.append(state.copy())
+        cycle(state, rng)
+    fullHeap = heapUsed() - baseline - liveHeap
+    del copies
+
+    state = live(random.Random(0))
+    start = heapUsed()
+    tracemalloc.start()
+    rng = random.Random(1)
+    history = PlasmaStakingHistory(state, emissionDelay)
+    for _ in range(emissionDelay):
+        history.snapshot()
+        cycle(state, rng)
+    history.compounding()
+    sharedHeap = heapUsed() - start
+    journal, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(
+        f"{emissionDelay} snapshots, {changed} changed and {joined} new stakers "
+        f"per cycle: full copies {fullHeap / 2**20:.1f} MiB, shared "
+        f"{sharedHeap / 2**20:.1f} MiB jvm + {journal / 2**20:.1f} MiB journals"
+    )
@@ -0,0 +1,58 @@
+import os
+from time import perf_counter
+
+from ergo_python_appkit.appkit import ErgoAppKit
+from paideia_contracts.contracts.plasma_staking import (
+    PlasmaStakingConfig,
+    PlasmaStakingState,
+)
+
+plasmaStakingConfig = PlasmaStakingConfig(
+    nftId="29d6c2d943d7f5a2800095dba6b6168f1602d355480218f4a8a8c6575245a907",
+    stakedTokenId="0cd8c9f416e5b1ca9f986a7f10a84191dfb85941619e49e53c0dc30ebf83324b",
+    emissionAmount=100000,
+    emissionDelay=10,
+    cycleLength=3600000,
+)
+
+
+def scanTotalStaked(state: PlasmaStakingState) -> int:
+    # What PlasmaStakingBox.totalStaked used to do, one lookup per staker
+    totalStaked = 0
+    for key in state.getKeys(0, state.numberOfStakers):
+        totalStaked += state.getStake(key)
+    return totalStaked
+
+
+if __name__ == "__main__":
+    # Starts the jvm with the plasma jars
+    appKit = ErgoAppKit(
+        "http://213.239.193.208:9053", "mainnet", "https://api.ergoplatform.com/"
+    )
+    state = PlasmaStakingState(plasmaStakingConfig=plasmaStakingConfig)
+    stakers = 0
+    for count in [1000, 10000, 100000, 1000000]:
+        while stakers < count:
+            batch = min(count - stakers, 10000)
+            state.stakeMany(
+                {os.urandom(32).hex(): 1000 + stakers + i for i in range(batch)}
+            )
+            stakers += batch
+        start = perf_counter()
+        for _ in range(1000):
+            state.totalStaked
+        runningTime = (perf_counter() - start) / 1000
+        # The per staker scan is measured on the first 1000 keys and scaled up
+        sample = PlasmaStakingState(plasmaStakingConfig, plasmaMap=state._plasmaMap)
+        sample._sortedKeys.update(state.getKeys(0, 1000))
+        start = perf_counter()
+        scanTotalStaked(sample)
+        scanTime = (perf_counter() - start) * count / 1000
+        start = perf_counter()
+        totalStaked, _ = state.scanTotals()
+        pagedTime = perf_counter() - start
+        assert totalStaked == state.totalStaked
+        print(
+            f"{count} stakers: running total {runningTime * 1e6:.2f} us, "
+            f"scan per staker ~{scanTime:.2f} s, paged scan {pagedTime:.2f} s"
+        )
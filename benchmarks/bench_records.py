@@ -0,0 +1,64 @@
+import gc
+import tracemalloc
+
+from ergo_python_appkit.appkit import ErgoAppKit
+from java.lang import Runtime, System
+from paideia_contracts.contracts.staking import PaideiaTestConfig, StakeBox
+from paideia_contracts.contracts.staking.records import StakeRecord
+
+count = 100000
+
+
+def jvmHeapUsed() -> int:
+    for _ in range(3):
+        System.gc()
+    runtime = Runtime.getRuntime()
+    return runtime.totalMemory() - runtime.freeMemory()
+
+
+def measure(build):
+    gc.collect()
+    jvmBefore = jvmHeapUsed()
+    tracemalloc.start()
+    objects = build()
+    python = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    jvm = jvmHeapUsed() - jvmBefore
+    return objects, python, jvm
+
+
+if __name__ == "__main__":
+    appKit = ErgoAppKit(
+        "http://213.239.193.208:9053", "mainnet", "https://api.ergoplatform.com/"
+    )
+    config = PaideiaTestConfig(appKit)
+    # Key and box id strings are built up front, so neither measurement counts them
+    stakeKeys = [i.to_bytes(32, "big").hex() for i in range(count)]
+    boxIds = [(count + i).to_bytes(32, "big").hex() for i in range(count)]
+
+    def stakeBoxes():
+        boxes = [
+            StakeBox(appKit, config.stakeContract, 5, 1650000000000 + i, 10000 + i, k)
+            for i, k in enumerate(stakeKeys)
+        ]
+        # A box that has been used for an output holds its register ErgoValues
+        for box in boxes:
+            box.registers
+        return boxes
+
+    def stakeRecords():
+        return [
+            StakeRecord(boxIds[i], 5, 1650000000000 + i, 10000 + i, k)
+            for i, k in enumerate(stakeKeys)
+        ]
+
+    boxes, boxPython, boxJvm = measure(stakeBoxes)
+    del boxes
+    records, recordPython, recordJvm = measure(stakeRecords)
+    print(f"{count} stake boxes")
+    print(
+        f"StakeBox:    python {boxPython / 2**20:.1f}MiB, jvm {boxJvm / 2**20:.1f}MiB, {(boxPython + boxJvm) / count:.0f}B per box"
+    )
+    print(
+        f"StakeRecord: python {recordPython / 2**20:.1f}MiB, jvm {recordJvm / 2**20:.1f}MiB, {(recordPython + recordJvm) / count:.0f}B per record"
+    )
@@ -0,0 +1,95 @@
+from time import perf_counter
+
+from ergo_python_appkit.appkit import ErgoAppKit
+from paideia_contracts.contracts.staking import (
+    EmissionBox,
+    PaideiaStakingBox,
+    PaideiaTestConfig,
+    StakeBox,
+    StakePoolBox,
+    StakeStateBox,
+    StakingConfig,
+)
+
+
+def eagerUpdateRegisters(self) -> None:
+    self.registers = self.encodeRegisters()
+
+
+def emitBoxes(config: StakingConfig) -> None:
+    # Box updates done by EmitTransaction, up to reading the registers that
+    # outBox hands to the OutBox builder (which needs a node connection)
+    stakeStateBox = StakeStateBox(
+        config.appKit,
+        config.stakeStateContract,
+        1,
+        1650000000000,
+        10000000,
+        86400000,
+        10,
+    )
+    stakePoolBox = StakePoolBox(
+        config.appKit, config.stakePoolContract, 293000, int(9e8)
+    )
+    emissionBox = EmissionBox(
+        config.appKit, config.emissionContract, 9, 9569595, 0, 0, 293000
+    )
+    dust = emissionBox.emissionRemaining
+    stakePoolBox.remaining = stakePoolBox.remaining - stakePoolBox.emissionAmount + dust
+    emissionBox.emissionRemaining = stakePoolBox.emissionAmount - 2930
+    emissionBox.checkpoint = stakeStateBox.checkpoint
+    emissionBox.amountStaked = stakeStateBox.amountStaked
+    emissionBox.stakers = stakeStateBox.stakers
+    emissionBox.emissionAmount = stakePoolBox.emissionAmount - 2930
+    stakeStateBox.amountStaked = stakeStateBox.amountStaked + 290070 - dust
+    stakeStateBox.checkpoint = stakeStateBox.checkpoint + 1
+    stakeStateBox.checkpointTime = (
+        stakeStateBox.checkpointTime + stakeStateBox.cycleDuration
+    )
+    for box in [stakeStateBox, stakePoolBox, emissionBox]:
+        box.registers
+
+
+def compoundBoxes(config: StakingConfig, stakers: int) -> None:
+    # Box updates done by CompoundTransaction for a batch of stake boxes
+    emissionBox = EmissionBox(
+        config.appKit, config.emissionContract, 290070, 10000000, 1, stakers, 290070
+    )
+    for i in range(stakers):
+        stakeBox = StakeBox(
+            config.appKit, config.stakeContract, 1, 1650000000000, 100000, "ab" * 32
+        )
+        stakeBox.checkpoint = stakeBox.checkpoint + 1
+        stakeBox.amountStaked += 2900
+        stakeBox.registers
+    emissionBox.emissionRemaining -= 2900 * stakers
+    emissionBox.stakers -= stakers
+    emissionBox.registers
+
+
+def timeIt(f, rounds: int) -> float:
+    start = perf_counter()
+    for _ in range(rounds):
+        f()
+    return (perf_counter() - start) / rounds
+
+
+if __name__ == "__main__":
+    appKit = ErgoAppKit(
+        "http://213.239.193.208:9053", "mainnet", "https://api.ergoplatform.com/"
+    )
+    config = PaideiaTestConfig(appKit)
+    rounds = 200
+    deferredUpdateRegisters = PaideiaStakingBox.updateRegisters
+    for name, f in [
+        ("emit", lambda: emitBoxes(config)),
+        ("compound 50", lambda: compoundBoxes(config, 50)),
+    ]:
+        timeIt(f, rounds)
+        PaideiaStakingBox.updateRegisters = eagerUpdateRegisters
+        eager = timeIt(f, rounds)
+        PaideiaStakingBox.updateRegisters = deferredUpdateRegisters
+        deferred = timeIt(f, rounds)
+        print(
+            f"{name:12} eager: {eager * 1000:.3f}ms deferred: {deferred * 1000:.3f}ms ({eager / deferred:.2f}x)"
+        )
@@ -0,0 +1,60 @@
+import random
+from array import array
+from time import perf_counter
+
+from paideia_contracts.contracts.staking import rewards
+
+count = 100000
+
+
+def timed(label, run, repeat=5):
+    best = None
+    for _ in range(repeat):
+        start = perf_counter()
+        result = run()
+        elapsed = perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"{label}: {best * 1000:.2f} ms")
+    return result
+
+
+if __name__ == "__main__":
+    rng = random.Random(0)
+    cases = {
+        # Products fit an int64, so numpy divides directly
+        "small": (
+            array("q", (rng.randint(1, 10**9) for _ in range(count))),
+            10**6,
+            10**14,
+        ),
+        # Products overflow an int64, numpy corrects a float estimate
+        "large": (
+            array("q", (rng.randint(1, 10**18) for _ in range(count))),
+            9 * 10**15,
+            10**18,
+        ),
+    }
+    numpy = rewards.numpy
+    for name, (amounts, emissionAmount, totalStaked) in cases.items():
+        print(f"{count} stakers, {name} amounts")
+        floats = timed(
+            "  float formula",
+            lambda: [
+                rewards.floatCompoundReward(a, emissionAmount, totalStaked)
+                for a in amounts
+            ],
+        )
+        rewards.numpy = None
+        exact = timed(
+            "  exact python",
+            lambda: rewards.compoundRewards(amounts, emissionAmount, totalStaked),
+        )
+        rewards.numpy = numpy
+        if numpy is not None:
+            vectorized = timed(
+                "  numpy",
+                lambda: rewards.compoundRewards(amounts, emissionAmount, totalStaked),
+            )
+            assert vectorized == exact
+        wrong = sum(1 for f, e in zip(floats, exact) if f != e)
+        print(f"  float formula off on {wrong} boxes, total {sum(floats) - sum(exact)}")
@@ -0,0 +1,92 @@
+from time import perf_counter, time
+
+from ergo_python_appkit.appkit import ErgoAppKit
+from paideia_contracts.contracts.staking import (
+    PaideiaTestConfig,
+    StakeProxyBox,
+    StakeStateBox,
+)
+from paideia_contracts.contracts.staking.sequencer import (
+    ProxyRequest,
+    StakeStateSequencer,
+)
+
+txOperator = "9hxT7sAZEmLWGNp3gN8RRw4qS1NxDMsCtuJkrQ5oEq5w1g7s97U"
+
+# Block limits voted in by the miners on mainnet, check /info on a node for the
+# current values
+maxBlockSize = 1271009
+maxBlockCost = 7030268
+
+
+def buildChain(appKit, config, userTree, count):
+    stakeStateInput = StakeStateBox(
+        appKit=appKit,
+        stakeStateContract=config.stakeStateContract,
+        checkpoint=1,
+        checkpointTime=int(appKit.preHeader().getTimestamp() - 86400001),
+        amountStaked=10000000,
+        cycleDuration=86400000,
+        stakers=10,
+    ).inputBox()
+    proxyInputs = [
+        StakeProxyBox(
+            appKit=appKit,
+            stakeProxyContract=config.stakeProxyContract,
+            amountToStake=200000 + i,
+            userErgoTree=userTree,
+            stakeTime=int(time() * 1000),
+        ).inputBox()
+        for i in range(count)
+    ]
+    sequencer = StakeStateSequencer(
+        config, txOperator, lambda stakeKey: None, maxChainLength=count
+    )
+    plan = sequencer.plan(
+        stakeStateInput,
+        [ProxyRequest.fromInputBox(b, config) for b in proxyInputs],
+        {},
+    )
+    start = perf_counter()
+    chain = sequencer.build(stakeStateInput, plan.ordered, {})
+    elapsed = perf_counter() - start
+    sizes = [len(link.signedTx.toBytes()) for link in chain]
+    costs = [link.signedTx.getCost() for link in chain]
+    print(
+        f"{count} stake proxies: {len(chain)} txs signed in "
+        f"{elapsed * 1000:.0f} ms ({elapsed * 1000 / len(chain):.1f} ms per tx), "
+        f"{max(sizes)} bytes and cost {max(costs)} per tx"
+    )
+    return sizes, costs
+
+
+def fitting(sizes, costs):
+    # Number of txs of the chain, in order, that fit in one block
+    size = cost = 0
+    for i in range(len(sizes)):
+        size += sizes[i]
+        cost += costs[i]
+        if size > maxBlockSize or cost > maxBlockCost:
+            return i
+    return len(sizes)
+
+
+if __name__ == "__main__":
+    appKit = ErgoAppKit(
+        "http://213.239.193.208:9053", "mainnet", "https://api.ergoplatform.com/"
+    )
+    config = PaideiaTestConfig(appKit, lazy=True)
+    userTree = appKit.contractFromAddress(txOperator).getErgoTree().bytesHex()
+    for count in [1, 10, 50]:
+        buildChain(appKit, config, userTree, count)
+    # The block limits bound the stake txs per block, whatever the chain length
+    sizes, costs = buildChain(appKit, config, userTree, 50)
+    sizeBound = maxBlockSize // max(sizes)
+    costBound = maxBlockCost // max(costs)
+    print(f"block bound: {sizeBound} stake txs by size, {costBound} by cost")
+    # A chain long enough to reach that bound, the stake state box allows one
+    # stake per tx so this is the number of stakers per block
+    sizes, costs = buildChain(appKit, config, userTree, min(sizeBound, costBound) + 1)
+    print(
+        f"stakers per block: {fitting(sizes, costs)} chained, 1 waiting for each confirmation"
+    )
@@ -1,4 +1,5 @@
 from ast import Dict
+from contextlib import nullcontext
 from dataclasses import dataclass
 import os
 from sortedcontainers import SortedSet
@@ -9,7 +10,7 @@ from ergo_python_appkit.ErgoTransaction import ErgoTransaction
 import sigmastate
 import scala
 import java
-from org.ergoplatform.appkit import ErgoId, ErgoValue, InputBox, ContextVar, ErgoType, Iso
+from org.ergoplatform.appkit import ErgoId, ErgoValue, InputBox, ContextVar, ErgoType, Iso, SignedTransaction
 from scala.collection import JavaConverters
 import sys
 from jpype import JImplements, JOverride, JObject, JClass, JImplementationFor, JProxy
@@ -17,6 +18,10 @@ from jpype.types import JInt, JLong, JByte
 from scorex.crypto.authds import package
 from sigmastate.Values import ErgoTree
 from special.collection import CollBuilder
+from paideia_contracts.contracts.plasma_staking.store import DELETE, INSERT, UPDATE, PlasmaStakingStore
+from paideia_contracts.contracts.staking import rewards
+from paideia_contracts.contracts.staking.pipeline import TransactionChain, rejectionExceptions
+from paideia_contracts.contracts.staking.planner import largestFitting, maxTransactionCost, maxTransactionSize, vlqSize
 
 @dataclass
 class PlasmaStakingConfig():
@@ -33,49 +38,222 @@ class PlasmaStakingState:
         plasmaStakingConfig: PlasmaStakingConfig, 
         plasmaParameters: getblok_plasma.PlasmaParameters = getblok_plasma.PlasmaParameters.default(), 
         plasmaMap: getblok_plasma.collections.PlasmaMap = None, 
-        totalStaked: int = 0) -> None:
+        totalStaked: int = 0,
+        checkConsistency: bool = False,
+        store: PlasmaStakingStore = None) -> None:
         self._totalStaked = totalStaked
+        # Every operation is recorded in the store once applied to the tree
+        self._store = store
+        # Compares the running totals with a full scan of the tree after every
+        # operation, slow, for tests and debugging
+        self._checkConsistency = checkConsistency
+        # Operations are also appended here, see PlasmaStakingHistory
+        self._journal: list = None
+        self._plasmaStakingConfig = plasmaStakingConfig
         self._plasmaParameters = plasmaParameters
         self._nft = plasmaStakingConfig.nftId
         self._stakedToken = plasmaStakingConfig.stakedTokenId
         self._sortedKeys = SortedSet()
         if plasmaMap is None:
-            self._plasmaMap = getblok_plasma.collections.PlasmaMap(
-                                sigmastate.AvlTreeFlags.AllOperationsAllowed(),
-                                plasmaParameters,
-                                scala.Option.apply(None),
-                                getblok_plasma.ByteConversion.convertsId(),
-                                getblok_plasma.ByteConversion.convertsLongVal())
+            self._plasmaMap = PlasmaStakingState.newPlasmaMap(plasmaParameters)
         else:
             self._plasmaMap = plasmaMap
 
+    @staticmethod
+    def newPlasmaMap(plasmaParameters: getblok_plasma.PlasmaParameters, manifest: getblok_plasma.collections.Manifest = None) -> getblok_plasma.collections.PlasmaMap:
+        # Empty, or the tree saved in manifest
+        return getblok_plasma.collections.PlasmaMap(
+                    sigmastate.AvlTreeFlags.AllOperationsAllowed(),
+                    plasmaParameters,
+                    scala.Option.apply(manifest),
+                    getblok_plasma.ByteConversion.convertsId(),
+                    getblok_plasma.ByteConversion.convertsLongVal())
+
+    @staticmethod
+    def plasmaMapFromHex(plasmaParameters: getblok_plasma.PlasmaParameters, digest: str, manifest: str, subtrees: list[str]) -> getblok_plasma.collections.PlasmaMap:
+        # The tree saved by hexManifest
+        return PlasmaStakingState.newPlasmaMap(plasmaParameters, getblok_plasma.collections.Manifest.fromHexStrings(
+            digest,
+            manifest,
+            JavaConverters.asScalaIteratorConverter(java.util.ArrayList(subtrees).iterator()).asScala().toSeq()))
+
+    def hexManifest(self) -> tuple[str, str, list[str]]:
+        # Digest, manifest and subtrees of the whole tree
+        hexStrings = self._plasmaMap.getManifest(255).toHexStrings()
+        subtrees = JavaConverters.seqAsJavaListConverter(hexStrings._3()).asJava()
+        return self.digest, str(hexStrings._2()), [str(subtree) for subtree in subtrees]
+
+    @property
+    def totalStaked(self) -> int:
+        return self._totalStaked
+
+    @property
+    def numberOfStakers(self) -> int:
+        return len(self._sortedKeys)
+
+    @property
+    def digest(self) -> str:
+        return bytes(self._plasmaMap.ergoValue().getValue().digest().toArray()).hex()
+
+    @staticmethod
+    def fromStore(
+        plasmaStakingConfig: PlasmaStakingConfig,
+        store: PlasmaStakingStore,
+        plasmaParameters: getblok_plasma.PlasmaParameters = getblok_plasma.PlasmaParameters.default(),
+        inputBox: InputBox = None,
+        checkConsistency: bool = False) -> 'PlasmaStakingState':
+        # Loads the checkpoint of the tree and applies the operations recorded
+        # after it, without going through the staking history on chain. With
+        # inputBox the digest is also checked against R4 of the plasma staking
+        # box.
+        plasmaMap = None
+        checkpoint = store.checkpoint()
+        if checkpoint is not None:
+            plasmaMap = PlasmaStakingState.plasmaMapFromHex(plasmaParameters, *checkpoint)
+        state = PlasmaStakingState(plasmaStakingConfig, plasmaParameters, plasmaMap, checkConsistency=checkConsistency)
+        for op, stakes in store.batches():
+            state._apply(op, stakes)
+        committed = store.state()
+        if committed is not None:
+            digest, state._totalStaked = committed
+            if digest != state.digest:
+                raise Exception(f"Rebuilt tree {state.digest} does not match the stored digest {digest}")
+        state._sortedKeys.update(store.stakes().keys())
+        if inputBox is not None:
+            state.verifyDigest(inputBox)
+        state.checkTotals()
+        state._store = store
+        return state
+
+    def verifyDigest(self, inputBox: InputBox) -> None:
+        _stakers = inputBox.getRegisters().get(0).getValue()
+        if _stakers.digest() != self._plasmaMap.ergoValue().getValue().digest():
+            raise Exception(f"AVLTree {bytes(_stakers.digest().toArray()).hex()} does not match local state {self.digest}")
+
+    def transaction(self):
+        # Groups the operations of one tx into a single commit of the store
+        return self._store.transaction() if self._store is not None else nullcontext()
+
+    def _apply(self, op: str, stakes: dict[str,int]) -> getblok_plasma.collections.ProvenResult:
+        if op == INSERT:
+            return self._plasmaMap.insert(self.toOpSeq([scala.Tuple2(ErgoId.create(key), stakes[key]) for key in stakes]))
+        if op == DELETE:
+            return self._plasmaMap.delete(self.toOpSeq([ErgoId.create(key) for key in stakes]))
+        return self._plasmaMap.update(self.toOpSeq([scala.Tuple2(ErgoId.create(key), stakes[key]) for key in stakes]))
+
+    def copy(self) -> 'PlasmaStakingState':
+        # A separate tree with the same shape, and so the same digest
+        plasmaMap = PlasmaStakingState.newPlasmaMap(self._plasmaParameters, self._plasmaMap.getManifest(255))
+        state = PlasmaStakingState(self._plasmaStakingConfig, self._plasmaParameters, plasmaMap, self._totalStaked, self._checkConsistency)
+        state._sortedKeys = SortedSet(self._sortedKeys)
+        return state
+
+    def replay(self, operations: list) -> None:
+        # Applies operations recorded in a journal, in the same order
+        for op, stakes in operations:
+            if op == INSERT:
+                self.stakeMany(stakes)
+            elif op == DELETE:
+                self.unstakeMany(list(stakes.keys()))
+            else:
+                self.changeStakes(stakes)
+
+    def _record(self, op: str, stakes: dict[str,int]) -> None:
+        if self._journal is not None:
+            self._journal.append((op, dict(stakes)))
+        if self._store is not None:
+            with self._store.transaction():
+                self._store.record(op, stakes, self.digest, self._totalStaked)
+                if self._journal is not None:
+                    self._store.recordJournal(op, stakes)
+                if self._store.checkpointDue():
+                    self.checkpoint()
+
+    def checkpoint(self) -> None:
+        # Saves the whole tree in the store, so a restart does not have to apply
+        # the operations before it
+        self._store.saveCheckpoint(*self.hexManifest())
+
     def stake(self, stakingKey: str, stakeAmount: int) -> getblok_plasma.collections.ProvenResult:
-        self._totalStaked += stakeAmount
-        self._sortedKeys.add(stakingKey)
-        return self._plasmaMap.insert(self.toOpSeq([scala.Tuple2(ErgoId.create(stakingKey), stakeAmount)]))
+        return self.stakeMany({stakingKey: stakeAmount})
+
+    def stakeMany(self, stakes: dict[str,int]) -> getblok_plasma.collections.ProvenResult:
+        # All new stakers in one insert, so one proof for the whole batch
+        for key in stakes:
+            if key in self._sortedKeys:
+                raise Exception(f"{key} is already staking")
+        result = self._apply(INSERT, stakes)
+        self._totalStaked += sum(stakes.values())
+        self._sortedKeys.update(stakes.keys())
+        self.checkTotals()
+        self._record(INSERT, stakes)
+        return result
 
     def getStake(self, stakingKey: str) -> int:
         return int(self.getStakes([stakingKey]).response().apply(JClass("java.lang.Object")@JInt(0)).tryOp().getOrElse(None).value())
+
+    def currentStakes(self, stakingKeys: list[str]) -> list[int]:
+        response = self.getStakes(stakingKeys).response()
+        currentStakes = []
+        for i in range(len(stakingKeys)):
+            stake = response.apply(JClass("java.lang.Object")@JInt(i)).tryOp().getOrElse(None)
+            if stake is None:
+                raise Exception(f"{stakingKeys[i]} is not staking")
+            currentStakes.append(int(stake.value()))
+        return currentStakes
         
     def unstake(self, stakingKey: str) -> getblok_plasma.collections.ProvenResult:
-        stakeAmount = self.getStake(stakingKey)
-        self._totalStaked -= stakeAmount
-        self._sortedKeys.remove(stakingKey)
-        return self._plasmaMap.delete(self.toOpSeq([ErgoId.create(stakingKey)]))
+        return self.unstakeMany([stakingKey])
+
+    def unstakeMany(self, stakingKeys: list[str]) -> getblok_plasma.collections.ProvenResult:
+        totalCurrentStake = sum(self.currentStakes(stakingKeys))
+        deleted = {key: None for key in stakingKeys}
+        result = self._apply(DELETE, deleted)
+        self._totalStaked -= totalCurrentStake
+        for key in stakingKeys:
+            self._sortedKeys.remove(key)
+        self.checkTotals()
+        self._record(DELETE, deleted)
+        return result
 
     def getStakes(self, stakingKeys: list[str]) -> getblok_plasma.collections.ProvenResult:
         return self._plasmaMap.lookUp(self.toOpSeq([ErgoId.create(key) for key in stakingKeys]))
 
     def changeStakes(self, newStakes: dict[str,int]) -> getblok_plasma.collections.ProvenResult:
-        currentStakes = self.getStakes(list(newStakes.keys())).response()
-        totalCurrentStake = 0
-        for i in range(len(newStakes)):
-            totalCurrentStake += int(currentStakes.apply(JClass("java.lang.Object")@JInt(i)).tryOp().getOrElse(None).value())
-        totalNewStake = 0
-        for newStake in newStakes.values():
-            totalNewStake += newStake
-        self._totalStaked = self._totalStaked - totalCurrentStake + totalNewStake
-        return self._plasmaMap.update(self.toOpSeq([scala.Tuple2(ErgoId.create(key), newStakes[key]) for key in newStakes]))
+        keys = list(newStakes.keys())
+        totalCurrentStake = sum(self.currentStakes(keys))
+        result = self._apply(UPDATE, newStakes)
+        self._totalStaked = self._totalStaked - totalCurrentStake + sum(newStakes.values())
+        self.checkTotals()
+        self._record(UPDATE, newStakes)
+        return result
+
+    @staticmethod
+    def proofBytesPerKey(result: getblok_plasma.collections.ProvenResult, keys: int) -> float:
+        # Size of the proof a batch of operations adds to the context
+        return len(result.proof().bytes()) / max(keys, 1)
+
+    def scanTotals(self, pageSize: int = 10000) -> tuple[int, int]:
+        # Total staked and number of stakers from the tree itself, looking up the
+        # keys a page at a time
+        totalStaked = 0
+        stakers = 0
+        for i in range(0, len(self._sortedKeys), pageSize):
+            keys = self.getKeys(i, pageSize)
+            stakes = self.getStakes(keys).response()
+            for j in range(len(keys)):
+                stake = stakes.apply(JClass("java.lang.Object")@JInt(j)).tryOp().getOrElse(None)
+                if stake is not None:
+                    totalStaked += int(stake.value())
+                    stakers += 1
+        return totalStaked, stakers
+
+    def checkTotals(self) -> None:
+        if not self._checkConsistency:
+            return
+        totalStaked, stakers = self.scanTotals()
+        if totalStaked != self._totalStaked or stakers != len(self._sortedKeys) or stakers != len(self._plasmaMap):
+            raise Exception(f"Running totals ({self._totalStaked} staked, {len(self._sortedKeys)} stakers) do not match the tree ({totalStaked} staked, {stakers} stakers)")
 
     def getKeys(self, i: int = 0, n: int = 1) -> list[str]:
         return self._sortedKeys[i:i+n]
@@ -86,13 +264,160 @@ class PlasmaStakingState:
     def toOpSeq(self, l: list):
         return JavaConverters.asScalaIteratorConverter(java.util.ArrayList(l).iterator()).asScala().toSeq()
 
+class PlasmaStakingSnapshot:
+    # An entry of R6, the number of stakers, total staked and tree of the live
+    # state at a SNAPSHOT tx. Only the snapshot being compounded gets a tree of
+    # its own, the others keep the AvlTree value and the operations the live
+    # state went through until the next snapshot.
+    def __init__(self, numberOfStakers: int, totalStaked: int, avlTree: ErgoValue) -> None:
+        self.numberOfStakers = numberOfStakers
+        # Stays the same while compounding, the rewards are shares of it
+        self.totalStaked = totalStaked
+        self._avlTree = avlTree
+        self.operations = []
+        self.state: PlasmaStakingState = None
+
+    def ergoValue(self) -> ErgoValue:
+        if self.state is not None:
+            return self.state._plasmaMap.ergoValue()
+        return self._avlTree
+
+    def copy(self) -> 'PlasmaStakingSnapshot':
+        snapshot = PlasmaStakingSnapshot(self.numberOfStakers, self.totalStaked, self._avlTree)
+        # Only the live state journals, a copy never adds to it
+        snapshot.operations = self.operations
+        snapshot.state = self.state.copy() if self.state is not None else None
+        return snapshot
+
+    def remove(self, stakingKeys: list[str]) -> getblok_plasma.collections.ProvenResult:
+        # Compounded keys leave the snapshot
+        result = self.state.unstakeMany(stakingKeys)
+        self.numberOfStakers -= len(stakingKeys)
+        return result
+
+class PlasmaStakingHistory:
+    # The snapshots of R6, newest first, sharing the live state's tree. Besides
+    # the live tree there is one untouched tree of the oldest snapshot, moved
+    # forward with the journaled operations when the oldest snapshot is
+    # dropped, and one copy of it for the COMPOUND txs to remove keys from.
+    # Holding a full PlasmaStakingState per snapshot would need emissionDelay
+    # trees instead. With a store on the live state the snapshots, journals,
+    # compounded keys and the oldest tree are saved in it, see fromStore.
+    def __init__(self, stakers: PlasmaStakingState, emissionDelay: int) -> None:
+        self._stakers = stakers
+        self._emissionDelay = emissionDelay
+        self.snapshots: list[PlasmaStakingSnapshot] = []
+        self._oldest: PlasmaStakingState = None
+
+    @staticmethod
+    def fromStore(stakers: PlasmaStakingState, emissionDelay: int, inputBox: InputBox = None) -> 'PlasmaStakingHistory':
+        # Rebuilds the history of stakers, loaded with PlasmaStakingState.fromStore.
+        # The journals are replayed on a copy of the oldest tree, every snapshot
+        # has to come out with its stored digest and the last one at the live
+        # tree. With inputBox the snapshots are also checked against R6 of the
+        # plasma staking box.
+        store = stakers._store
+        history = PlasmaStakingHistory(stakers, emissionDelay)
+        rows = store.snapshots()
+        if len(rows) == 0:
+            return history
+        journals = [store.journal(row[0]) for row in rows]
+        # The keys of the oldest tree, going back from the live keys
+        keys = SortedSet(stakers._sortedKeys)
+        for operations in reversed(journals):
+            for op, stakes in reversed(operations):
+                if op == INSERT:
+                    keys.difference_update(stakes.keys())
+                elif op == DELETE:
+                    keys.update(stakes.keys())
+        history._oldest = PlasmaStakingState(stakers._plasmaStakingConfig, stakers._plasmaParameters, PlasmaStakingState.plasmaMapFromHex(stakers._plasmaParameters, *store.oldest()), rows[0][2])
+        history._oldest._sortedKeys = keys
+        tree = history._oldest.copy()
+        for (snapshotId, numberOfStakers, totalStaked, digest), operations in zip(rows, journals):
+            if tree.digest != digest or tree.numberOfStakers != numberOfStakers or tree.totalStaked != totalStaked:
+                raise Exception(f"Rebuilt snapshot {snapshotId} ({tree.numberOfStakers} stakers, {tree.totalStaked} staked, {tree.digest}) does not match the stored one ({numberOfStakers} stakers, {totalStaked} staked, {digest})")
+            snapshot = PlasmaStakingSnapshot(numberOfStakers, totalStaked, tree._plasmaMap.ergoValue())
+            snapshot.operations = operations
+            history.snapshots.insert(0, snapshot)
+            tree.replay(operations)
+        if tree.digest != stakers.digest:
+            raise Exception(f"Replayed tree {tree.digest} does not match the live tree {stakers.digest}")
+        stakers._journal = history.snapshots[0].operations
+        compounding = history.compounding()
+        if compounding is not None:
+            for stakingKeys in store.compounded(rows[0][0]):
+                compounding.remove(stakingKeys)
+        if inputBox is not None:
+            PlasmaStakingHistory.verifySnapshots(inputBox, history.snapshots)
+        return history
+
+    @staticmethod
+    def verifySnapshots(inputBox: InputBox, snapshots: list[PlasmaStakingSnapshot]) -> None:
+        # R6 of the plasma staking box against local snapshots, newest first
+        _snapshots = inputBox.getRegisters().get(2).getValue()
+        if _snapshots.length() != len(snapshots):
+            raise Exception(f"R6 has {_snapshots.length()} snapshots, the local history {len(snapshots)}")
+        for i in range(len(snapshots)):
+            entry = _snapshots.apply(i)
+            onChain = (int(entry._1()), int(entry._2()._1()), bytes(entry._2()._2().digest().toArray()).hex())
+            local = (snapshots[i].numberOfStakers, snapshots[i].totalStaked, bytes(snapshots[i].ergoValue().getValue().digest().toArray()).hex())
+            if onChain != local:
+                raise Exception(f"Snapshot {i} of R6 {onChain} does not match the local snapshot {local}")
+
+    def snapshot(self) -> PlasmaStakingSnapshot:
+        # The SNAPSHOT tx, the oldest snapshot has to be compounded completely
+        # before it can be dropped
+        store = self._stakers._store
+        with self._stakers.transaction():
+            if len(self.snapshots) >= self._emissionDelay:
+                if self.snapshots[-1].numberOfStakers != 0:
+                    raise Exception("The oldest snapshot has not been compounded completely")
+                dropped = self.snapshots.pop()
+                self._oldest.replay(dropped.operations)
+                # Replayed up to the next snapshot, or to the live tree with an
+                # emissionDelay of 1
+                if len(self.snapshots) > 0:
+                    expected = bytes(self.snapshots[-1]._avlTree.getValue().digest().toArray()).hex()
+                else:
+                    expected = self._stakers.digest
+                if self._oldest.digest != expected:
+                    raise Exception(f"Replayed tree {self._oldest.digest} does not match the oldest snapshot {expected}")
+                if store is not None:
+                    store.dropSnapshot()
+                    store.saveOldest(*self._oldest.hexManifest())
+            snapshot = PlasmaStakingSnapshot(self._stakers.numberOfStakers, self._stakers.totalStaked, self._stakers._plasmaMap.ergoValue())
+            if self._oldest is None:
+                self._oldest = self._stakers.copy()
+                if store is not None:
+                    store.saveOldest(*self._oldest.hexManifest())
+            if store is not None:
+                store.recordSnapshot(snapshot.numberOfStakers, snapshot.totalStaked, self._stakers.digest)
+            self._stakers._journal = snapshot.operations
+            self.snapshots.insert(0, snapshot)
+            return snapshot
+
+    def compounding(self) -> PlasmaStakingSnapshot:
+        # The snapshot the COMPOUND txs pay out, None until emissionDelay
+        # snapshots were taken
+        if len(self.snapshots) < self._emissionDelay:
+            return None
+        snapshot = self.snapshots[-1]
+        if snapshot.state is None:
+            snapshot.state = self._oldest.copy()
+        return snapshot
+
+    def compounded(self, stakingKeys: list[str]) -> None:
+        # Keys an accepted COMPOUND tx removed from the oldest snapshot
+        if self._stakers._store is not None:
+            self._stakers._store.recordCompounded(stakingKeys)
+
 class PlasmaStakingContract(ErgoContractBase):
     
     def __init__(self, appKit: ErgoAppKit) -> None:       
         super().__init__(appKit, script=os.path.join(os.path.dirname(__file__),f"ergoscript/latest/plasmaStaking.es"))
 
 class PlasmaStakingBox(ErgoBox):
-    def __init__(self, appKit: ErgoAppKit, plasmaStakingConfig: PlasmaStakingConfig, nextSnapshot: int, stakers: PlasmaStakingState, stakerSnapshots: list[PlasmaStakingState], stakedTokenAmount: int) -> None:
+    def __init__(self, appKit: ErgoAppKit, plasmaStakingConfig: PlasmaStakingConfig, nextSnapshot: int, stakers: PlasmaStakingState, stakerSnapshots: list[PlasmaStakingSnapshot], stakedTokenAmount: int) -> None:
         self._appKit = appKit
         self._plasmaStakingContract = PlasmaStakingContract(appKit)
         self._config = plasmaStakingConfig
@@ -113,14 +438,10 @@ class PlasmaStakingBox(ErgoBox):
         plasmaStakingConfig: PlasmaStakingConfig, 
         plasmaStakingContract: PlasmaStakingContract,
         stakers: PlasmaStakingState,
-        snapshots: list[PlasmaStakingState]) -> 'PlasmaStakingBox':
-        _stakers = inputBox.getRegisters().get(0).getValue()
-        if _stakers.digest() != stakers._plasmaMap.ergoValue().getValue().digest():
-            print(f"_stakers.digest(): {_stakers.digest()}")
-            print(f"stakers._plasmaMap.digest(): {stakers._plasmaMap.ergoValue().getValue().digest()}")
-            raise Exception("AVLTree does not match local state")
+        snapshots: list[PlasmaStakingSnapshot]) -> 'PlasmaStakingBox':
+        stakers.verifyDigest(inputBox)
+        PlasmaStakingHistory.verifySnapshots(inputBox, snapshots)
         _params = inputBox.getRegisters().get(1).getValue()
-        #_snapshots = inputBox.getRegisters().get(2).getValue()
         stakedTokenAmount = 0 if inputBox.getTokens().size() < 2 else inputBox.getTokens().get(1).getValue()
         return PlasmaStakingBox(
             appKit=plasmaStakingContract.appKit,
@@ -132,14 +453,11 @@ class PlasmaStakingBox(ErgoBox):
 
     @property
     def totalStaked(self) -> int:
-        totalStaked = 0
-        for key in self._stakers.getKeys(0,self.numberOfStakers):
-            totalStaked += self._stakers.getStake(key)
-        return totalStaked
+        return self._stakers.totalStaked
 
     @property
     def numberOfStakers(self) -> int:
-        return len(self._stakers)
+        return self._stakers.numberOfStakers
 
     @property
     def nextSnapshot(self) -> int:
@@ -150,9 +468,11 @@ class PlasmaStakingBox(ErgoBox):
         self.updateRegisters()
 
     def updateRegisters(self):
+        # R6 is Coll[(stakers, (totalStaked, AvlTree))], newest first, and has
+        # to be there even without snapshots
         snapshots = []
         for snapshot in self._stakerSnapshots:
-            snapshots.append(ErgoValue.pairOf(scala.Tuple2(ErgoValue.of(JInt(len(snapshot._plasmaMap))),snapshot._plasmaMap.ergoValue())))
+            snapshots.append(scala.Tuple2(JLong(snapshot.numberOfStakers),scala.Tuple2(JLong(snapshot.totalStaked),snapshot.ergoValue().getValue())))
         self.registers = [
             self._stakers._plasmaMap.ergoValue(),
             ErgoAppKit.ergoValue([
@@ -164,8 +484,7 @@ class PlasmaStakingBox(ErgoBox):
                 self.totalStaked
             ],ErgoValueT.LongArray)
         ]
-        if len(snapshots) > 0:
-            self.registers.append(ErgoValue.of(snapshots))
+        self.registers.append(ErgoValue.of(snapshots,ErgoType.pairType(ErgoType.longType(),ErgoType.pairType(ErgoType.longType(),ErgoType.avlTreeType()))))
 
     def stake(self, stakingKey: str, amount: int) -> getblok_plasma.collections.ProvenResult:
         self._stakedTokenAmount += amount
@@ -200,6 +519,241 @@ class PlasmaStakingBox(ErgoBox):
         self.updateRegisters()
         return returnVal
 
+    def copy(self) -> 'PlasmaStakingBox':
+        # The same box on copies of the trees, to build txs on before they are
+        # accepted
+        return PlasmaStakingBox(
+            appKit=self._appKit,
+            plasmaStakingConfig=self._config,
+            nextSnapshot=self._nextSnapshot,
+            stakers=self._stakers.copy(),
+            stakerSnapshots=[snapshot.copy() for snapshot in self._stakerSnapshots],
+            stakedTokenAmount=self._stakedTokenAmount)
+
+    def compoundedStakes(self, snapshot: PlasmaStakingSnapshot, stakingKeys: list[str]) -> dict[str,int]:
+        # New stakes as the COMPOUND op checks them, the reward is the share of
+        # the emission of the stake in the snapshot. Keys that unstaked since
+        # get 0 and are only removed from the snapshot.
+        compoundRewards = rewards.compoundRewards(snapshot.state.currentStakes(stakingKeys), self._config.emissionAmount, snapshot.totalStaked)
+        staking = [key for key in stakingKeys if key in self._stakers._sortedKeys]
+        if len(staking) == 0:
+            return {key: 0 for key in stakingKeys}
+        if len(staking) != len(stakingKeys):
+            raise Exception("Keys that are staking and keys that unstaked need separate compound txs")
+        currentStakes = self._stakers.currentStakes(stakingKeys)
+        return {stakingKeys[i]: currentStakes[i] + compoundRewards[i] for i in range(len(stakingKeys))}
+
+    def compound(self, snapshot: PlasmaStakingSnapshot, stakingKeys: list[str]) -> tuple[dict[str,int], getblok_plasma.collections.ProvenResult, getblok_plasma.collections.ProvenResult]:
+        # The contract reads the live proof for getMany and for update, and the
+        # snapshot proof for getMany and remove, with the keys in the same
+        # order. An update proof covers the lookups of the same keys, keys that
+        # unstaked get a lookup proof with nothing to update.
+        newStakes = self.compoundedStakes(snapshot, stakingKeys)
+        if stakingKeys[0] in self._stakers._sortedKeys:
+            liveResult = self._stakers.changeStakes(newStakes)
+        else:
+            liveResult = self._stakers.getStakes(stakingKeys)
+        snapshotResult = snapshot.remove(stakingKeys)
+        self.updateRegisters()
+        return newStakes, liveResult, snapshotResult
+
+class PlasmaCompoundCostModel:
+    # Script cost of a COMPOUND tx with n keys. keys.indexOf in the map and
+    # forall of the contract makes it quadratic in the keys, the AvlTree
+    # operations read both proofs twice. The defaults are conservative
+    # estimates, pass measured values to pack closer to the limit.
+    def __init__(self, baseCost: int = 30000, keyCost: int = 2500, indexOfCost: int = 20, proofByteCost: int = 4) -> None:
+        self.baseCost = baseCost
+        self.keyCost = keyCost
+        self.indexOfCost = indexOfCost
+        self.proofByteCost = proofByteCost
+
+    def cost(self, keys: int, proofBytes: int) -> int:
+        return self.baseCost + self.keyCost * keys + self.indexOfCost * keys * keys + self.proofByteCost * proofBytes
+
+class PlasmaCompoundPlanner:
+    # Batches of keys from the oldest snapshot, in sorted order, as large as the
+    # size and cost limits allow with their proofs. Proof sizes come from
+    # lookups, which leave the trees alone. A removal proof is larger than a
+    # lookup proof of the same keys, removalFactor accounts for that.
+    # baseSize covers the rest of the tx: the plasma staking box in and out, the
+    # fee input and the change.
+    def __init__(
+        self,
+        maxSize: int = maxTransactionSize,
+        maxCost: int = maxTransactionCost,
+        costModel: PlasmaCompoundCostModel = None,
+        baseSize: int = 4096,
+        removalFactor: float = 2,
+        pageSize: int = 1000) -> None:
+        self.maxSize = maxSize
+        self.maxCost = maxCost
+        self.costModel = costModel if costModel is not None else PlasmaCompoundCostModel()
+        self.baseSize = baseSize
+        self.removalFactor = removalFactor
+        self.pageSize = pageSize
+
+    def size(self, keys: int, liveProof: int, snapshotProof: int) -> int:
+        # Context vars 1 to 3: (key, 8 byte stake) pairs and the two proofs
+        operations = vlqSize(keys) + keys * (1 + 32 + 1 + 8)
+        return self.baseSize + operations + vlqSize(liveProof) + liveProof + vlqSize(snapshotProof) + snapshotProof
+
+    def withinLimits(self, keys: int, liveProof: int, snapshotProof: int) -> bool:
+        return (self.size(keys, liveProof, snapshotProof) <= self.maxSize
+            and self.costModel.cost(keys, liveProof + snapshotProof) <= self.maxCost)
+
+    def fits(self, stakers: PlasmaStakingState, snapshot: PlasmaStakingSnapshot, stakingKeys: list[str]) -> bool:
+        liveProof = len(stakers.getStakes(stakingKeys).proof().bytes())
+        snapshotProof = int(len(snapshot.state.getStakes(stakingKeys).proof().bytes()) * self.removalFactor)
+        return self.withinLimits(len(stakingKeys), liveProof, snapshotProof)
+
+    def nextBatch(self, stakers: PlasmaStakingState, snapshot: PlasmaStakingSnapshot) -> list[str]:
+        # Compounded keys leave the snapshot, so the next keys are always on the
+        # first page
+        keys = snapshot.state.getKeys(0, self.pageSize)
+        if len(keys) == 0:
+            return []
+        staking = keys[0] in stakers._sortedKeys
+        group = [key for key in keys if (key in stakers._sortedKeys) == staking]
+        count = largestFitting(lambda n: self.fits(stakers, snapshot, group[:n]), len(group))
+        if count == 0:
+            raise Exception("A single key does not fit in a compound tx")
+        return group[:count]
+
+class CompoundTransaction(ErgoTransaction):
+    def __init__(
+            self,
+            plasmaStakingInput: InputBox,
+            plasmaStakingBox: PlasmaStakingBox,
+            newStakes: dict[str,int],
+            liveResult: getblok_plasma.collections.ProvenResult,
+            snapshotResult: getblok_plasma.collections.ProvenResult,
+            feeInputs: list[InputBox],
+            address: str) -> None:
+        # plasmaStakingBox after compound, which gave newStakes and the proofs
+        super().__init__(plasmaStakingBox._appKit)
+        stakingKeys = list(newStakes.keys())
+        compoundOperations = [scala.Tuple2(
+                        ErgoValue.of(getblok_plasma.ByteConversion.convertsId().convertToBytes(ErgoId.create(key))).getValue(),
+                        ErgoValue.of(getblok_plasma.ByteConversion.convertsLongVal().convertToBytes(newStakes[key])).getValue())
+                    for key in stakingKeys]
+        plasmaStakingInput = plasmaStakingInput.withContextVars(
+            ContextVar.of(0,JByte(4)),
+            ContextVar.of(1,
+                ErgoValue.of(
+                    compoundOperations,
+                    ErgoType.pairType(ErgoType.collType(ErgoType.byteType()),ErgoType.collType(ErgoType.byteType()))
+                )
+            ),
+            ContextVar.of(2,liveResult.proof().ergoValue()),
+            ContextVar.of(3,snapshotResult.proof().ergoValue())
+        )
+        self.inputs = [plasmaStakingInput] + feeInputs
+        self.outputs = [plasmaStakingBox.outBox]
+        self.fee = int(1e6)
+        self.changeAddress = address
+
+@dataclass
+class ChainedPlasmaCompound:
+    stakingKeys: list[str]
+    signedTx: SignedTransaction
+    txId: str = None
+
+class PlasmaCompoundChain(TransactionChain):
+    # Pays out the oldest snapshot of history. Every compound tx spends the
+    # plasma staking box and the change of the tx before it, so the chain is
+    # signed locally and submitted without waiting for confirmations. The chain
+    # is built on copies of the trees, the real state, its store and journal
+    # only change for the txs the node accepted. The fee boxes belong to
+    # address, override signTransaction to sign them.
+    def __init__(
+            self,
+            plasmaStakingBox: PlasmaStakingBox,
+            history: PlasmaStakingHistory,
+            address: str,
+            planner: PlasmaCompoundPlanner = None) -> None:
+        super().__init__(plasmaStakingBox._appKit)
+        self.plasmaStakingBox = plasmaStakingBox
+        self.history = history
+        self.address = address
+        self.planner = planner if planner is not None else PlasmaCompoundPlanner()
+        # Unspent plasma staking box after the last run
+        self.plasmaStakingOutput: InputBox = None
+
+    def _compounding(self) -> PlasmaStakingSnapshot:
+        snapshot = self.history.compounding()
+        if snapshot is None:
+            raise Exception("No snapshot to compound before emissionDelay snapshots")
+        return snapshot
+
+    def build(self, plasmaStakingInput: InputBox, feeInputs: list[InputBox], maxTransactions: int = None) -> list[ChainedPlasmaCompound]:
+        snapshot = self._compounding()
+        # One copy of the box and trees for the whole chain
+        box = self.plasmaStakingBox.copy()
+        scratchSnapshot = box._stakerSnapshots[self.plasmaStakingBox._stakerSnapshots.index(snapshot)]
+        addressTree = self.appKit.contractFromAddress(self.address).getErgoTree().bytesHex()
+        chain = []
+        while len(scratchSnapshot.state) > 0 and (maxTransactions is None or len(chain) < maxTransactions):
+            stakingKeys = self.planner.nextBatch(box._stakers, scratchSnapshot)
+            while True:
+                # To go back to the last link when the proofs are too large. An
+                # update leaves the shape of the live tree alone and is undone
+                # with the old stakes, the removals need a copy of the snapshot
+                # tree.
+                oldStakes = None
+                if stakingKeys[0] in box._stakers._sortedKeys:
+                    oldStakes = dict(zip(stakingKeys, box._stakers.currentStakes(stakingKeys)))
+                oldState = scratchSnapshot.state.copy()
+                oldStakers = scratchSnapshot.numberOfStakers
+                newStakes, liveResult, snapshotResult = box.compound(scratchSnapshot, stakingKeys)
+                liveProof = len(liveResult.proof().bytes())
+                snapshotProof = len(snapshotResult.proof().bytes())
+                if self.planner.withinLimits(len(stakingKeys), liveProof, snapshotProof):
+                    break
+                # The proofs came out larger than estimated, try again with fewer
+                # keys
+                if len(stakingKeys) == 1:
+                    raise Exception("A single key does not fit in a compound tx")
+                if oldStakes is not None:
+                    box._stakers.changeStakes(oldStakes)
+                scratchSnapshot.state = oldState
+                scratchSnapshot.numberOfStakers = oldStakers
+                size = self.planner.size(len(stakingKeys), liveProof, snapshotProof)
+                stakingKeys = stakingKeys[:max(1, min(len(stakingKeys) - 1, len(stakingKeys) * self.planner.maxSize // size))]
+            signedTx = self.signTransaction(CompoundTransaction(
+                plasmaStakingInput,
+                box,
+                newStakes,
+                liveResult,
+                snapshotResult,
+                feeInputs,
+                self.address).unsignedTx)
+            plasmaStakingInput = signedTx.getOutputsToSpend()[0]
+            feeInputs = [b for b in signedTx.getOutputsToSpend() if b.getErgoTree().bytesHex() == addressTree]
+            chain.append(ChainedPlasmaCompound(stakingKeys, signedTx))
+        return chain
+
+    def apply(self, link: ChainedPlasmaCompound) -> None:
+        # An accepted tx, in one commit of the store
+        with self.plasmaStakingBox._stakers.transaction():
+            self.plasmaStakingBox.compound(self._compounding(), link.stakingKeys)
+            self.history.compounded(link.stakingKeys)
+
+    def run(self, plasmaStakingInput: InputBox, feeInputs: list[InputBox], maxTransactions: int = None) -> list[str]:
+        # Submits the chain until the node rejects a tx, the rest is left for
+        # the next run on top of plasmaStakingOutput
+        txIds = []
+        self.plasmaStakingOutput = plasmaStakingInput
+        for link in self.build(plasmaStakingInput, feeInputs, maxTransactions):
+            try:
+                link.txId = self.sendTransaction(link.signedTx)
+            except rejectionExceptions:
+                break
+            self.apply(link)
+            txIds.append(link.txId)
+            self.plasmaStakingOutput = link.signedTx.getOutputsToSpend()[0]
+        return txIds
+
 class StakeTransaction(ErgoTransaction):
     def __init__(
             self,
@@ -207,16 +761,21 @@ class StakeTransaction(ErgoTransaction):
             plasmaStakingContract: PlasmaStakingContract,
             plasmaStakingConfig: PlasmaStakingConfig,
             stakers: PlasmaStakingState,
-            snapshots: list[PlasmaStakingState],
+            snapshots: list[PlasmaStakingSnapshot],
             address) -> None:
         super().__init__(plasmaStakingContract.appKit)
-        plasmaStakingBox = PlasmaStakingBox.fromInputBox(
+        # Built on a copy, the real state and its store only change in apply
+        # once the node accepted the tx
+        self.plasmaStakingBox = PlasmaStakingBox.fromInputBox(
             inputBox=plasmaStakingInput,
             plasmaStakingConfig=plasmaStakingConfig,
             plasmaStakingContract=plasmaStakingContract,
             stakers=stakers,
             snapshots=snapshots
         )
+        plasmaStakingBox = self.plasmaStakingBox.copy()
+        self.stakingKey = plasmaStakingInput.getId().toString()
+        self.amount = 100
         dummyUserInput = ErgoBox(
             appKit=plasmaStakingContract.appKit,
             value=int(1e6),
@@ -232,13 +791,7 @@ class StakeTransaction(ErgoTransaction):
             decimals=0,
             contract=plasmaStakingContract.appKit.dummyContract()
         )
-        provenResult = plasmaStakingBox.stake(plasmaStakingInput.getId().toString(),100)
-        print(provenResult)
-        opList = [ErgoValue.pairOf(scala.Tuple2(
-                        ErgoValue.of(getblok_plasma.ByteConversion.convertsId().convertToBytes(plasmaStakingInput.getId())),
-                        ErgoValue.of(getblok_plasma.ByteConversion.convertsLongVal().convertToBytes(100))))
-                    ]
-        print(opList[0].getValue()._1())
+        provenResult = plasmaStakingBox.stake(self.stakingKey,self.amount)
         plasmaStakingInput = plasmaStakingInput.withContextVars(
             ContextVar.of(0,JByte(0)),
             ContextVar.of(1,
@@ -257,37 +810,44 @@ class StakeTransaction(ErgoTransaction):
         self.fee = int(1e6)
         self.changeAddress = address
 
+    def apply(self) -> None:
+        # The tx was accepted, in one commit of the store
+        with self.plasmaStakingBox._stakers.transaction():
+            self.plasmaStakingBox.stake(self.stakingKey, self.amount)
+
 
-appKit = ErgoAppKit("http://ergolui.com:9053","mainnet","https://api.ergoplatform.com/api/v1")
+# Example of a stake tx against a local plasma state, needs a node
+if __name__ == "__main__":
+    appKit = ErgoAppKit("http://ergolui.com:9053","mainnet","https://api.ergoplatform.com/api/v1")
 
-plasmaStakingContract = PlasmaStakingContract(appKit)
+    plasmaStakingContract = PlasmaStakingContract(appKit)
 
-plasmaStakingConfig = PlasmaStakingConfig(
-    nftId="29d6c2d943d7f5a2800095dba6b6168f1602d355480218f4a8a8c6575245a907",
-    stakedTokenId="0cd8c9f416e5b1ca9f986a7f10a84191dfb85941619e49e53c0dc30ebf83324b",
-    emissionAmount=100000,
-    emissionDelay=10,
-    cycleLength=3600000
-)
+    plasmaStakingConfig = PlasmaStakingConfig(
+        nftId="29d6c2d943d7f5a2800095dba6b6168f1602d355480218f4a8a8c6575245a907",
+        stakedTokenId="0cd8c9f416e5b1ca9f986a7f10a84191dfb85941619e49e53c0dc30ebf83324b",
+        emissionAmount=100000,
+        emissionDelay=10,
+        cycleLength=3600000
+    )
 
-plasmaStakingState = PlasmaStakingState(plasmaStakingConfig=plasmaStakingConfig)
+    plasmaStakingState = PlasmaStakingState(plasmaStakingConfig=plasmaStakingConfig)
 
-plasmaInitial = PlasmaStakingBox(
-    appKit=appKit,
-    plasmaStakingConfig=plasmaStakingConfig,
-    nextSnapshot=1000000,
-    stakers=plasmaStakingState,
-    stakerSnapshots=[],
-    stakedTokenAmount=10000000
-).inputBox()
+    plasmaInitial = PlasmaStakingBox(
+        appKit=appKit,
+        plasmaStakingConfig=plasmaStakingConfig,
+        nextSnapshot=1000000,
+        stakers=plasmaStakingState,
+        stakerSnapshots=[],
+        stakedTokenAmount=10000000
+    ).inputBox()
 
-unsignedStakeTransaction = StakeTransaction(
-    plasmaStakingInput=plasmaInitial,
-    plasmaStakingContract=plasmaStakingContract,
-    plasmaStakingConfig=plasmaStakingConfig,
-    stakers=plasmaStakingState,
-    snapshots=[],
-    address=appKit.dummyContract().toAddress().toString()
-)
+    unsignedStakeTransaction = StakeTransaction(
+        plasmaStakingInput=plasmaInitial,
+        plasmaStakingContract=plasmaStakingContract,
+        plasmaStakingConfig=plasmaStakingConfig,
+        stakers=plasmaStakingState,
+        snapshots=[],
+        address=appKit.dummyContract().toAddress().toString()
+    )
 
-appKit.signTransaction(unsignedTx=unsignedStakeTransaction)
+    appKit.signTransaction(unsignedTx=unsignedStakeTransaction)
@@ -0,0 +1,236 @@
+from contextlib import contextmanager
+import json
+import sqlite3
+from typing import Dict, Iterator, List, Optional, Tuple
+
+INSERT = "insert"
+DELETE = "delete"
+UPDATE = "update"
+
+_schema = """
+CREATE TABLE IF NOT EXISTS stakers (
+    stakingKey TEXT PRIMARY KEY,
+    amount INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS operations (
+    id INTEGER PRIMARY KEY,
+    op TEXT NOT NULL,
+    stakes TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS state (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    digest TEXT NOT NULL,
+    totalStaked INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS checkpoint (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    digest TEXT NOT NULL,
+    manifest TEXT NOT NULL,
+    subtrees TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS snapshots (
+    id INTEGER PRIMARY KEY,
+    stakers INTEGER NOT NULL,
+    totalStaked INTEGER NOT NULL,
+    digest TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS journal (
+    id INTEGER PRIMARY KEY,
+    snapshot INTEGER NOT NULL,
+    op TEXT NOT NULL,
+    stakes TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS compounded (
+    id INTEGER PRIMARY KEY,
+    snapshot INTEGER NOT NULL,
+    stakingKeys TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS oldest (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    digest TEXT NOT NULL,
+    manifest TEXT NOT NULL,
+    subtrees TEXT NOT NULL
+);
+"""
+
+
+class PlasmaStakingStore:
+    # The staking tree of a PlasmaStakingState in an SQLite file. The shape of
+    # an AVL+ tree, and with it the digest, depends on the order of the
+    # operations that built it. The tree is saved as a checkpoint (the hex of
+    # its manifest) every checkpointInterval operations, with the operations
+    # after it kept in order, together with the current stakes, the digest and
+    # the total staked. For PlasmaStakingHistory it also keeps the snapshots,
+    # the operations of the live tree after each of them, the keys compounded
+    # from the oldest one and the tree of the oldest one.
+    def __init__(self, path: str = ":memory:", checkpointInterval: int = 1000) -> None:
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript(_schema)
+        self._depth = 0
+        self.checkpointInterval = checkpointInterval
+
+    @contextmanager
+    def transaction(self) -> Iterator["PlasmaStakingStore"]:
+        # Everything recorded inside is committed at once, use one per applied
+        # tx. On an exception nothing is committed and the state using the
+        # store should be reopened with PlasmaStakingState.fromStore.
+        self._depth += 1
+        try:
+            yield self
+        except BaseException:
+            self._depth -= 1
+            if self._depth == 0:
+                self._db.rollback()
+            raise
+        self._depth -= 1
+        if self._depth == 0:
+            self._db.commit()
+
+    def record(
+        self, op: str, stakes: Dict[str, Optional[int]], digest: str, totalStaked: int
+    ) -> None:
+        # stakes are the new amounts, None for the deleted keys
+        with self.transaction():
+            self._db.execute(
+                "INSERT INTO operations (op, stakes) VALUES (?, ?)",
+                (op, json.dumps(stakes)),
+            )
+            if op == DELETE:
+                self._db.executemany(
+                    "DELETE FROM stakers WHERE stakingKey = ?",
+                    [(key,) for key in stakes],
+                )
+            else:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO stakers VALUES (?, ?)", stakes.items()
+                )
+            self._db.execute(
+                "INSERT OR REPLACE INTO state VALUES (0, ?, ?)", (digest, totalStaked)
+            )
+
+    def _saveTree(
+        self, table: str, digest: str, manifest: str, subtrees: List[str]
+    ) -> None:
+        self._db.execute(
+            f"INSERT OR REPLACE INTO {table} VALUES (0, ?, ?, ?)",
+            (digest, manifest, json.dumps(subtrees)),
+        )
+
+    def _tree(self, table: str) -> Optional[Tuple[str, str, List[str]]]:
+        row = self._db.execute(
+            f"SELECT digest, manifest, subtrees FROM {table} WHERE id = 0"
+        ).fetchone()
+        if row is None:
+            return None
+        return row[0], row[1], json.loads(row[2])
+
+    def saveCheckpoint(self, digest: str, manifest: str, subtrees: List[str]) -> None:
+        # The tree after the last recorded operation, which are no longer
+        # needed to rebuild it
+        with self.transaction():
+            self._saveTree("checkpoint", digest, manifest, subtrees)
+            self._db.execute("DELETE FROM operations")
+
+    def checkpoint(self) -> Optional[Tuple[str, str, List[str]]]:
+        return self._tree("checkpoint")
+
+    def checkpointDue(self) -> bool:
+        return (
+            self._db.execute("SELECT COUNT(*) FROM operations").fetchone()[0]
+            >= self.checkpointInterval
+        )
+
+    def state(self) -> Optional[Tuple[str, int]]:
+        # Digest (hex) and total staked after the last committed operation
+        return self._db.execute(
+            "SELECT digest, totalStaked FROM state WHERE id = 0"
+        ).fetchone()
+
+    def stakes(self) -> Dict[str, int]:
+        return dict(self._db.execute("SELECT stakingKey, amount FROM stakers"))
+
+    def batches(self) -> Iterator[Tuple[str, Dict[str, Optional[int]]]]:
+        # The operations recorded after the checkpoint in order, consecutive
+        # ones of the same kind merged so the tree is rebuilt with few calls. A
+        # key is only inserted or deleted again after an operation of the other
+        # kind, so merging keeps the order of the tree operations.
+        op = None
+        batch: Dict[str, Optional[int]] = {}
+        for nextOp, stakes in self._db.execute(
+            "SELECT op, stakes FROM operations ORDER BY id"
+        ):
+            if nextOp != op and len(batch) > 0:
+                yield op, batch
+                batch = {}
+            op = nextOp
+            batch.update(json.loads(stakes))
+        if len(batch) > 0:
+            yield op, batch
+
+    def recordSnapshot(self, stakers: int, totalStaked: int, digest: str) -> None:
+        with self.transaction():
+            self._db.execute(
+                "INSERT INTO snapshots (stakers, totalStaked, digest) VALUES (?, ?, ?)",
+                (stakers, totalStaked, digest),
+            )
+
+    def recordJournal(self, op: str, stakes: Dict[str, Optional[int]]) -> None:
+        # An operation of the live tree after the newest snapshot
+        with self.transaction():
+            self._db.execute(
+                "INSERT INTO journal (snapshot, op, stakes) "
+                "VALUES ((SELECT MAX(id) FROM snapshots), ?, ?)",
+                (op, json.dumps(stakes)),
+            )
+
+    def recordCompounded(self, stakingKeys: List[str]) -> None:
+        # Keys removed from the oldest snapshot by one COMPOUND tx
+        with self.transaction():
+            self._db.execute(
+                "INSERT INTO compounded (snapshot, stakingKeys) "
+                "VALUES ((SELECT MIN(id) FROM snapshots), ?)",
+                (json.dumps(stakingKeys),),
+            )
+
+    def saveOldest(self, digest: str, manifest: str, subtrees: List[str]) -> None:
+        with self.transaction():
+            self._saveTree("oldest", digest, manifest, subtrees)
+
+    def oldest(self) -> Optional[Tuple[str, str, List[str]]]:
+        # The tree of the oldest snapshot, as it was taken
+        return self._tree("oldest")
+
+    def dropSnapshot(self) -> None:
+        # The oldest snapshot, with its journal and compounded keys
+        with self.transaction():
+            snapshot = self._db.execute("SELECT MIN(id) FROM snapshots").fetchone()[0]
+            for table in ["journal", "compounded"]:
+                self._db.execute(f"DELETE FROM {table} WHERE snapshot = ?", (snapshot,))
+            self._db.execute("DELETE FROM snapshots WHERE id = ?", (snapshot,))
+
+    def snapshots(self) -> List[Tuple[int, int, int, str]]:
+        # Id, stakers, total staked and digest at the SNAPSHOT tx, oldest first
+        return self._db.execute(
+            "SELECT id, stakers, totalStaked, digest FROM snapshots ORDER BY id"
+        ).fetchall()
+
+    def journal(self, snapshot: int) -> List[Tuple[str, Dict[str, Optional[int]]]]:
+        return [
+            (op, json.loads(stakes))
+            for op, stakes in self._db.execute(
+                "SELECT op, stakes FROM journal WHERE snapshot = ? ORDER BY id",
+                (snapshot,),
+            )
+        ]
+
+    def compounded(self, snapshot: int) -> List[List[str]]:
+        return [
+            json.loads(stakingKeys)
+            for stakingKeys, in self._db.execute(
+                "SELECT stakingKeys FROM compounded WHERE snapshot = ? ORDER BY id",
+                (snapshot,),
+            )
+        ]
+
+    def close(self) -> None:
+        self._db.close()
@@ -1,5 +1,8 @@
+from array import array
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from datetime import datetime
+from functools import partial
 from hashlib import blake2b
 import os
 from time import time
@@ -14,6 +17,8 @@ from sigmastate.Values import ErgoTree
 
 from ergo_python_appkit.ErgoTransaction import ErgoTransaction
 
+from paideia_contracts.contracts.staking import codec, compilation, dust, rewards
+
 
 class InvalidInputBoxException(Exception):
     pass
@@ -38,7 +43,16 @@ class PaideiaStakingContract(ErgoContractBase):
         ergoTree: ErgoTree = None,
     ) -> None:
         self.config = stakingConfig
-        super().__init__(self.config.appKit, script, mapping, ergoTree)
+        self._script = script
+        self._mapping = mapping
+        if script is not None and ergoTree is None:
+            # Identical contracts share one ErgoTree and ErgoContract per process
+            self.appKit = self.config.appKit
+            self._ergoTree, self.contract = compilation.contractRegistry.get(
+                self.appKit, script, mapping
+            )
+        else:
+            super().__init__(self.config.appKit, script, mapping, ergoTree)
 
     @property
     def config(self):
@@ -360,7 +374,29 @@ class UnstakeProxyContract(PaideiaStakingContract):
         return super().validateInputBox(inBox)
 
 
-class EmissionBox(ErgoBox):
+class PaideiaStakingBox(ErgoBox):
+    # Setters only mark the registers dirty, they are encoded once when the
+    # registers are read, which happens when building the OutBox or InputBox.
+    def updateRegisters(self) -> None:
+        self._registersDirty = True
+
+    def encodeRegisters(self) -> List[ErgoValue]:
+        return []
+
+    @property
+    def registers(self) -> List[ErgoValue]:
+        if self._registersDirty:
+            self._registers = self.encodeRegisters()
+            self._registersDirty = False
+        return self._registers
+
+    @registers.setter
+    def registers(self, registers: List[ErgoValue]) -> None:
+        self._registers = registers
+        self._registersDirty = False
+
+
+class EmissionBox(PaideiaStakingBox):
     def __init__(
         self,
         appKit: ErgoAppKit,
@@ -375,28 +411,22 @@ class EmissionBox(ErgoBox):
         tokens = {self.emissionContract.config.emissionNFT: 1}
         if emissionRemaining > 0:
             tokens[self.emissionContract.config.stakedTokenId] = emissionRemaining
-        registers = [
-            ErgoAppKit.ergoValue(
-                [amountStaked, checkpoint, stakers, emissionAmount],
-                ErgoValueT.LongArray,
-            )
-        ]
 
-        super().__init__(appKit, int(1e6), emissionContract.contract, tokens, registers)
+        super().__init__(appKit, int(1e6), emissionContract.contract, tokens)
 
         self._emissionRemaining = emissionRemaining
         self._amountStaked = amountStaked
         self._checkpoint = checkpoint
         self._stakers = stakers
         self._emissionAmount = emissionAmount
+        self.updateRegisters()
 
     @staticmethod
     def fromInputBox(inputBox: InputBox, emissionContract: EmissionContract):
         registers = inputBox.getRegisters()
-        amountStaked = int(registers[0].getValue().apply(0))
-        checkpoint = int(registers[0].getValue().apply(1))
-        stakers = int(registers[0].getValue().apply(2))
-        emissionAmount = int(registers[0].getValue().apply(3))
+        amountStaked, checkpoint, stakers, emissionAmount = codec.decodeLongArray(
+            codec.registerBytes(registers[0])
+        )
         if len(inputBox.getTokens()) > 1:
             emissionRemaining = int(inputBox.getTokens()[1].getValue())
         else:
@@ -411,8 +441,8 @@ class EmissionBox(ErgoBox):
             emissionRemaining=emissionRemaining,
         )
 
-    def updateRegisters(self):
-        self.registers = [
+    def encodeRegisters(self) -> List[ErgoValue]:
+        return [
             ErgoAppKit.ergoValue(
                 [self.amountStaked, self.checkpoint, self.stakers, self.emissionAmount],
                 ErgoValueT.LongArray,
@@ -476,7 +506,28 @@ class EmissionBox(ErgoBox):
         self._emissionContract = emissionContract
 
 
-class StakeBox(ErgoBox):
+@dataclass
+class StakeBoxColumns:
+    checkpoint: array
+    stakeTime: array
+    amountStaked: array
+    stakeKey: List[str]
+
+    def __len__(self) -> int:
+        return len(self.stakeKey)
+
+    def stakeBox(self, index: int, stakeContract: StakeContract):
+        return StakeBox(
+            appKit=stakeContract.appKit,
+            stakeContract=stakeContract,
+            checkpoint=self.checkpoint[index],
+            stakeTime=self.stakeTime[index],
+            amountStaked=self.amountStaked[index],
+            stakeKey=self.stakeKey[index],
+        )
+
+
+class StakeBox(PaideiaStakingBox):
     def __init__(
         self,
         appKit: ErgoAppKit,
@@ -493,25 +544,21 @@ class StakeBox(ErgoBox):
             self.stakeContract.config.stakeTokenId: 1,
             self.stakeContract.config.stakedTokenId: amountStaked,
         }
-        registers = [
-            ErgoAppKit.ergoValue([checkpoint, stakeTime], ErgoValueT.LongArray),
-            ErgoAppKit.ergoValue(stakeKey, ErgoValueT.ByteArrayFromHex),
-        ]
 
-        super().__init__(appKit, int(1e6), stakeContract.contract, tokens, registers)
+        super().__init__(appKit, int(1e6), stakeContract.contract, tokens)
 
         self._amountStaked = amountStaked
         self._checkpoint = checkpoint
         self._stakeTime = stakeTime
         self._stakeKey = stakeKey
+        self.updateRegisters()
 
     @staticmethod
     def fromInputBox(inputBox: InputBox, stakeContract: StakeContract):
         registers = inputBox.getRegisters()
-        checkpoint = int(registers[0].getValue().apply(0))
-        stakeTime = int(registers[0].getValue().apply(1))
+        checkpoint, stakeTime = codec.decodeLongArray(codec.registerBytes(registers[0]))
         amountStaked = int(inputBox.getTokens()[1].getValue())
-        stakeKey = registers[1].toHex()[4:]
+        stakeKey = codec.decodeByteArray(codec.registerBytes(registers[1])).hex()
         return StakeBox(
             appKit=stakeContract.appKit,
             stakeContract=stakeContract,
@@ -521,8 +568,28 @@ class StakeBox(ErgoBox):
             stakeKey=stakeKey,
         )
 
-    def updateRegisters(self):
-        self.registers = [
+    @staticmethod
+    def fromInputBoxes(
+        inputBoxes: List[InputBox], stakeContract: StakeContract
+    ) -> StakeBoxColumns:
+        # Decodes only the stake box fields, full StakeBox objects are created
+        # when needed through StakeBoxColumns.stakeBox
+        columns = StakeBoxColumns(array("q"), array("q"), array("q"), [])
+        for inputBox in inputBoxes:
+            registers = inputBox.getRegisters()
+            checkpoint, stakeTime = codec.decodeLongArray(
+                codec.registerBytes(registers[0])
+            )
+            columns.checkpoint.append(checkpoint)
+            columns.stakeTime.append(stakeTime)
+            columns.amountStaked.append(int(inputBox.getTokens()[1].getValue()))
+            columns.stakeKey.append(
+                codec.decodeByteArray(codec.registerBytes(registers[1])).hex()
+            )
+        return columns
+
+    def encodeRegisters(self) -> List[ErgoValue]:
+        return [
             ErgoAppKit.ergoValue(
                 [self.checkpoint, self.stakeTime], ErgoValueT.LongArray
             ),
@@ -574,7 +641,7 @@ class StakeBox(ErgoBox):
         self._stakeContract = stakeContract
 
 
-class StakeStateBox(ErgoBox):
+class StakeStateBox(PaideiaStakingBox):
     def __init__(
         self,
         appKit: ErgoAppKit,
@@ -590,31 +657,26 @@ class StakeStateBox(ErgoBox):
             self.stakeStateContract.config.stakeStateNFT: 1,
             self.stakeStateContract.config.stakeTokenId: int(1e12) - stakers,
         }
-        registers = [
-            ErgoAppKit.ergoValue(
-                [amountStaked, checkpoint, stakers, checkpointTime, cycleDuration],
-                ErgoValueT.LongArray,
-            )
-        ]
 
-        super().__init__(
-            appKit, int(1e6), stakeStateContract.contract, tokens, registers
-        )
+        super().__init__(appKit, int(1e6), stakeStateContract.contract, tokens)
 
         self._amountStaked = amountStaked
         self._checkpoint = checkpoint
         self._checkpointTime = checkpointTime
         self._cycleDuration = cycleDuration
         self._stakers = stakers
+        self.updateRegisters()
 
     @staticmethod
     def fromInputBox(inputBox: InputBox, stakeStateContact: StakeStateContract):
         registers = inputBox.getRegisters()
-        amountStaked = int(registers[0].getValue().apply(0))
-        checkpoint = int(registers[0].getValue().apply(1))
-        stakers = int(registers[0].getValue().apply(2))
-        checkpointTime = int(registers[0].getValue().apply(3))
-        cycleDuration = int(registers[0].getValue().apply(4))
+        (
+            amountStaked,
+            checkpoint,
+            stakers,
+            checkpointTime,
+            cycleDuration,
+        ) = codec.decodeLongArray(codec.registerBytes(registers[0]))
         return StakeStateBox(
             appKit=stakeStateContact.appKit,
             stakeStateContract=stakeStateContact,
@@ -625,8 +687,8 @@ class StakeStateBox(ErgoBox):
             stakers=stakers,
         )
 
-    def updateRegisters(self):
-        self.registers = [
+    def encodeRegisters(self) -> List[ErgoValue]:
+        return [
             ErgoAppKit.ergoValue(
                 [
                     self.amountStaked,
@@ -694,7 +756,7 @@ class StakeStateBox(ErgoBox):
         self._stakeStateContract = stakeStateContract
 
 
-class StakePoolBox(ErgoBox):
+class StakePoolBox(PaideiaStakingBox):
     def __init__(
         self,
         appKit: ErgoAppKit,
@@ -707,25 +769,18 @@ class StakePoolBox(ErgoBox):
             self.stakePoolContract.config.stakePoolNFT: 1,
             self.stakePoolContract.config.stakedTokenId: remaining,
         }
-        registers = [
-            ErgoAppKit.ergoValue([emissionAmount], ErgoValueT.LongArray),
-            ErgoAppKit.ergoValue(
-                stakePoolContract.config.stakePoolKey, ErgoValueT.ByteArrayFromHex
-            ),
-        ]
 
-        super().__init__(
-            appKit, int(1e6), stakePoolContract.contract, tokens, registers
-        )
+        super().__init__(appKit, int(1e6), stakePoolContract.contract, tokens)
 
         self._remaining = remaining
         self._emissionAmount = emissionAmount
         self._stakePoolKey = stakePoolContract.config.stakePoolKey
+        self.updateRegisters()
 
     @staticmethod
     def fromInputBox(inputBox: InputBox, stakePoolContract: StakePoolContract):
         registers = inputBox.getRegisters()
-        emissionAmount = int(registers[0].getValue().apply(0))
+        (emissionAmount,) = codec.decodeLongArray(codec.registerBytes(registers[0]))
         remaining = int(inputBox.getTokens()[1].getValue())
         return StakePoolBox(
             appKit=stakePoolContract.appKit,
@@ -734,8 +789,8 @@ class StakePoolBox(ErgoBox):
             remaining=remaining,
         )
 
-    def updateRegisters(self):
-        self.registers = [
+    def encodeRegisters(self) -> List[ErgoValue]:
+        return [
             ErgoAppKit.ergoValue([self.emissionAmount], ErgoValueT.LongArray),
             ErgoAppKit.ergoValue(self.stakePoolKey, ErgoValueT.ByteArrayFromHex),
         ]
@@ -817,7 +872,7 @@ class StakingIncentiveBox(ErgoBox):
         self._stakingIncentiveContract = stakingIncentiveContract
 
 
-class StakeProxyBox(ErgoBox):
+class StakeProxyBox(PaideiaStakingBox):
     def __init__(
         self,
         appKit: ErgoAppKit,
@@ -828,10 +883,6 @@ class StakeProxyBox(ErgoBox):
     ) -> None:
         self.stakeProxyContract = stakeProxyContract
         tokens = {self.stakeProxyContract.config.stakedTokenId: amountToStake}
-        registers = [
-            ErgoAppKit.ergoValue([stakeTime], ErgoValueT.LongArray),
-            ErgoAppKit.ergoValue(userErgoTree, ErgoValueT.ByteArrayFromHex),
-        ]
 
         super().__init__(
             appKit,
@@ -841,18 +892,18 @@ class StakeProxyBox(ErgoBox):
             + stakeProxyContract.config.proxyMinerFee,
             stakeProxyContract.contract,
             tokens,
-            registers,
         )
 
         self._amountToStake = amountToStake
         self._userErgoTree = userErgoTree
         self._stakeTime = stakeTime
+        self.updateRegisters()
 
     @staticmethod
     def fromInputBox(inputBox: InputBox, stakeProxyContract: StakeProxyContract):
         registers = inputBox.getRegisters()
-        userErgoTree = registers[1].toHex()[4:]
-        stakeTime = int(registers[0].getValue().apply(0))
+        userErgoTree = codec.decodeByteArray(codec.registerBytes(registers[1])).hex()
+        (stakeTime,) = codec.decodeLongArray(codec.registerBytes(registers[0]))
         amountToStake = int(inputBox.getTokens()[0].getValue())
         return StakeProxyBox(
             appKit=stakeProxyContract.appKit,
@@ -862,8 +913,8 @@ class StakeProxyBox(ErgoBox):
             stakeTime=stakeTime,
         )
 
-    def updateRegisters(self):
-        self.registers = [
+    def encodeRegisters(self) -> List[ErgoValue]:
+        return [
             ErgoAppKit.ergoValue([self.stakeTime], ErgoValueT.LongArray),
             ErgoAppKit.ergoValue(self.userErgoTree, ErgoValueT.ByteArrayFromHex),
         ]
@@ -904,7 +955,7 @@ class StakeProxyBox(ErgoBox):
         self._stakeProxyContract = stakeProxyContract
 
 
-class AddStakeProxyBox(ErgoBox):
+class AddStakeProxyBox(PaideiaStakingBox):
     def __init__(
         self,
         appKit: ErgoAppKit,
@@ -918,10 +969,6 @@ class AddStakeProxyBox(ErgoBox):
             stakeBox.stakeKey: 1,
             self.addStakeProxyContract.config.stakedTokenId: amountToStake,
         }
-        registers = [
-            ErgoAppKit.ergoValue([int(0)], ErgoValueT.LongArray),
-            ErgoAppKit.ergoValue(userErgoTree, ErgoValueT.ByteArrayFromHex),
-        ]
 
         super().__init__(
             appKit,
@@ -931,12 +978,13 @@ class AddStakeProxyBox(ErgoBox):
             + addStakeProxyContract.config.proxyMinerFee,
             addStakeProxyContract.contract,
             tokens,
-            registers,
         )
 
         self._amountToStake = amountToStake
         self._userErgoTree = userErgoTree
         self._stakeBox = stakeBox
+        self._stakeTime = int(0)
+        self.updateRegisters()
 
     @staticmethod
     def fromInputBox(
@@ -945,7 +993,7 @@ class AddStakeProxyBox(ErgoBox):
         addStakeProxyContract: AddStakeProxyContract,
     ):
         registers = inputBox.getRegisters()
-        userErgoTree = registers[1].toHex()[4:]
+        userErgoTree = codec.decodeByteArray(codec.registerBytes(registers[1])).hex()
         amountToStake = int(inputBox.getTokens()[1].getValue())
         return AddStakeProxyBox(
             appKit=addStakeProxyContract.appKit,
@@ -955,8 +1003,8 @@ class AddStakeProxyBox(ErgoBox):
             stakeBox=stakeBox,
         )
 
-    def updateRegisters(self):
-        self.registers = [
+    def encodeRegisters(self) -> List[ErgoValue]:
+        return [
             ErgoAppKit.ergoValue([self.stakeTime], ErgoValueT.LongArray),
             ErgoAppKit.ergoValue(self.userErgoTree, ErgoValueT.ByteArrayFromHex),
         ]
@@ -999,7 +1047,7 @@ class AddStakeProxyBox(ErgoBox):
         self._addStakeProxyContract = addStakeProxyContract
 
 
-class UnstakeProxyBox(ErgoBox):
+class UnstakeProxyBox(PaideiaStakingBox):
     def __init__(
         self,
         appKit: ErgoAppKit,
@@ -1010,10 +1058,6 @@ class UnstakeProxyBox(ErgoBox):
     ) -> None:
         self.unstakeProxyContract = unstakeProxyContract
         tokens = {stakeBox.stakeKey: 1}
-        registers = [
-            ErgoAppKit.ergoValue([int(amountToUnstake)], ErgoValueT.LongArray),
-            ErgoAppKit.ergoValue(userErgoTree, ErgoValueT.ByteArrayFromHex),
-        ]
 
         valueAdjustment = (
             int(0) if stakeBox.amountStaked > amountToUnstake else int(1e6)
@@ -1028,12 +1072,12 @@ class UnstakeProxyBox(ErgoBox):
             - valueAdjustment,
             unstakeProxyContract.contract,
             tokens,
-            registers,
         )
 
         self._amountToUnstake = amountToUnstake
         self._userErgoTree = userErgoTree
         self._stakeBox = stakeBox
+        self.updateRegisters()
 
     @staticmethod
     def fromInputBox(
@@ -1042,8 +1086,8 @@ class UnstakeProxyBox(ErgoBox):
         unstakeProxyContract: UnstakeProxyContract,
     ):
         registers = inputBox.getRegisters()
-        userErgoTree = registers[1].toHex()[4:]
-        amountToUnstake = int(registers[0].getValue().apply(0))
+        userErgoTree = codec.decodeByteArray(codec.registerBytes(registers[1])).hex()
+        (amountToUnstake,) = codec.decodeLongArray(codec.registerBytes(registers[0]))
         return UnstakeProxyBox(
             appKit=unstakeProxyContract.appKit,
             unstakeProxyContract=unstakeProxyContract,
@@ -1052,8 +1096,8 @@ class UnstakeProxyBox(ErgoBox):
             stakeBox=stakeBox,
         )
 
-    def updateRegisters(self):
-        self.registers = [
+    def encodeRegisters(self) -> List[ErgoValue]:
+        return [
             ErgoAppKit.ergoValue([self.amountToUnstake], ErgoValueT.LongArray),
             ErgoAppKit.ergoValue(self.userErgoTree, ErgoValueT.ByteArrayFromHex),
         ]
@@ -1212,21 +1256,31 @@ class CompoundTransaction(ErgoTransaction):
         stakingIncentiveBox = StakingIncentiveBox.fromInputBox(
             stakingIncentiveInput, stakingConfig.stakingIncentiveContract
         )
+        stakeColumns = StakeBox.fromInputBoxes(stakeInputs, stakingConfig.stakeContract)
+        stakeRewardColumn = rewards.compoundRewards(
+            stakeColumns.amountStaked,
+            emissionBox.emissionAmount,
+            emissionBox.amountStaked,
+        )
         stakeBoxes = []
         stakeRewards = 0
-        for stakeInput in stakeInputs:
-            box = StakeBox.fromInputBox(stakeInput, stakingConfig.stakeContract)
-            if box.checkpoint != emissionBox.checkpoint:
+        for i in range(len(stakeColumns)):
+            if stakeColumns.checkpoint[i] != emissionBox.checkpoint:
                 raise InvalidTransactionConditionsException(
                     "Stake box not on same checkpoint as emission box"
                 )
-            box.checkpoint = box.checkpoint + 1
-            reward = int(
-                box.amountStaked * emissionBox.emissionAmount / emissionBox.amountStaked
-            )
+            reward = stakeRewardColumn[i]
             stakeRewards += reward
-            box.amountStaked += reward
-            stakeBoxes.append(box.outBox)
+            stakeBoxes.append(
+                StakeBox(
+                    appKit=stakingConfig.appKit,
+                    stakeContract=stakingConfig.stakeContract,
+                    checkpoint=stakeColumns.checkpoint[i] + 1,
+                    stakeTime=stakeColumns.stakeTime[i],
+                    amountStaked=stakeColumns.amountStaked[i] + reward,
+                    stakeKey=stakeColumns.stakeKey[i],
+                ).outBox
+            )
 
         emissionBox.emissionRemaining -= stakeRewards
         emissionBox.stakers -= len(stakeBoxes)
@@ -1654,7 +1708,11 @@ class CreateUnstakeProxyTransaction(ErgoTransaction):
 
 class ConsolidateDustTransaction(ErgoTransaction):
     def __init__(
-        self, incentiveDustInputs: List[InputBox], stakingConfig, address: str
+        self,
+        incentiveDustInputs: List[InputBox],
+        stakingConfig,
+        address: str,
+        maxInputs: int = None,
     ) -> None:
         super().__init__(stakingConfig.appKit)
 
@@ -1664,27 +1722,22 @@ class ConsolidateDustTransaction(ErgoTransaction):
             if idi.getValue() > int(1e7):
                 raise InvalidInputBoxException("Too much erg in box")
 
-        dustCollected = 99999999999999999999999
-        done = False
-        while not done:
-            currentDustCollected = -1 * stakingConfig.dustCollectionMinerFee
-            filteredIncentiveDustInputs = []
-            done = True
-            for idi in incentiveDustInputs:
-                if idi.getValue() < dustCollected:
-                    currentDustCollected += (
-                        idi.getValue() - stakingConfig.dustCollectionReward
-                    )
-                    filteredIncentiveDustInputs.append(idi)
-                else:
-                    done = False
-            incentiveDustInputs = filteredIncentiveDustInputs
-            if dustCollected != currentDustCollected:
-                done = False
-            dustCollected = currentDustCollected
-
-        if len(incentiveDustInputs) < 2:
+        # Only the first consolidate tx, ConsolidationPlanner splits all of the
+        # dust over several txs
+        batches = dust.consolidationBatches(
+            [idi.getValue() for idi in incentiveDustInputs],
+            stakingConfig.dustCollectionReward,
+            stakingConfig.dustCollectionMinerFee,
+            maxInputs,
+        )
+        if len(batches) == 0:
             raise InvalidTransactionConditionsException("Not enough dust")
+        incentiveDustInputs = [incentiveDustInputs[i] for i in batches[0]]
+        dustCollected = dust.consolidatedValue(
+            [idi.getValue() for idi in incentiveDustInputs],
+            stakingConfig.dustCollectionReward,
+            stakingConfig.dustCollectionMinerFee,
+        )
 
         incentiveOutput = StakingIncentiveBox(
             appKit=stakingConfig.appKit,
@@ -1704,6 +1757,84 @@ class ConsolidateDustTransaction(ErgoTransaction):
         self.changeAddress = address
 
 
+class SplitStakingIncentiveTransaction(ErgoTransaction):
+    # Remove funds path of stakingIncentive.es, needs the stake pool key in the
+    # first output. Spreads the erg of the staking incentive inputs over new
+    # staking incentive boxes, so txs built in parallel each get their own.
+    def __init__(
+        self,
+        stakingIncentiveInputs: List[InputBox],
+        stakePoolKeyInput: InputBox,
+        values: List[int],
+        stakingConfig,
+        address: str,
+    ) -> None:
+        super().__init__(stakingConfig.appKit)
+
+        for sii in stakingIncentiveInputs:
+            if not stakingConfig.stakingIncentiveContract.validateInputBox(sii):
+                raise InvalidInputBoxException("Not a valid staking incentive box")
+        if not any(
+            token.getId().toString() == stakingConfig.stakePoolKey
+            for token in stakePoolKeyInput.getTokens()
+        ):
+            raise InvalidInputBoxException("Input box does not hold the stake pool key")
+
+        stakePoolKeyBox = ErgoBox(
+            stakingConfig.appKit,
+            int(1e6),
+            stakingConfig.appKit.contractFromAddress(address),
+            tokens={stakingConfig.stakePoolKey: 1},
+        )
+        incentiveOutputs = [
+            StakingIncentiveBox(
+                appKit=stakingConfig.appKit,
+                stakingIncentiveContract=stakingConfig.stakingIncentiveContract,
+                value=value,
+            )
+            for value in values
+        ]
+
+        available = (
+            sum(sii.getValue() for sii in stakingIncentiveInputs)
+            + stakePoolKeyInput.getValue()
+        )
+        if available < stakePoolKeyBox.value + sum(values) + int(1e6):
+            raise InvalidTransactionConditionsException(
+                "Not enough erg in the staking incentive input boxes"
+            )
+
+        self.inputs = stakingIncentiveInputs + [stakePoolKeyInput]
+        self.outputs = [stakePoolKeyBox.outBox] + [
+            incentiveOutput.outBox for incentiveOutput in incentiveOutputs
+        ]
+        self.fee = int(1e6)
+        self.changeAddress = address
+
+
+class LazyContract:
+    # Contract field of StakingConfig. A lazy config compiles the contract on first
+    # access and keeps it, dependencies such as the stake contract hash needed by
+    # StakeStateContract are pulled in through the same attribute access.
+    def __init__(self, contractClass) -> None:
+        self.contractClass = contractClass
+
+    def __set_name__(self, owner, name: str) -> None:
+        self.attribute = f"_{name}"
+
+    def __get__(self, config, owner=None):
+        if config is None:
+            return None
+        contract = config.__dict__.get(self.attribute)
+        if contract is None and config.lazy:
+            contract = self.contractClass(config)
+            config.__dict__[self.attribute] = contract
+        return contract
+
+    def __set__(self, config, contract) -> None:
+        config.__dict__[self.attribute] = contract
+
+
 @dataclass
 class StakingConfig:
     appKit: ErgoAppKit
@@ -1728,17 +1859,55 @@ class StakingConfig:
     baseCompoundMinerFee: int
     variableCompoundReward: int
     variableCompoundMinerFee: int
-    stakeStateContract: StakeStateContract = None
-    stakePoolContract: StakePoolContract = None
-    emissionContract: EmissionContract = None
-    stakeContract: StakeContract = None
-    stakeProxyContract: StakeProxyContract = None
-    addStakeProxyContract: AddStakeProxyContract = None
-    unstakeProxyContract: UnstakeProxyContract = None
-    stakingIncentiveContract: StakingIncentiveContract = None
-
-
-def PaideiaConfig(appKit: ErgoAppKit) -> StakingConfig:
+    stakeStateContract: StakeStateContract = LazyContract(StakeStateContract)
+    stakePoolContract: StakePoolContract = LazyContract(StakePoolContract)
+    emissionContract: EmissionContract = LazyContract(EmissionContract)
+    stakeContract: StakeContract = LazyContract(StakeContract)
+    stakeProxyContract: StakeProxyContract = LazyContract(StakeProxyContract)
+    addStakeProxyContract: AddStakeProxyContract = LazyContract(AddStakeProxyContract)
+    unstakeProxyContract: UnstakeProxyContract = LazyContract(UnstakeProxyContract)
+    stakingIncentiveContract: StakingIncentiveContract = LazyContract(
+        StakingIncentiveContract
+    )
+    lazy: bool = False
+
+    def compileContracts(self, maxWorkers: int = 1) -> None:
+        if maxWorkers > 1:
+            compileStakingConfigs([self], maxWorkers)
+            return
+        for field in contractDependencies:
+            self.compileContract(field)
+
+    def compileContract(self, field: str) -> None:
+        setattr(self, field, type(self).__dict__[field].contractClass(self))
+
+
+# Contracts embed the hashes of the contracts listed here, so those have to be
+# compiled first
+contractDependencies: Dict[str, List[str]] = {
+    "stakeContract": [],
+    "stakeStateContract": ["stakeContract"],
+    "stakePoolContract": [],
+    "emissionContract": [],
+    "stakingIncentiveContract": [],
+    "stakeProxyContract": ["stakingIncentiveContract"],
+    "addStakeProxyContract": ["stakingIncentiveContract"],
+    "unstakeProxyContract": ["stakingIncentiveContract"],
+}
+
+
+def compileStakingConfigs(configs: List[StakingConfig], maxWorkers: int = 4) -> None:
+    tasks = {}
+    dependencies = {}
+    for i, config in enumerate(configs):
+        for field, deps in contractDependencies.items():
+            tasks[(i, field)] = partial(config.compileContract, field)
+            dependencies[(i, field)] = [(i, dep) for dep in deps]
+    with ThreadPoolExecutor(max_workers=maxWorkers) as executor:
+        compilation.compileGraph(tasks, dependencies, executor)
+
+
+def PaideiaConfig(appKit: ErgoAppKit, lazy: bool = False) -> StakingConfig:
     result = StakingConfig(
         appKit=appKit,
         version="1.0",
@@ -1762,19 +1931,14 @@ def PaideiaConfig(appKit: ErgoAppKit) -> StakingConfig:
         baseCompoundMinerFee=int(1e6),
         variableCompoundReward=int(15e4),
         variableCompoundMinerFee=int(1e5),
+        lazy=lazy,
     )
-    result.stakeContract = StakeContract(result)
-    result.stakeStateContract = StakeStateContract(result)
-    result.stakePoolContract = StakePoolContract(result)
-    result.emissionContract = EmissionContract(result)
-    result.stakingIncentiveContract = StakingIncentiveContract(result)
-    result.stakeProxyContract = StakeProxyContract(result)
-    result.addStakeProxyContract = AddStakeProxyContract(result)
-    result.unstakeProxyContract = UnstakeProxyContract(result)
+    if not lazy:
+        result.compileContracts()
     return result
 
 
-def PaideiaTestConfig(appKit: ErgoAppKit) -> StakingConfig:
+def PaideiaTestConfig(appKit: ErgoAppKit, lazy: bool = False) -> StakingConfig:
     result = StakingConfig(
         appKit=appKit,
         version="latest",
@@ -1798,19 +1962,14 @@ def PaideiaTestConfig(appKit: ErgoAppKit) -> StakingConfig:
         baseCompoundMinerFee=int(1e6),
         variableCompoundReward=int(15e4),
         variableCompoundMinerFee=int(1e5),
+        lazy=lazy,
     )
-    result.stakeContract = StakeContract(result)
-    result.stakeStateContract = StakeStateContract(result)
-    result.stakePoolContract = StakePoolContract(result)
-    result.emissionContract = EmissionContract(result)
-    result.stakingIncentiveContract = StakingIncentiveContract(result)
-    result.stakeProxyContract = StakeProxyContract(result)
-    result.addStakeProxyContract = AddStakeProxyContract(result)
-    result.unstakeProxyContract = UnstakeProxyContract(result)
+    if not lazy:
+        result.compileContracts()
     return result
 
 
-def ergopadv5testConfig(appKit: ErgoAppKit) -> StakingConfig:
+def ergopadv5testConfig(appKit: ErgoAppKit, lazy: bool = False) -> StakingConfig:
     result = StakingConfig(
         version="latest",
         appKit=appKit,
@@ -1834,19 +1993,14 @@ def ergopadv5testConfig(appKit: ErgoAppKit) -> StakingConfig:
         baseCompoundMinerFee=int(1e6),
         variableCompoundReward=int(15e4),
         variableCompoundMinerFee=int(1e5),
+        lazy=lazy,
     )
-    result.stakeContract = StakeContract(result)
-    result.stakeStateContract = StakeStateContract(result)
-    result.stakePoolContract = StakePoolContract(result)
-    result.emissionContract = EmissionContract(result)
-    result.stakingIncentiveContract = StakingIncentiveContract(result)
-    result.stakeProxyContract = StakeProxyContract(result)
-    result.addStakeProxyContract = AddStakeProxyContract(result)
-    result.unstakeProxyContract = UnstakeProxyContract(result)
+    if not lazy:
+        result.compileContracts()
     return result
 
 
-def EGIOConfig(appKit: ErgoAppKit) -> StakingConfig:
+def EGIOConfig(appKit: ErgoAppKit, lazy: bool = False) -> StakingConfig:
     result = StakingConfig(
         version="1.1",
         appKit=appKit,
@@ -1870,19 +2024,14 @@ def EGIOConfig(appKit: ErgoAppKit) -> StakingConfig:
         baseCompoundMinerFee=int(1e6),
         variableCompoundReward=int(15e4),
         variableCompoundMinerFee=int(1e5),
+        lazy=lazy,
     )
-    result.stakeContract = StakeContract(result)
-    result.stakeStateContract = StakeStateContract(result)
-    result.stakePoolContract = StakePoolContract(result)
-    result.emissionContract = EmissionContract(result)
-    result.stakingIncentiveContract = StakingIncentiveContract(result)
-    result.stakeProxyContract = StakeProxyContract(result)
-    result.addStakeProxyContract = AddStakeProxyContract(result)
-    result.unstakeProxyContract = UnstakeProxyContract(result)
+    if not lazy:
+        result.compileContracts()
     return result
 
 
-def NETAConfig(appKit: ErgoAppKit) -> StakingConfig:
+def NETAConfig(appKit: ErgoAppKit, lazy: bool = False) -> StakingConfig:
     result = StakingConfig(
         version="1.1",
         appKit=appKit,
@@ -1906,19 +2055,14 @@ def NETAConfig(appKit: ErgoAppKit) -> StakingConfig:
         baseCompoundMinerFee=int(1e6),
         variableCompoundReward=int(15e4),
         variableCompoundMinerFee=int(1e5),
+        lazy=lazy,
     )
-    result.stakeContract = StakeContract(result)
-    result.stakeStateContract = StakeStateContract(result)
-    result.stakePoolContract = StakePoolContract(result)
-    result.emissionContract = EmissionContract(result)
-    result.stakingIncentiveContract = StakingIncentiveContract(result)
-    result.stakeProxyContract = StakeProxyContract(result)
-    result.addStakeProxyContract = AddStakeProxyContract(result)
-    result.unstakeProxyContract = UnstakeProxyContract(result)
+    if not lazy:
+        result.compileContracts()
     return result
 
 
-def AHTConfig(appKit: ErgoAppKit) -> StakingConfig:
+def AHTConfig(appKit: ErgoAppKit, lazy: bool = False) -> StakingConfig:
     result = StakingConfig(
         version="1.1",
         appKit=appKit,
@@ -1942,19 +2086,14 @@ def AHTConfig(appKit: ErgoAppKit) -> StakingConfig:
         baseCompoundMinerFee=int(1e6),
         variableCompoundReward=int(15e4),
         variableCompoundMinerFee=int(1e5),
+        lazy=lazy,
     )
-    result.stakeContract = StakeContract(result)
-    result.stakeStateContract = StakeStateContract(result)
-    result.stakePoolContract = StakePoolContract(result)
-    result.emissionContract = EmissionContract(result)
-    result.stakingIncentiveContract = StakingIncentiveContract(result)
-    result.stakeProxyContract = StakeProxyContract(result)
-    result.addStakeProxyContract = AddStakeProxyContract(result)
-    result.unstakeProxyContract = UnstakeProxyContract(result)
+    if not lazy:
+        result.compileContracts()
     return result
 
 
-def Ergo_Crux_LPConfig(appKit: ErgoAppKit) -> StakingConfig:
+def Ergo_Crux_LPConfig(appKit: ErgoAppKit, lazy: bool = False) -> StakingConfig:
     result = StakingConfig(
         version="1.1",
         appKit=appKit,
@@ -1978,15 +2117,10 @@ def Ergo_Crux_LPConfig(appKit: ErgoAppKit) -> StakingConfig:
         baseCompoundMinerFee=int(1e6),
         variableCompoundReward=int(15e4),
         variableCompoundMinerFee=int(1e5),
+        lazy=lazy,
     )
-    result.stakeContract = StakeContract(result)
-    result.stakeStateContract = StakeStateContract(result)
-    result.stakePoolContract = StakePoolContract(result)
-    result.emissionContract = EmissionContract(result)
-    result.stakingIncentiveContract = StakingIncentiveContract(result)
-    result.stakeProxyContract = StakeProxyContract(result)
-    result.addStakeProxyContract = AddStakeProxyContract(result)
-    result.unstakeProxyContract = UnstakeProxyContract(result)
+    if not lazy:
+        result.compileContracts()
     return result
 
 
@@ -2172,14 +2306,7 @@ def BootstrapStaking(
         variableCompoundReward=int(15e4),
         variableCompoundMinerFee=int(1e5),
     )
-    config.stakeContract = StakeContract(config)
-    config.stakeStateContract = StakeStateContract(config)
-    config.stakePoolContract = StakePoolContract(config)
-    config.emissionContract = EmissionContract(config)
-    config.stakingIncentiveContract = StakingIncentiveContract(config)
-    config.stakeProxyContract = StakeProxyContract(config)
-    config.addStakeProxyContract = AddStakeProxyContract(config)
-    config.unstakeProxyContract = UnstakeProxyContract(config)
+    config.compileContracts(maxWorkers=4)
 
     stakeStateBox = StakeStateBox(
         appKit=appKit,
@@ -0,0 +1,121 @@
+from typing import List, Tuple, Union
+
+from org.ergoplatform.appkit import ErgoValue
+
+# Sigma serialization of the register types used by the staking boxes. Registers
+# are read from the JVM as a single hex string and decoded in python, instead of
+# one JPype call per collection element.
+
+LONG = 0x05
+COLL_BYTE = 0x0E
+COLL_LONG = 0x11
+
+_mask64 = (1 << 64) - 1
+
+
+def encodeVLQ(value: int) -> bytes:
+    if value < 0:
+        raise ValueError(f"VLQ can not encode negative value {value}")
+    result = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value == 0:
+            result.append(byte)
+            return bytes(result)
+        result.append(byte | 0x80)
+
+
+def decodeVLQ(data: bytes, offset: int = 0) -> Tuple[int, int]:
+    value = 0
+    shift = 0
+    while True:
+        if offset >= len(data):
+            raise ValueError("Truncated VLQ value")
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80 == 0:
+            return value, offset
+        shift += 7
+
+
+def encodeZigZag(value: int) -> int:
+    return ((value << 1) ^ (value >> 63)) & _mask64
+
+
+def decodeZigZag(value: int) -> int:
+    return (value >> 1) ^ -(value & 1)
+
+
+def encodeLong(value: int) -> bytes:
+    return bytes([LONG]) + encodeVLQ(encodeZigZag(int(value)))
+
+
+def encodeLongArray(values: List[int]) -> bytes:
+    result = bytearray([COLL_LONG])
+    result += encodeVLQ(len(values))
+    for v in values:
+        result += encodeVLQ(encodeZigZag(int(v)))
+    return bytes(result)
+
+
+def encodeByteArray(value: bytes) -> bytes:
+    return bytes([COLL_BYTE]) + encodeVLQ(len(value)) + value
+
+
+def _checkType(data: bytes, typeCode: int) -> None:
+    if len(data) == 0 or data[0] != typeCode:
+        raise ValueError(f"Expected type code {typeCode:#04x}, got {data[:1].hex()}")
+
+
+def decodeLong(data: bytes) -> int:
+    _checkType(data, LONG)
+    value, _ = decodeVLQ(data, 1)
+    return decodeZigZag(value)
+
+
+def decodeLongArray(data: bytes) -> List[int]:
+    _checkType(data, COLL_LONG)
+    size, offset = decodeVLQ(data, 1)
+    result = []
+    for _ in range(size):
+        value, offset = decodeVLQ(data, offset)
+        result.append(decodeZigZag(value))
+    return result
+
+
+def decodeByteArray(data: bytes) -> bytes:
+    _checkType(data, COLL_BYTE)
+    size, offset = decodeVLQ(data, 1)
+    if offset + size > len(data):
+        raise ValueError("Truncated Coll[Byte] value")
+    return data[offset : offset + size]
+
+
+def decodeRegister(data: bytes) -> Union[int, List[int], bytes]:
+    if len(data) > 0 and data[0] == COLL_LONG:
+        return decodeLongArray(data)
+    if len(data) > 0 and data[0] == COLL_BYTE:
+        return decodeByteArray(data)
+    return decodeLong(data)
+
+
+def registerBytes(register: ErgoValue) -> bytes:
+    return bytes.fromhex(register.toHex())
+
+
+def toErgoValue(data: bytes) -> ErgoValue:
+    return ErgoValue.fromHex(data.hex())
+
+
+def longArrayValue(values: List[int]) -> ErgoValue:
+    return toErgoValue(encodeLongArray(values))
+
+
+def byteArrayValue(value: str) -> ErgoValue:
+    return toErgoValue(encodeByteArray(bytes.fromhex(value)))
+
+
+def longValue(value: int) -> ErgoValue:
+    return toErgoValue(encodeLong(value))
@@ -0,0 +1,375 @@
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, wait
+from hashlib import blake2b
+from importlib import metadata
+import json
+import os
+import tempfile
+import threading
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+import ergo_python_appkit
+from ergo_python_appkit.appkit import ErgoAppKit
+
+from java.lang import Runtime
+from org.ergoplatform.appkit import ErgoContract, ErgoValue
+from sigmastate.Values import ErgoTree
+from sigmastate.serialization import ErgoTreeSerializer
+
+from paideia_contracts.contracts.staking import codec
+
+
+def compilerVersion() -> str:
+    # The ErgoScript compiler ships inside the appkit jars, so the python package
+    # version together with the bundled jar names identifies the compiler build.
+    jarsDir = os.path.join(os.path.dirname(ergo_python_appkit.__file__), "jars")
+    jars = sorted(os.listdir(jarsDir)) if os.path.isdir(jarsDir) else []
+    return ";".join([metadata.version("ergo_python_appkit")] + jars)
+
+
+def mappingKey(mapping: Dict[str, ErgoValue]) -> str:
+    return "\n".join(
+        f"{name}:{mapping[name].getClass().getName()}:{mapping[name]}"
+        for name in sorted(mapping)
+    )
+
+
+def scriptHash(script: str) -> str:
+    with open(script, "rb") as f:
+        return blake2b(f.read(), digest_size=32).hexdigest()
+
+
+class ErgoTreeCache:
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+        self._compilerVersion = compilerVersion()
+
+    @staticmethod
+    def fromEnvironment() -> Optional["ErgoTreeCache"]:
+        directory = os.environ.get(
+            "PAIDEIA_ERGOTREE_CACHE",
+            os.path.join(os.path.expanduser("~"), ".cache", "paideia_contracts"),
+        )
+        if directory == "":
+            return None
+        return ErgoTreeCache(directory)
+
+    def key(
+        self, appKit: ErgoAppKit, script: str, mapping: Dict[str, ErgoValue]
+    ) -> str:
+        h = blake2b(digest_size=32)
+        for part in [
+            scriptHash(script),
+            mappingKey(mapping),
+            self._compilerVersion,
+            str(appKit._networkType.networkPrefix),
+        ]:
+            h.update(part.encode("utf-8"))
+            h.update(b"\x00")
+        return h.hexdigest()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.tree")
+
+    def load(self, key: str) -> Optional[ErgoTree]:
+        try:
+            with open(self.path(key), "rb") as f:
+                treeBytes = f.read()
+        except OSError:
+            return None
+        try:
+            return ErgoTreeSerializer().deserializeErgoTree(treeBytes)
+        except Exception:
+            # Truncated or corrupt entry, it gets overwritten by the recompile
+            return None
+
+    def store(self, key: str, ergoTree: ErgoTree) -> None:
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, tmpPath = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(bytes(ergoTree.bytes()))
+            os.replace(tmpPath, self.path(key))
+        except OSError:
+            # A read-only or full cache directory only costs us the next compile
+            pass
+
+    def compile(
+        self, appKit: ErgoAppKit, script: str, mapping: Dict[str, ErgoValue]
+    ) -> ErgoTree:
+        key = self.key(appKit, script, mapping)
+        ergoTree = self.load(key)
+        if ergoTree is None:
+            with open(script) as f:
+                ergoTree = appKit.compileErgoScript(f.read(), mapping)
+            self.store(key, ergoTree)
+        return ergoTree
+
+
+ergoTreeCache: Optional[ErgoTreeCache] = ErgoTreeCache.fromEnvironment()
+
+
+def compileErgoTree(
+    appKit: ErgoAppKit, script: str, mapping: Dict[str, ErgoValue]
+) -> ErgoTree:
+    if ergoTreeCache is None:
+        with open(script) as f:
+            return appKit.compileErgoScript(f.read(), mapping)
+    return ergoTreeCache.compile(appKit, script, mapping)
+
+
+# Type codes of the constants we know how to substitute
+typeCodes = {"Long": codec.LONG, "Coll[Byte]": codec.COLL_BYTE}
+
+
+def constantType(value) -> str:
+    className = value.getClass().getName()
+    if className == "java.lang.Long":
+        return "Long"
+    if className.startswith("special.collection.Coll"):
+        return "Coll[Byte]"
+    raise ValueError(f"Unsupported constant type {className}")
+
+
+def encodeConstant(value) -> bytes:
+    # Serialized value without the leading type code
+    if constantType(value) == "Long":
+        return codec.encodeLong(int(value))[1:]
+    return codec.encodeByteArray(bytes(value.toArray()))[1:]
+
+
+def templatePath(script: str) -> str:
+    return f"{os.path.splitext(script)[0]}.json"
+
+
+class ErgoTreeTemplate:
+    # Serialized ErgoTree compiled with sentinel constants. Placeholders point at
+    # the serialized value of every constant that came from the mapping, so a
+    # tree for other constants is a splice of those spans.
+    def __init__(
+        self,
+        scriptHash: str,
+        compilerVersion: str,
+        networkPrefix: int,
+        constants: Dict[str, str],
+        template: bytes,
+        placeholders: List[Dict],
+    ) -> None:
+        self.scriptHash = scriptHash
+        self.compilerVersion = compilerVersion
+        self.networkPrefix = networkPrefix
+        self.constants = constants
+        self.template = template
+        self.placeholders = sorted(placeholders, key=lambda p: p["offset"])
+
+    @staticmethod
+    def fromCompiled(
+        appKit: ErgoAppKit,
+        script: str,
+        mapping: Dict[str, ErgoValue],
+        ergoTree: ErgoTree,
+    ) -> "ErgoTreeTemplate":
+        treeBytes = bytes(ergoTree.bytes())
+        if treeBytes[0] & 0x08:
+            raise ValueError(f"{script}: trees with a size field are not supported")
+        placeholders = []
+        for name, value in mapping.items():
+            encoded = encodeConstant(value)
+            pattern = bytes([typeCodes[constantType(value)]]) + encoded
+            index = treeBytes.find(pattern)
+            while index >= 0:
+                placeholders.append(
+                    {
+                        "name": name,
+                        "type": constantType(value),
+                        "offset": index + 1,
+                        "length": len(encoded),
+                    }
+                )
+                index = treeBytes.find(pattern, index + len(pattern))
+        return ErgoTreeTemplate(
+            scriptHash(script),
+            compilerVersion(),
+            appKit._networkType.networkPrefix,
+            {name: constantType(value) for name, value in sorted(mapping.items())},
+            treeBytes,
+            placeholders,
+        )
+
+    @staticmethod
+    def fromFile(path: str) -> Optional["ErgoTreeTemplate"]:
+        try:
+            with open(path) as f:
+                data = json.load(f)
+            return ErgoTreeTemplate(
+                data["scriptHash"],
+                data["compilerVersion"],
+                data["networkPrefix"],
+                data["constants"],
+                bytes.fromhex(data["template"]),
+                data["placeholders"],
+            )
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def toFile(self, path: str) -> None:
+        with open(path, "w") as f:
+            json.dump(
+                {
+                    "scriptHash": self.scriptHash,
+                    "compilerVersion": self.compilerVersion,
+                    "networkPrefix": self.networkPrefix,
+                    "constants": self.constants,
+                    "template": self.template.hex(),
+                    "placeholders": self.placeholders,
+                },
+                f,
+                indent=2,
+            )
+            f.write("\n")
+
+    def isCurrent(
+        self, appKit: ErgoAppKit, script: str, mapping: Dict[str, ErgoValue]
+    ) -> bool:
+        if self.networkPrefix != appKit._networkType.networkPrefix:
+            return False
+        if self.compilerVersion != compilerVersion():
+            return False
+        if self.scriptHash != scriptHash(script):
+            return False
+        if set(mapping) != set(self.constants):
+            return False
+        for name, value in mapping.items():
+            if constantType(value) != self.constants[name]:
+                return False
+        return True
+
+    def substitute(self, mapping: Dict[str, ErgoValue]) -> bytes:
+        result = bytearray()
+        position = 0
+        for placeholder in self.placeholders:
+            result += self.template[position : placeholder["offset"]]
+            result += encodeConstant(mapping[placeholder["name"]])
+            position = placeholder["offset"] + placeholder["length"]
+        result += self.template[position:]
+        return bytes(result)
+
+
+ergoTreeTemplates: Dict[str, Optional[ErgoTreeTemplate]] = {}
+
+
+def loadTemplate(script: str) -> Optional[ErgoTreeTemplate]:
+    path = templatePath(script)
+    if path not in ergoTreeTemplates:
+        ergoTreeTemplates[path] = ErgoTreeTemplate.fromFile(path)
+    return ergoTreeTemplates[path]
+
+
+def ergoTreeFromTemplate(
+    appKit: ErgoAppKit, script: str, mapping: Dict[str, ErgoValue]
+) -> Optional[ErgoTree]:
+    template = loadTemplate(script)
+    if template is None or not template.isCurrent(appKit, script, mapping):
+        return None
+    return ErgoTreeSerializer().deserializeErgoTree(template.substitute(mapping))
+
+
+class ContractRegistry:
+    def __init__(self) -> None:
+        self._entries: Dict[tuple, Tuple[ErgoTree, ErgoContract]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.treeBytes = 0
+
+    def key(
+        self, appKit: ErgoAppKit, script: str, mapping: Dict[str, ErgoValue]
+    ) -> tuple:
+        # The script path contains the ergoscript version directory
+        return (
+            appKit._networkType.networkPrefix,
+            os.path.realpath(script),
+            mappingKey(mapping),
+        )
+
+    def get(
+        self, appKit: ErgoAppKit, script: str, mapping: Dict[str, ErgoValue]
+    ) -> Tuple[ErgoTree, ErgoContract]:
+        key = self.key(appKit, script, mapping)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self.hits += 1
+                return entry
+        ergoTree = ergoTreeFromTemplate(appKit, script, mapping)
+        if ergoTree is None:
+            ergoTree = compileErgoTree(appKit, script, mapping)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                # Another thread interned the same contract while we compiled
+                self.hits += 1
+                return entry
+            self.misses += 1
+            entry = (ergoTree, appKit.contractFromTree(ergoTree))
+            self._entries[key] = entry
+            self.treeBytes += len(ergoTree.bytes())
+            return entry
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries = {}
+            self.hits = 0
+            self.misses = 0
+            self.treeBytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, int]:
+        runtime = Runtime.getRuntime()
+        return {
+            "contracts": len(self),
+            "hits": self.hits,
+            "misses": self.misses,
+            "treeBytes": self.treeBytes,
+            "jvmHeapUsed": int(runtime.totalMemory() - runtime.freeMemory()),
+        }
+
+
+contractRegistry = ContractRegistry()
+
+
+def compileGraph(
+    tasks: Dict[Hashable, Callable[[], Any]],
+    dependencies: Dict[Hashable, List[Hashable]],
+    executor: Executor,
+) -> Dict[Hashable, Any]:
+    # Runs every task once all of its dependencies have finished. The ErgoScript
+    # compiler runs in the JVM without holding the GIL, so independent contracts
+    # compile concurrently on a thread pool.
+    for task, deps in dependencies.items():
+        for dep in deps:
+            if dep not in tasks:
+                raise ValueError(f"{task} depends on unknown task {dep}")
+    waiting = {task: set(dependencies.get(task, [])) for task in tasks}
+    running: Dict[Future, Hashable] = {}
+    results: Dict[Hashable, Any] = {}
+    try:
+        while waiting or running:
+            for task in [task for task, deps in waiting.items() if not deps]:
+                del waiting[task]
+                running[executor.submit(tasks[task])] = task
+            if not running:
+                raise ValueError(
+                    f"Dependency cycle between {sorted(map(str, waiting))}"
+                )
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                task = running.pop(future)
+                results[task] = future.result()
+                for deps in waiting.values():
+                    deps.discard(task)
+    finally:
+        for future in running:
+            future.cancel()
+    return results
@@ -0,0 +1,202 @@
+from dataclasses import dataclass, field
+from time import sleep, time
+from typing import Callable, List, Tuple
+
+from org.ergoplatform.appkit import InputBox, UnsignedTransaction
+
+from paideia_contracts.contracts.staking import EmitTransaction, StakingConfig
+from paideia_contracts.contracts.staking.pipeline import CompoundPipeline
+from paideia_contracts.contracts.staking.records import (
+    EmissionRecord,
+    StakeStateRecord,
+)
+
+# Output indexes of EmitTransaction
+_emitEmissionOutput = 2
+_emitStakingIncentiveOutput = 4
+
+
+@dataclass
+class CycleReport:
+    # Timestamps are in milliseconds, like the checkpoint times on chain
+    checkpoint: int
+    emissionTime: int
+    emitSubmitted: int = None
+    lastCompoundSubmitted: int = None
+    emitTxId: str = None
+    compoundTxIds: List[str] = field(default_factory=list)
+    stakeBoxes: int = 0
+    stakersRemaining: int = None
+
+    @property
+    def emitLatency(self) -> int:
+        return self.emitSubmitted - self.emissionTime
+
+    @property
+    def latency(self) -> int:
+        # From the emission time until the last compound tx was submitted
+        end = (
+            self.lastCompoundSubmitted
+            if self.lastCompoundSubmitted is not None
+            else self.emitSubmitted
+        )
+        return end - self.emissionTime
+
+
+class CycleOrchestrator:
+    # Runs staking cycles: the emit tx as soon as the cycle has passed, then the
+    # compound txs chained on the new emission and staking incentive boxes.
+    # stakeBoxSource returns the stake boxes on a checkpoint, inputSource the
+    # current stake state, stake pool, emission and staking incentive boxes.
+    # nodeTime returns the timestamp of the node's preHeader, the time the emit
+    # tx is checked against.
+    def __init__(
+        self,
+        stakingConfig: StakingConfig,
+        address: str,
+        stakeBoxSource: Callable[[int], List[InputBox]],
+        inputSource: Callable[[], Tuple[InputBox, InputBox, InputBox, InputBox]] = None,
+        pipeline: CompoundPipeline = None,
+        margin: int = 1000,
+        clock: Callable[[], float] = time,
+        sleeper: Callable[[float], None] = sleep,
+        nodeTime: Callable[[], int] = None,
+        pollInterval: float = 5,
+        maxCompoundAttempts: int = 10,
+    ) -> None:
+        self.stakingConfig = stakingConfig
+        self.address = address
+        self.stakeBoxSource = stakeBoxSource
+        self.inputSource = inputSource
+        self.pipeline = (
+            pipeline
+            if pipeline is not None
+            else CompoundPipeline(stakingConfig, address)
+        )
+        # The emit tx is only valid in a block with a later timestamp than the
+        # emission time, the margin covers clock drift with the miners
+        self.margin = margin
+        self.clock = clock
+        self.sleeper = sleeper
+        self.nodeTime = (
+            nodeTime
+            if nodeTime is not None
+            else lambda: stakingConfig.appKit.preHeader().getTimestamp()
+        )
+        self.pollInterval = pollInterval
+        self.maxCompoundAttempts = maxCompoundAttempts
+        self.reports: List[CycleReport] = []
+
+    def now(self) -> int:
+        return int(self.clock() * 1000)
+
+    def waitUntil(self, timestamp: int) -> None:
+        while True:
+            remaining = timestamp - self.now()
+            if remaining < 0:
+                return
+            self.sleeper(remaining / 1000 + 0.001)
+
+    def waitForNode(self, timestamp: int) -> None:
+        # The last block of the node can still be older than the local clock
+        while self.nodeTime() < timestamp:
+            self.sleeper(self.pollInterval)
+
+    @staticmethod
+    def emissionTime(stakeStateInput: InputBox) -> int:
+        stakeState = StakeStateRecord.fromInputBox(stakeStateInput)
+        return stakeState.checkpointTime + stakeState.cycleDuration
+
+    def emitTransaction(
+        self,
+        stakeStateInput: InputBox,
+        stakePoolInput: InputBox,
+        emissionInput: InputBox,
+        stakingIncentiveInput: InputBox,
+    ) -> UnsignedTransaction:
+        return EmitTransaction(
+            stakeStateInput,
+            stakePoolInput,
+            emissionInput,
+            stakingIncentiveInput,
+            self.stakingConfig,
+            self.address,
+        ).unsignedTx
+
+    def runCycle(
+        self,
+        stakeStateInput: InputBox,
+        stakePoolInput: InputBox,
+        emissionInput: InputBox,
+        stakingIncentiveInput: InputBox,
+    ) -> CycleReport:
+        report = CycleReport(
+            checkpoint=StakeStateRecord.fromInputBox(stakeStateInput).checkpoint,
+            emissionTime=self.emissionTime(stakeStateInput),
+        )
+        self.waitUntil(report.emissionTime + self.margin)
+        self.waitForNode(report.emissionTime)
+        emitTx = self.pipeline.signTransaction(
+            self.emitTransaction(
+                stakeStateInput, stakePoolInput, emissionInput, stakingIncentiveInput
+            )
+        )
+        report.emitTxId = self.pipeline.sendTransaction(emitTx)
+        report.emitSubmitted = self.now()
+        outputs = emitTx.getOutputsToSpend()
+        emissionInput = outputs[_emitEmissionOutput]
+        stakingIncentiveInput = outputs[_emitStakingIncentiveOutput]
+        report.stakersRemaining = self.compound(
+            report, emissionInput, stakingIncentiveInput
+        )
+        if len(report.compoundTxIds) > 0:
+            report.lastCompoundSubmitted = self.now()
+        self.reports.append(report)
+        return report
+
+    def compound(
+        self,
+        report: CycleReport,
+        emissionInput: InputBox,
+        stakingIncentiveInput: InputBox,
+    ) -> int:
+        # Compounds until no stakers are left on the emission box, the next emit
+        # tx is rejected until then. Stake boxes missing from stakeBoxSource,
+        # behind in the indexer or still in the mempool, are picked up on a
+        # later attempt.
+        compounded = set()
+        stakers = EmissionRecord.fromInputBox(emissionInput).stakers
+        attempts = 0
+        while stakers > 0:
+            stakeInputs = [
+                b
+                for b in self.stakeBoxSource(report.checkpoint)
+                if b.getId().toString() not in compounded
+            ]
+            if len(stakeInputs) > 0:
+                report.compoundTxIds += self.pipeline.run(
+                    emissionInput, stakeInputs, stakingIncentiveInput
+                )
+                compounded.update(b.getId().toString() for b in stakeInputs)
+                report.stakeBoxes = len(compounded)
+                emissionInput = self.pipeline.emissionOutput
+                stakingIncentiveInput = self.pipeline.stakingIncentiveOutput
+            remaining = EmissionRecord.fromInputBox(emissionInput).stakers
+            attempts = attempts + 1 if remaining == stakers else 0
+            stakers = remaining
+            if stakers > 0:
+                if attempts >= self.maxCompoundAttempts:
+                    raise Exception(
+                        f"{stakers} stakers of checkpoint {report.checkpoint} left "
+                        f"after {attempts} attempts without progress"
+                    )
+                self.sleeper(self.pollInterval)
+        return stakers
+
+    def run(self, cycles: int = None) -> List[CycleReport]:
+        # Runs the given number of cycles, or forever. Boxes are reloaded from
+        # inputSource each cycle, users change the stake state in between.
+        reports = []
+        while cycles is None or len(reports) < cycles:
+            reports.append(self.runCycle(*self.inputSource()))
+        return reports
@@ -0,0 +1,46 @@
+from itertools import accumulate
+from typing import List, Sequence
+
+# Consolidate tx of stakingIncentive.es: the tx operator gets
+# dustCollectionReward for every dust box spent and the new staking incentive
+# box has to hold more erg than any of them. A box holding no more than the
+# reward only lowers the consolidated value, so it is never taken.
+
+
+def consolidatedValue(values: Sequence[int], reward: int, minerFee: int) -> int:
+    return sum(values) - reward * len(values) - minerFee
+
+
+def validConsolidation(values: Sequence[int], reward: int, minerFee: int) -> bool:
+    return len(values) >= 2 and max(values) < consolidatedValue(
+        values, reward, minerFee
+    )
+
+
+def consolidationBatches(
+    values: Sequence[int], reward: int, minerFee: int, maxInputs: int = None
+) -> List[List[int]]:
+    # Indexes of the dust boxes to spend in each consolidate tx, at most
+    # maxInputs per tx. For a given largest box the best tx also takes the boxes
+    # just below it, so after sorting once every tx is a window of the sorted
+    # boxes. Windows are taken from the top: a box that can not end a window
+    # only gets smaller boxes below it once a window under it is taken, so one
+    # pass over the sorted boxes is enough.
+    if maxInputs is not None and maxInputs < 2:
+        raise ValueError("A consolidate tx needs at least 2 inputs")
+    order = sorted(
+        (i for i in range(len(values)) if values[i] > reward),
+        key=lambda i: values[i],
+    )
+    limit = len(order) if maxInputs is None else maxInputs
+    sums = [0] + list(accumulate(values[i] - reward for i in order))
+    batches = []
+    end = len(order)
+    while end >= 2:
+        start = max(end - limit, 0)
+        if values[order[end - 1]] < sums[end] - sums[start] - minerFee:
+            batches.append(order[start:end])
+            end = start
+        else:
+            end -= 1
+    return batches
@@ -0,0 +1,229 @@
+from dataclasses import dataclass, field
+from threading import Lock
+from time import monotonic
+from typing import Callable, Dict, List
+
+from ergo_python_appkit.ErgoTransaction import ErgoTransaction
+from org.ergoplatform.appkit import InputBox
+
+from paideia_contracts.contracts.staking import (
+    ConsolidateDustTransaction,
+    SplitStakingIncentiveTransaction,
+    StakingConfig,
+)
+from paideia_contracts.contracts.staking.planner import ConsolidationPlanner
+
+# ConsolidateDustTransaction only takes boxes up to this value
+_maxDustValue = int(1e7)
+_minBoxValue = int(1e6)
+_splitMinerFee = int(1e6)
+
+
+class NoIncentiveBoxException(Exception):
+    pass
+
+
+@dataclass
+class IncentiveLease:
+    holder: str
+    inputBox: InputBox
+    expires: float
+
+    @property
+    def boxId(self) -> str:
+        return self.inputBox.getId().toString()
+
+
+@dataclass
+class IncentiveMaintenance:
+    consolidations: List[List[InputBox]] = field(default_factory=list)
+    splitInputs: List[InputBox] = field(default_factory=list)
+    splitValues: List[int] = field(default_factory=list)
+
+
+class StakingIncentivePool:
+    # The unspent staking incentive boxes of one pool. Tx builders lease a box
+    # for as long as their chain runs and hand back the staking incentive output
+    # of their last tx, so a box is never given to two builders at once.
+    # boxSource returns the unspent staking incentive boxes, mempool included.
+    def __init__(
+        self,
+        stakingConfig: StakingConfig,
+        address: str,
+        boxSource: Callable[[], List[InputBox]],
+        parallelism: int = 2,
+        leaseTimeout: float = 600,
+        planner: ConsolidationPlanner = None,
+        clock: Callable[[], float] = monotonic,
+    ) -> None:
+        self.stakingConfig = stakingConfig
+        self.address = address
+        self.boxSource = boxSource
+        # Number of builders that should be able to hold a box at the same time
+        self.parallelism = parallelism
+        self.leaseTimeout = leaseTimeout
+        self.planner = (
+            planner
+            if planner is not None
+            else ConsolidationPlanner(stakingConfig, address)
+        )
+        self.clock = clock
+        self.available: Dict[str, InputBox] = {}
+        self.leases: Dict[str, IncentiveLease] = {}
+        # Outputs of txs not seen by boxSource yet, with the time they expire
+        self._predicted: Dict[str, float] = {}
+        self._lock = Lock()
+
+    def emitValue(self) -> int:
+        # Taken from the staking incentive box by an emit tx
+        config = self.stakingConfig
+        return config.emitReward + config.emitMinerFee + int(1e6)
+
+    def compoundValue(self, stakeBoxes: int, txs: int = 1) -> int:
+        # Taken from the staking incentive box by txs compound txs together
+        # compounding stakeBoxes stake boxes
+        config = self.stakingConfig
+        return txs * (config.baseCompoundReward + config.baseCompoundMinerFee) + (
+            stakeBoxes
+            * (config.variableCompoundReward + config.variableCompoundMinerFee)
+        )
+
+    def refresh(self) -> None:
+        boxes = {b.getId().toString(): b for b in self.boxSource()}
+        now = self.clock()
+        with self._lock:
+            for boxId, expires in list(self._predicted.items()):
+                if boxId in boxes or expires < now:
+                    del self._predicted[boxId]
+            for boxId, lease in list(self.leases.items()):
+                if lease.expires < now or (
+                    boxId not in boxes and boxId not in self._predicted
+                ):
+                    del self.leases[boxId]
+            available = {
+                boxId: inputBox
+                for boxId, inputBox in boxes.items()
+                if boxId not in self.leases
+            }
+            for boxId in self._predicted:
+                if boxId in self.available and boxId not in self.leases:
+                    available[boxId] = self.available[boxId]
+            self.available = available
+
+    def lease(self, holder: str, minValue: int) -> IncentiveLease:
+        # The smallest box holding at least minValue, larger boxes are kept for
+        # the builders that need them
+        with self._lock:
+            candidates = [
+                b for b in self.available.values() if b.getValue() >= minValue
+            ]
+            if len(candidates) == 0:
+                raise NoIncentiveBoxException(
+                    f"No staking incentive box with {minValue} nanoerg available"
+                )
+            inputBox = min(candidates, key=lambda b: b.getValue())
+            lease = IncentiveLease(holder, inputBox, self.clock() + self.leaseTimeout)
+            del self.available[lease.boxId]
+            self.leases[lease.boxId] = lease
+            return lease
+
+    def release(self, lease: IncentiveLease, replacement: InputBox = None) -> None:
+        # Ends the lease. replacement is the unspent staking incentive output
+        # of the builder's last tx, the leased box itself when it was not spent.
+        with self._lock:
+            if self.leases.get(lease.boxId) is lease:
+                del self.leases[lease.boxId]
+            if replacement is not None:
+                boxId = replacement.getId().toString()
+                self.available[boxId] = replacement
+                if boxId != lease.boxId:
+                    self._predicted[boxId] = self.clock() + self.leaseTimeout
+
+    def source(self, holder: str, minValue: int) -> Callable[[], InputBox]:
+        # For CompoundPipeline.stakingIncentiveSource, every call gives up the
+        # previous box of the holder and leases a fresh one
+        leases: List[IncentiveLease] = []
+
+        def nextBox() -> InputBox:
+            if len(leases) > 0:
+                self.release(leases.pop())
+            self.refresh()
+            leases.append(self.lease(holder, minValue))
+            return leases[-1].inputBox
+
+        return nextBox
+
+    def plan(self, minValue: int) -> IncentiveMaintenance:
+        # Consolidates the dust and splits large boxes until parallelism boxes
+        # of at least minValue are available. Only boxes that are not leased.
+        with self._lock:
+            boxes = list(self.available.values())
+        maintenance = IncentiveMaintenance(
+            consolidations=self.planner.plan(
+                [b for b in boxes if b.getValue() <= _maxDustValue]
+            )
+        )
+        consolidated = set(
+            b.getId().toString() for batch in maintenance.consolidations for b in batch
+        )
+        useful = [b for b in boxes if b.getValue() >= minValue]
+        missing = self.parallelism - len(useful)
+        if missing <= 0:
+            return maintenance
+        total = 0
+        usefulSpent = 0
+        for inputBox in sorted(
+            (b for b in boxes if b.getId().toString() not in consolidated),
+            key=lambda b: -b.getValue(),
+        ):
+            maintenance.splitInputs.append(inputBox)
+            total += inputBox.getValue()
+            usefulSpent += 1 if inputBox.getValue() >= minValue else 0
+            if (total - _splitMinerFee) // minValue >= usefulSpent + missing:
+                break
+        count = min((total - _splitMinerFee) // minValue, usefulSpent + missing)
+        if count <= usefulSpent:
+            maintenance.splitInputs = []
+            return maintenance
+        maintenance.splitValues = [minValue] * count
+        # Whatever is left stays with the pool
+        remainder = total - _splitMinerFee - minValue * count
+        if remainder >= _minBoxValue:
+            maintenance.splitValues.append(remainder)
+        else:
+            maintenance.splitValues[-1] += remainder
+        return maintenance
+
+    def transactions(
+        self, minValue: int, stakePoolKeyInput: InputBox = None
+    ) -> List[ErgoTransaction]:
+        # Builds the maintenance txs and leases their inputs until refresh sees
+        # them spent. Splitting needs the stake pool key, without it only the
+        # dust is consolidated.
+        maintenance = self.plan(minValue)
+        txs = [
+            ConsolidateDustTransaction(
+                batch, self.stakingConfig, self.address, self.planner.maxInputs
+            )
+            for batch in maintenance.consolidations
+        ]
+        inputs = [b for batch in maintenance.consolidations for b in batch]
+        if stakePoolKeyInput is not None and len(maintenance.splitInputs) > 0:
+            txs.append(
+                SplitStakingIncentiveTransaction(
+                    maintenance.splitInputs,
+                    stakePoolKeyInput,
+                    maintenance.splitValues,
+                    self.stakingConfig,
+                    self.address,
+                )
+            )
+            inputs += maintenance.splitInputs
+        with self._lock:
+            for inputBox in inputs:
+                lease = IncentiveLease(
+                    "maintenance", inputBox, self.clock() + self.leaseTimeout
+                )
+                self.available.pop(lease.boxId, None)
+                self.leases[lease.boxId] = lease
+        return txs
@@ -0,0 +1,387 @@
+from dataclasses import dataclass
+import json
+import sqlite3
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.request import urlopen
+
+from org.ergoplatform.appkit import InputBox
+from org.ergoplatform.appkit.impl import InputBoxImpl
+from org.ergoplatform.restapi.client import JSON, ErgoTransactionOutput
+
+from paideia_contracts.contracts.staking import StakingConfig
+from paideia_contracts.contracts.staking.records import (
+    EmissionRecord,
+    StakePoolRecord,
+    StakeRecord,
+    StakeStateRecord,
+    StakingRecord,
+)
+
+STAKE_STATE = "stakeState"
+STAKE_POOL = "stakePool"
+EMISSION = "emission"
+STAKE = "stake"
+STAKE_PROXY = "stakeProxy"
+ADD_STAKE_PROXY = "addStakeProxy"
+UNSTAKE_PROXY = "unstakeProxy"
+STAKING_INCENTIVE = "stakingIncentive"
+
+_records = {
+    STAKE_STATE: StakeStateRecord,
+    STAKE_POOL: StakePoolRecord,
+    EMISSION: EmissionRecord,
+    STAKE: StakeRecord,
+}
+
+
+class ForkException(Exception):
+    pass
+
+
+@dataclass
+class IndexKeys:
+    # Token ids and ergo trees (hex) identifying the boxes of one pool
+    stakeStateNFT: str
+    stakePoolNFT: str
+    emissionNFT: str
+    stakeTokenId: str
+    stakeTree: str
+    stakeProxyTree: str
+    addStakeProxyTree: str
+    unstakeProxyTree: str
+    stakingIncentiveTree: str
+
+    @staticmethod
+    def fromStakingConfig(stakingConfig: StakingConfig) -> "IndexKeys":
+        def tree(contract) -> str:
+            return contract.contract.getErgoTree().bytesHex()
+
+        return IndexKeys(
+            stakeStateNFT=stakingConfig.stakeStateNFT,
+            stakePoolNFT=stakingConfig.stakePoolNFT,
+            emissionNFT=stakingConfig.emissionNFT,
+            stakeTokenId=stakingConfig.stakeTokenId,
+            stakeTree=tree(stakingConfig.stakeContract),
+            stakeProxyTree=tree(stakingConfig.stakeProxyContract),
+            addStakeProxyTree=tree(stakingConfig.addStakeProxyContract),
+            unstakeProxyTree=tree(stakingConfig.unstakeProxyContract),
+            stakingIncentiveTree=tree(stakingConfig.stakingIncentiveContract),
+        )
+
+    def kind(self, box: Dict[str, Any]) -> Optional[str]:
+        # Kind of box, None for boxes of other pools and contracts
+        assets = box.get("assets", [])
+        firstToken = assets[0]["tokenId"] if len(assets) > 0 else None
+        if firstToken == self.stakeStateNFT:
+            return STAKE_STATE
+        if firstToken == self.stakePoolNFT:
+            return STAKE_POOL
+        if firstToken == self.emissionNFT:
+            return EMISSION
+        tree = box["ergoTree"]
+        if firstToken == self.stakeTokenId and tree == self.stakeTree:
+            return STAKE
+        if tree == self.stakeProxyTree:
+            return STAKE_PROXY
+        if tree == self.addStakeProxyTree:
+            return ADD_STAKE_PROXY
+        if tree == self.unstakeProxyTree:
+            return UNSTAKE_PROXY
+        if tree == self.stakingIncentiveTree:
+            return STAKING_INCENTIVE
+        return None
+
+
+@dataclass
+class IndexedBox:
+    boxId: str
+    kind: str
+    height: int
+    box: Dict[str, Any]
+    record: StakingRecord = None
+
+    @staticmethod
+    def fromJson(box: Dict[str, Any], kind: str, height: int) -> "IndexedBox":
+        return IndexedBox(
+            box["boxId"],
+            kind,
+            height,
+            box,
+            _records[kind].fromJson(box) if kind in _records else None,
+        )
+
+    @property
+    def checkpoint(self) -> Optional[int]:
+        return self.record.checkpoint if self.kind == STAKE else None
+
+    def inputBox(self) -> InputBox:
+        return InputBoxImpl(
+            JSON().getGson().fromJson(json.dumps(self.box), ErgoTransactionOutput)
+        )
+
+
+_schema = """
+CREATE TABLE IF NOT EXISTS boxes (
+    boxId TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    height INTEGER NOT NULL,
+    checkpoint INTEGER,
+    box TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS boxesByCheckpoint ON boxes (kind, checkpoint);
+CREATE TABLE IF NOT EXISTS blocks (
+    height INTEGER PRIMARY KEY,
+    headerId TEXT NOT NULL,
+    undo TEXT
+);
+"""
+
+
+class StakingIndexer:
+    # Unspent boxes of one pool, updated block by block. Kept in memory and,
+    # with a path, in an SQLite database so a restart continues where it left
+    # off. The last maxRollback blocks can be rolled back on a fork.
+    def __init__(
+        self,
+        keys: IndexKeys,
+        path: str = ":memory:",
+        startHeight: int = 0,
+        maxRollback: int = 720,
+        pendingTimeout: int = 10,
+    ) -> None:
+        self.keys = keys
+        self.maxRollback = maxRollback
+        self.pendingTimeout = pendingTimeout
+        self.boxes: Dict[str, IndexedBox] = {}
+        self.byKind: Dict[str, Dict[str, IndexedBox]] = {
+            kind: {}
+            for kind in [
+                STAKE_STATE,
+                STAKE_POOL,
+                EMISSION,
+                STAKE,
+                STAKE_PROXY,
+                ADD_STAKE_PROXY,
+                UNSTAKE_PROXY,
+                STAKING_INCENTIVE,
+            ]
+        }
+        self.stakeByCheckpoint: Dict[int, Dict[str, StakeRecord]] = {}
+        self.byStakeKey: Dict[str, IndexedBox] = {}
+        # Stake boxes created by submitted txs that are not in a block yet, None
+        # after a full unstake, with the height they were submitted at
+        self.pendingStakeBoxes: Dict[str, Tuple[Optional[InputBox], int]] = {}
+        self.height = startHeight - 1
+        self.headerId: str = None
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript(_schema)
+        self._load()
+
+    def _load(self) -> None:
+        for kind, height, box in self._db.execute(
+            "SELECT kind, height, box FROM boxes"
+        ):
+            self._add(IndexedBox.fromJson(json.loads(box), kind, height))
+        row = self._db.execute(
+            "SELECT height, headerId FROM blocks ORDER BY height DESC LIMIT 1"
+        ).fetchone()
+        if row is not None:
+            self.height, self.headerId = row
+
+    def _add(self, indexedBox: IndexedBox) -> None:
+        self.boxes[indexedBox.boxId] = indexedBox
+        self.byKind[indexedBox.kind][indexedBox.boxId] = indexedBox
+        if indexedBox.kind == STAKE:
+            self.stakeByCheckpoint.setdefault(indexedBox.checkpoint, {})[
+                indexedBox.boxId
+            ] = indexedBox.record
+            self.byStakeKey[indexedBox.record.stakeKey] = indexedBox
+
+    def _remove(self, boxId: str) -> IndexedBox:
+        indexedBox = self.boxes.pop(boxId)
+        del self.byKind[indexedBox.kind][boxId]
+        if indexedBox.kind == STAKE:
+            group = self.stakeByCheckpoint[indexedBox.checkpoint]
+            del group[boxId]
+            if len(group) == 0:
+                del self.stakeByCheckpoint[indexedBox.checkpoint]
+            if self.byStakeKey.get(indexedBox.record.stakeKey) is indexedBox:
+                del self.byStakeKey[indexedBox.record.stakeKey]
+        return indexedBox
+
+    def _insertRows(self, indexedBoxes: List[IndexedBox]) -> None:
+        self._db.executemany(
+            "INSERT INTO boxes VALUES (?, ?, ?, ?, ?)",
+            [
+                (b.boxId, b.kind, b.height, b.checkpoint, json.dumps(b.box))
+                for b in indexedBoxes
+            ],
+        )
+
+    def _deleteRows(self, boxIds: List[str]) -> None:
+        self._db.executemany(
+            "DELETE FROM boxes WHERE boxId = ?", [(boxId,) for boxId in boxIds]
+        )
+
+    def applyBlock(self, block: Dict[str, Any]) -> None:
+        # Block in the json of the node api (/blocks/{headerId})
+        header = block["header"]
+        if header["height"] != self.height + 1:
+            raise ValueError(
+                f"Expected block {self.height + 1}, got {header['height']}"
+            )
+        if self.headerId is not None and header["parentId"] != self.headerId:
+            raise ForkException(f"Block {header['id']} is not on the indexed chain")
+        # Outputs are decoded before touching the index, a box that does not
+        # decode leaves the index as it was
+        transactions = []
+        for tx in block["blockTransactions"]["transactions"]:
+            outputs = []
+            for output in tx["outputs"]:
+                kind = self.keys.kind(output)
+                if kind is not None:
+                    outputs.append(IndexedBox.fromJson(output, kind, header["height"]))
+            transactions.append(([i["boxId"] for i in tx["inputs"]], outputs))
+        created: List[IndexedBox] = []
+        spent: List[IndexedBox] = []
+        for inputIds, outputs in transactions:
+            for boxId in inputIds:
+                if boxId in self.boxes:
+                    spent.append(self._remove(boxId))
+            for indexedBox in outputs:
+                self._add(indexedBox)
+                created.append(indexedBox)
+        # Predictions end once the predicted stake box, or the full unstake, is
+        # in a block. Only part of a chain might be in this one.
+        for indexedBox in spent + created:
+            if indexedBox.kind != STAKE:
+                continue
+            stakeKey = indexedBox.record.stakeKey
+            if stakeKey not in self.pendingStakeBoxes:
+                continue
+            stakeBox, _ = self.pendingStakeBoxes[stakeKey]
+            if (
+                stakeBox.getId().toString() == indexedBox.boxId
+                if stakeBox is not None
+                else stakeKey not in self.byStakeKey
+            ):
+                del self.pendingStakeBoxes[stakeKey]
+        for stakeKey, (_, height) in list(self.pendingStakeBoxes.items()):
+            if height < header["height"] - self.pendingTimeout:
+                del self.pendingStakeBoxes[stakeKey]
+        # Boxes created and spent in the same block never reach the database
+        createdIds = set(b.boxId for b in created)
+        spentBefore = [b for b in spent if b.boxId not in createdIds]
+        created = [b for b in created if b.boxId in self.boxes]
+        undo = {
+            "created": [b.boxId for b in created],
+            "spent": [[b.kind, b.height, b.box] for b in spentBefore],
+        }
+        with self._db:
+            self._deleteRows([b.boxId for b in spentBefore])
+            self._insertRows(created)
+            self._db.execute(
+                "INSERT INTO blocks VALUES (?, ?, ?)",
+                (header["height"], header["id"], json.dumps(undo)),
+            )
+            self._db.execute(
+                "UPDATE blocks SET undo = NULL WHERE height <= ?",
+                (header["height"] - self.maxRollback,),
+            )
+        self.height = header["height"]
+        self.headerId = header["id"]
+
+    def rollback(self) -> None:
+        # Undoes the last indexed block
+        row = self._db.execute(
+            "SELECT undo FROM blocks WHERE height = ?", (self.height,)
+        ).fetchone()
+        if row is None or row[0] is None:
+            raise ForkException(f"Can not roll back block {self.height}")
+        undo = json.loads(row[0])
+        restored = [
+            IndexedBox.fromJson(box, kind, height)
+            for kind, height, box in undo["spent"]
+        ]
+        for boxId in undo["created"]:
+            self._remove(boxId)
+        for indexedBox in restored:
+            self._add(indexedBox)
+        with self._db:
+            self._deleteRows(undo["created"])
+            self._insertRows(restored)
+            self._db.execute("DELETE FROM blocks WHERE height = ?", (self.height,))
+        row = self._db.execute(
+            "SELECT height, headerId FROM blocks ORDER BY height DESC LIMIT 1"
+        ).fetchone()
+        self.height -= 1
+        self.headerId = row[1] if row is not None else None
+
+    def follow(self, blockSource: Callable[[int], Optional[Dict[str, Any]]]) -> int:
+        # Indexes blocks until blockSource has no block at the next height,
+        # rolling back on forks. Returns the number of blocks applied.
+        applied = 0
+        while True:
+            block = blockSource(self.height + 1)
+            if block is None:
+                # The last indexed block might have been replaced at the tip
+                tip = blockSource(self.height) if self.headerId is not None else None
+                if tip is None or tip["header"]["id"] == self.headerId:
+                    return applied
+                self.rollback()
+                continue
+            if self.headerId is not None and (
+                block["header"]["parentId"] != self.headerId
+            ):
+                self.rollback()
+                continue
+            self.applyBlock(block)
+            applied += 1
+
+    def single(self, kind: str) -> Optional[IndexedBox]:
+        # The unspent stake state, stake pool or emission box
+        boxes = self.byKind[kind]
+        return next(iter(boxes.values())) if len(boxes) > 0 else None
+
+    def stakeBoxes(self, checkpoint: int) -> List[StakeRecord]:
+        return list(self.stakeByCheckpoint.get(checkpoint, {}).values())
+
+    def stakeBox(self, stakeKey: str) -> Optional[StakeRecord]:
+        indexedBox = self.byStakeKey.get(stakeKey)
+        return indexedBox.record if indexedBox is not None else None
+
+    def stakeBoxSource(self, stakeKey: str) -> Optional[InputBox]:
+        # The unspent stake box of a stake key, for StakeStateSequencer. Txs
+        # passed to trackPending count as spent already.
+        if stakeKey in self.pendingStakeBoxes:
+            return self.pendingStakeBoxes[stakeKey][0]
+        indexedBox = self.byStakeKey.get(stakeKey)
+        return indexedBox.inputBox() if indexedBox is not None else None
+
+    def trackPending(self, stakeBoxes: Dict[str, Optional[InputBox]]) -> None:
+        # Stake boxes of submitted txs, such as SequenceResult.stakeOutputs,
+        # until the stake key shows up in a block or pendingTimeout blocks pass
+        for stakeKey, stakeBox in stakeBoxes.items():
+            self.pendingStakeBoxes[stakeKey] = (stakeBox, self.height)
+
+    def inputBoxes(self, kind: str) -> List[InputBox]:
+        return [b.inputBox() for b in self.byKind[kind].values()]
+
+    def close(self) -> None:
+        self._db.close()
+
+
+def nodeBlockSource(
+    nodeUrl: str, timeout: float = 30
+) -> Callable[[int], Optional[Dict[str, Any]]]:
+    # Blocks of the best chain of a node, None above its height. The node lists
+    # the header of the best chain first at every height.
+    def block(height: int) -> Optional[Dict[str, Any]]:
+        with urlopen(f"{nodeUrl}/blocks/at/{height}", timeout=timeout) as response:
+            headerIds = json.load(response)
+        if len(headerIds) == 0:
+            return None
+        with urlopen(f"{nodeUrl}/blocks/{headerIds[0]}", timeout=timeout) as response:
+            return json.load(response)
+
+    return block
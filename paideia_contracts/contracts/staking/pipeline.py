@@ -0,0 +1,169 @@
+from dataclasses import dataclass
+from typing import Callable, List
+
+from ergo_python_appkit.appkit import ErgoAppKit
+from java.lang.reflect import UndeclaredThrowableException
+from org.ergoplatform.appkit import (
+    ErgoClientException,
+    InputBox,
+    SignedTransaction,
+    UnsignedTransaction,
+)
+
+from paideia_contracts.contracts.staking import CompoundTransaction, StakingConfig
+from paideia_contracts.contracts.staking.planner import CompoundBatch, CompoundPlanner
+from paideia_contracts.contracts.staking.records import EmissionRecord, StakeRecord
+
+
+class ChainRejectedException(Exception):
+    pass
+
+
+@dataclass
+class ChainedCompound:
+    batch: CompoundBatch
+    signedTx: SignedTransaction
+    txId: str = None
+
+    @property
+    def emissionOutput(self) -> InputBox:
+        return self.signedTx.getOutputsToSpend()[0]
+
+    @property
+    def stakingIncentiveOutput(self) -> InputBox:
+        return self.signedTx.getOutputsToSpend()[len(self.batch) + 1]
+
+
+# Exceptions appkit raises when the node rejects a tx or does not know a box
+rejectionExceptions = (ErgoClientException, UndeclaredThrowableException)
+
+
+class TransactionChain:
+    # Signs txs locally and submits them to the node, for chains of txs that
+    # spend the predicted outputs of the tx before them
+    def __init__(self, appKit: ErgoAppKit) -> None:
+        self.appKit = appKit
+
+    def signTransaction(self, unsignedTx: UnsignedTransaction) -> SignedTransaction:
+        return self.appKit.signTransaction(unsignedTx)
+
+    def sendTransaction(self, signedTx: SignedTransaction) -> str:
+        return self.appKit.sendTransaction(signedTx)
+
+    def unspentBoxes(self, boxIds: List[str]) -> List[InputBox]:
+        # Boxes that are still unspent, taking the mempool into account. One id
+        # at a time, asked for together appkit does not raise for a spent box
+        # after the first one but returns the box before it again.
+        unspent = []
+        for boxId in boxIds:
+            try:
+                unspent += self.appKit.getBoxesById([boxId])
+            except rejectionExceptions:
+                pass
+        return unspent
+
+    def isUnspent(self, inputBox: InputBox) -> bool:
+        return len(self.unspentBoxes([inputBox.getId().toString()])) > 0
+
+
+class CompoundPipeline(TransactionChain):
+    # Compounds a whole checkpoint in one go. Every compound tx spends the
+    # emission and staking incentive boxes created by the tx before it, so the
+    # chain is signed locally, with the output boxes of each tx predicted from
+    # the signed tx, and submitted without waiting for confirmations.
+    def __init__(
+        self,
+        stakingConfig: StakingConfig,
+        address: str,
+        planner: CompoundPlanner = None,
+        maxRebuilds: int = 3,
+        stakingIncentiveSource: Callable[[], InputBox] = None,
+    ) -> None:
+        super().__init__(stakingConfig.appKit)
+        self.stakingConfig = stakingConfig
+        self.address = address
+        self.planner = (
+            planner if planner is not None else CompoundPlanner(stakingConfig, address)
+        )
+        self.maxRebuilds = maxRebuilds
+        self.stakingIncentiveSource = stakingIncentiveSource
+        # Unspent emission and staking incentive boxes after the last run
+        self.emissionOutput: InputBox = None
+        self.stakingIncentiveOutput: InputBox = None
+
+    def build(
+        self,
+        emissionInput: InputBox,
+        stakeInputs: List[InputBox],
+        stakingIncentiveInput: InputBox,
+    ) -> List[ChainedCompound]:
+        stakeInputsById = {b.getId().toString(): b for b in stakeInputs}
+        batches = self.planner.plan(
+            EmissionRecord.fromInputBox(emissionInput),
+            [StakeRecord.fromInputBox(b) for b in stakeInputs],
+        )
+        chain = []
+        for batch in batches:
+            compoundTx = CompoundTransaction(
+                emissionInput,
+                [stakeInputsById[s.boxId] for s in batch.stakeBoxes],
+                stakingIncentiveInput,
+                self.stakingConfig,
+                self.address,
+            )
+            compound = ChainedCompound(
+                batch, self.signTransaction(compoundTx.unsignedTx)
+            )
+            emissionInput = compound.emissionOutput
+            stakingIncentiveInput = compound.stakingIncentiveOutput
+            chain.append(compound)
+        return chain
+
+    def run(
+        self,
+        emissionInput: InputBox,
+        stakeInputs: List[InputBox],
+        stakingIncentiveInput: InputBox,
+    ) -> List[str]:
+        # Submits the chain and returns the ids of the accepted txs. When a tx is
+        # rejected, the txs after it are rebuilt from the last accepted tx with
+        # the stake boxes that are still unspent.
+        txIds = []
+        for _ in range(self.maxRebuilds + 1):
+            chain = self.build(emissionInput, stakeInputs, stakingIncentiveInput)
+            compounded = set()
+            rejection = None
+            for compound in chain:
+                try:
+                    compound.txId = self.sendTransaction(compound.signedTx)
+                except rejectionExceptions as e:
+                    rejection = e
+                    break
+                txIds.append(compound.txId)
+                compounded.update(s.boxId for s in compound.batch.stakeBoxes)
+                emissionInput = compound.emissionOutput
+                stakingIncentiveInput = compound.stakingIncentiveOutput
+            if rejection is None:
+                self.emissionOutput = emissionInput
+                self.stakingIncentiveOutput = stakingIncentiveInput
+                return txIds
+            if not self.isUnspent(emissionInput):
+                raise ChainRejectedException(
+                    f"Emission box spent outside of the chain: {rejection}"
+                )
+            if not self.isUnspent(stakingIncentiveInput):
+                if self.stakingIncentiveSource is None:
+                    raise ChainRejectedException(
+                        f"Staking incentive box spent outside of the chain: {rejection}"
+                    )
+                stakingIncentiveInput = self.stakingIncentiveSource()
+            stakeInputs = self.unspentBoxes(
+                [
+                    b.getId().toString()
+                    for b in stakeInputs
+                    if b.getId().toString() not in compounded
+                ]
+            )
+        raise ChainRejectedException(
+            f"Compound chain still rejected after {self.maxRebuilds} rebuilds: {rejection}"
+        )
@@ -0,0 +1,358 @@
+from dataclasses import dataclass, field
+import math
+from typing import Callable, List
+
+from org.ergoplatform import ErgoScriptPredef
+from org.ergoplatform.appkit import InputBox
+
+from paideia_contracts.contracts.staking import (
+    ConsolidateDustTransaction,
+    StakingConfig,
+    codec,
+    dust,
+    rewards,
+)
+from paideia_contracts.contracts.staking.records import EmissionRecord, StakeRecord
+
+# Node defaults for the mempool, a transaction over either limit is rejected
+maxTransactionSize = 98304
+maxTransactionCost = 1000000
+
+_boxValue = int(1e6)
+_maxLongSize = 9
+# Stake, emission and staking incentive inputs carry no proof and no context
+# extension: box id + empty proof length + empty extension size
+_inputSize = 32 + 1 + 1
+
+
+def vlqSize(value: int) -> int:
+    return len(codec.encodeVLQ(value))
+
+
+def maxCount(measure: Callable[[int], int], limit: int) -> int:
+    # Largest n with measure(n) <= limit, for a measure increasing with n
+    if measure(0) > limit:
+        return 0
+    low, high = 0, 1
+    while measure(high) <= limit:
+        high *= 2
+    while high - low > 1:
+        middle = (low + high) // 2
+        if measure(middle) <= limit:
+            low = middle
+        else:
+            high = middle
+    return low
+
+
+def largestFitting(fits: Callable[[int], bool], upper: int) -> int:
+    # Largest n in 1..upper with fits(n), for fits true up to some n and false
+    # after it, 0 when not even 1 fits
+    low, high = 0, upper + 1
+    while high - low > 1:
+        middle = (low + high) // 2
+        if fits(middle):
+            low = middle
+        else:
+            high = middle
+    return low
+
+
+class CompoundCostModel:
+    # Script cost of a compound tx with n stake boxes. Every stake box costs the
+    # same to validate, apart from INPUTS.indexOf(SELF, 1) in stake.es that
+    # walks the inputs up to the box itself, which makes the total quadratic.
+    # The defaults are conservative estimates from the v5 cost parameters,
+    # pass measured values to pack closer to the limit.
+    def __init__(
+        self,
+        baseCost: int = 30000,
+        stakeBoxCost: int = 4500,
+        indexOfCost: int = 10,
+    ) -> None:
+        self.baseCost = baseCost
+        self.stakeBoxCost = stakeBoxCost
+        self.indexOfCost = indexOfCost
+
+    def cost(self, stakeBoxes: int) -> int:
+        return (
+            self.baseCost
+            + self.stakeBoxCost * stakeBoxes
+            + self.indexOfCost * stakeBoxes * (stakeBoxes + 1) // 2
+        )
+
+    def maxStakeBoxes(self, maxCost: int) -> int:
+        return maxCount(self.cost, maxCost)
+
+
+class DustCostModel:
+    # Script cost of a consolidate tx with n dust boxes. The script of every
+    # dust box filters all the inputs on their ergo tree, so the total is
+    # quadratic. Conservative estimates like CompoundCostModel.
+    def __init__(
+        self,
+        baseCost: int = 10000,
+        inputCost: int = 3000,
+        filterCost: int = 30,
+    ) -> None:
+        self.baseCost = baseCost
+        self.inputCost = inputCost
+        self.filterCost = filterCost
+
+    def cost(self, inputs: int) -> int:
+        return self.baseCost + self.inputCost * inputs + self.filterCost * inputs**2
+
+    def maxInputs(self, maxCost: int) -> int:
+        return maxCount(self.cost, maxCost)
+
+
+@dataclass
+class CompoundBatch:
+    stakeBoxes: List[StakeRecord] = field(default_factory=list)
+    rewards: List[int] = field(default_factory=list)
+    size: int = 0
+    cost: int = 0
+    reward: int = 0
+    minerFee: int = 0
+
+    def __len__(self) -> int:
+        return len(self.stakeBoxes)
+
+    @property
+    def stakeRewards(self) -> int:
+        return sum(self.rewards)
+
+
+class CompoundPlanner:
+    def __init__(
+        self,
+        stakingConfig: StakingConfig,
+        address: str,
+        maxSize: int = maxTransactionSize,
+        maxCost: int = maxTransactionCost,
+        costModel: CompoundCostModel = None,
+        creationHeight: int = 2**21,
+    ) -> None:
+        self.stakingConfig = stakingConfig
+        self.maxSize = maxSize
+        self.maxCost = maxCost
+        self.costModel = costModel if costModel is not None else CompoundCostModel()
+        self.creationHeight = creationHeight
+        self._stakeTreeSize = len(
+            stakingConfig.stakeContract.contract.getErgoTree().bytes()
+        )
+        self._emissionTreeSize = len(
+            stakingConfig.emissionContract.contract.getErgoTree().bytes()
+        )
+        self._stakingIncentiveTreeSize = len(
+            stakingConfig.stakingIncentiveContract.contract.getErgoTree().bytes()
+        )
+        self._addressTreeSize = len(
+            stakingConfig.appKit.contractFromAddress(address).getErgoTree().bytes()
+        )
+        self._feeTreeSize = len(ErgoScriptPredef.feeProposition(720).bytes())
+
+    def _outputSize(self, value: int, treeSize: int, tokens: List[int]) -> int:
+        # Token ids are stored once per tx, boxes refer to them by index
+        return (
+            vlqSize(value)
+            + treeSize
+            + vlqSize(self.creationHeight)
+            + 1
+            + sum(1 + vlqSize(amount) for amount in tokens)
+            + 1
+        )
+
+    def stakeBoxSize(self, stakeBox: StakeRecord, reward: int) -> int:
+        # Input and output added to a compound tx by one stake box
+        return (
+            _inputSize
+            + self._outputSize(
+                _boxValue, self._stakeTreeSize, [1, stakeBox.amountStaked + reward]
+            )
+            + len(codec.encodeLongArray([stakeBox.checkpoint + 1, stakeBox.stakeTime]))
+            + len(codec.encodeByteArray(bytes.fromhex(stakeBox.stakeKey)))
+        )
+
+    def baseSize(self, emission: EmissionRecord, stakeBoxes: int) -> int:
+        # Everything in a compound tx apart from the stake boxes, the counts are
+        # sized for the largest tx allowed
+        config = self.stakingConfig
+        reward = config.baseCompoundReward + config.variableCompoundReward * stakeBoxes
+        minerFee = (
+            config.baseCompoundMinerFee + config.variableCompoundMinerFee * stakeBoxes
+        )
+        emissionOutput = self._outputSize(
+            _boxValue,
+            self._emissionTreeSize,
+            [1, emission.emissionRemaining] if emission.emissionRemaining > 0 else [1],
+        ) + len(
+            codec.encodeLongArray(
+                [
+                    emission.amountStaked,
+                    emission.checkpoint,
+                    emission.stakers,
+                    emission.emissionAmount,
+                ]
+            )
+        )
+        stakingIncentiveOutput = (
+            _maxLongSize + self._outputSize(0, self._stakingIncentiveTreeSize, []) - 1
+        )
+        return (
+            vlqSize(stakeBoxes + 2)
+            + 2 * _inputSize
+            + 1
+            + 1
+            + 3 * 32
+            + vlqSize(stakeBoxes + 4)
+            + emissionOutput
+            + stakingIncentiveOutput
+            + self._outputSize(reward, self._addressTreeSize, [])
+            + self._outputSize(minerFee, self._feeTreeSize, [])
+        )
+
+    def plan(
+        self, emission: EmissionRecord, stakeBoxes: List[StakeRecord]
+    ) -> List[CompoundBatch]:
+        # Splits the stake boxes on the emission checkpoint into the fewest
+        # compound txs within maxSize and maxCost, in the order they should be
+        # submitted. Each tx spends the emission box created by the one before.
+        stakeBoxes = [s for s in stakeBoxes if s.checkpoint == emission.checkpoint]
+        if len(stakeBoxes) == 0:
+            return []
+        stakeRewards = rewards.compoundRewards(
+            [s.amountStaked for s in stakeBoxes],
+            emission.emissionAmount,
+            emission.amountStaked,
+        )
+        sizes = [
+            self.stakeBoxSize(stakeBox, reward)
+            for stakeBox, reward in zip(stakeBoxes, stakeRewards)
+        ]
+        maxStakeBoxes = min(self.costModel.maxStakeBoxes(self.maxCost), len(stakeBoxes))
+        sizeBudget = self.maxSize - self.baseSize(emission, maxStakeBoxes)
+        if maxStakeBoxes == 0 or sizeBudget < max(sizes):
+            raise ValueError("A single stake box does not fit in a compound tx")
+        # First fit decreasing. Boxes differ by a few bytes at most, so this
+        # reaches the lower bound on the number of txs in practice.
+        batches: List[CompoundBatch] = []
+        for i in sorted(range(len(stakeBoxes)), key=lambda i: -sizes[i]):
+            for batch in batches:
+                if len(batch) < maxStakeBoxes and batch.size + sizes[i] <= sizeBudget:
+                    break
+            else:
+                batch = CompoundBatch()
+                batches.append(batch)
+            batch.stakeBoxes.append(stakeBoxes[i])
+            batch.rewards.append(stakeRewards[i])
+            batch.size += sizes[i]
+        config = self.stakingConfig
+        for batch in batches:
+            n = len(batch)
+            batch.size += self.baseSize(emission, n)
+            batch.cost = self.costModel.cost(n)
+            batch.reward = config.baseCompoundReward + config.variableCompoundReward * n
+            batch.minerFee = (
+                config.baseCompoundMinerFee + config.variableCompoundMinerFee * n
+            )
+        return batches
+
+    def minimumBatches(
+        self, emission: EmissionRecord, stakeBoxes: List[StakeRecord]
+    ) -> int:
+        # Lower bound on the number of compound txs needed
+        stakeBoxes = [s for s in stakeBoxes if s.checkpoint == emission.checkpoint]
+        if len(stakeBoxes) == 0:
+            return 0
+        maxStakeBoxes = self.costModel.maxStakeBoxes(self.maxCost)
+        stakeRewards = rewards.compoundRewards(
+            [s.amountStaked for s in stakeBoxes],
+            emission.emissionAmount,
+            emission.amountStaked,
+        )
+        totalSize = sum(
+            self.stakeBoxSize(stakeBox, reward)
+            for stakeBox, reward in zip(stakeBoxes, stakeRewards)
+        )
+        sizeBudget = self.maxSize - self.baseSize(
+            emission, min(maxStakeBoxes, len(stakeBoxes))
+        )
+        return max(
+            math.ceil(len(stakeBoxes) / maxStakeBoxes),
+            math.ceil(totalSize / sizeBudget),
+        )
+
+
+class ConsolidationPlanner:
+    # Splits the staking incentive dust boxes of a pool into consolidate txs
+    # within maxSize and maxCost. The txs spend different boxes, so they can all
+    # go in the same block.
+    def __init__(
+        self,
+        stakingConfig: StakingConfig,
+        address: str,
+        maxSize: int = maxTransactionSize,
+        maxCost: int = maxTransactionCost,
+        costModel: DustCostModel = None,
+        creationHeight: int = 2**21,
+    ) -> None:
+        self.stakingConfig = stakingConfig
+        self.address = address
+        self.maxSize = maxSize
+        self.maxCost = maxCost
+        self.costModel = costModel if costModel is not None else DustCostModel()
+        self.creationHeight = creationHeight
+        self._stakingIncentiveTreeSize = len(
+            stakingConfig.stakingIncentiveContract.contract.getErgoTree().bytes()
+        )
+        self._addressTreeSize = len(
+            stakingConfig.appKit.contractFromAddress(address).getErgoTree().bytes()
+        )
+        self._feeTreeSize = len(ErgoScriptPredef.feeProposition(720).bytes())
+        self.maxInputs = min(
+            self.costModel.maxInputs(maxCost), maxCount(self.size, maxSize)
+        )
+        if self.maxInputs < 2:
+            raise ValueError("A consolidate tx with 2 dust boxes exceeds the limits")
+
+    def _outputSize(self, value: int, treeSize: int) -> int:
+        return vlqSize(value) + treeSize + vlqSize(self.creationHeight) + 1 + 1
+
+    def size(self, inputs: int) -> int:
+        # Consolidate tx with the given number of dust boxes, sized for the
+        # largest staking incentive output
+        config = self.stakingConfig
+        return (
+            vlqSize(inputs)
+            + _inputSize * inputs
+            + 1
+            + 1
+            + 1
+            + _maxLongSize
+            + self._outputSize(0, self._stakingIncentiveTreeSize)
+            - 1
+            + self._outputSize(
+                config.dustCollectionReward * inputs, self._addressTreeSize
+            )
+            + self._outputSize(config.dustCollectionMinerFee, self._feeTreeSize)
+        )
+
+    def plan(self, incentiveDustInputs: List[InputBox]) -> List[List[InputBox]]:
+        batches = dust.consolidationBatches(
+            [idi.getValue() for idi in incentiveDustInputs],
+            self.stakingConfig.dustCollectionReward,
+            self.stakingConfig.dustCollectionMinerFee,
+            self.maxInputs,
+        )
+        return [[incentiveDustInputs[i] for i in batch] for batch in batches]
+
+    def transactions(
+        self, incentiveDustInputs: List[InputBox]
+    ) -> List[ConsolidateDustTransaction]:
+        return [
+            ConsolidateDustTransaction(
+                batch, self.stakingConfig, self.address, self.maxInputs
+            )
+            for batch in self.plan(incentiveDustInputs)
+        ]
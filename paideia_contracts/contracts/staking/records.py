@@ -0,0 +1,320 @@
+from typing import Any, Dict, List
+
+from org.ergoplatform.appkit import InputBox
+
+from paideia_contracts.contracts.staking import (
+    EmissionBox,
+    EmissionContract,
+    StakeBox,
+    StakeContract,
+    StakePoolBox,
+    StakePoolContract,
+    StakeStateBox,
+    StakeStateContract,
+    codec,
+)
+
+# Plain python records holding only the decoded fields of the staking boxes, for
+# keeping large numbers of boxes in memory. Use toBox to get the full box wrapper.
+
+
+def jsonRegisters(box: Dict[str, Any]) -> List[bytes]:
+    # Registers of a box in the json of the node api, the explorer api wraps
+    # them in an object with the serialized value
+    registers = box.get("additionalRegisters", {})
+    result = []
+    for register in ["R4", "R5", "R6", "R7", "R8", "R9"]:
+        if register not in registers:
+            break
+        value = registers[register]
+        if isinstance(value, dict):
+            value = value["serializedValue"]
+        result.append(bytes.fromhex(value))
+    return result
+
+
+class StakingRecord:
+    __slots__ = ()
+
+    def __eq__(self, other) -> bool:
+        return type(self) is type(other) and all(
+            getattr(self, field) == getattr(other, field) for field in self.__slots__
+        )
+
+    def __repr__(self) -> str:
+        fields = ", ".join(
+            f"{field}={getattr(self, field)!r}" for field in self.__slots__
+        )
+        return f"{type(self).__name__}({fields})"
+
+
+class StakeRecord(StakingRecord):
+    __slots__ = ("boxId", "checkpoint", "stakeTime", "amountStaked", "stakeKey")
+
+    def __init__(
+        self,
+        boxId: str,
+        checkpoint: int,
+        stakeTime: int,
+        amountStaked: int,
+        stakeKey: str,
+    ) -> None:
+        self.boxId = boxId
+        self.checkpoint = checkpoint
+        self.stakeTime = stakeTime
+        self.amountStaked = amountStaked
+        self.stakeKey = stakeKey
+
+    @staticmethod
+    def fromInputBox(inputBox: InputBox) -> "StakeRecord":
+        registers = inputBox.getRegisters()
+        checkpoint, stakeTime = codec.decodeLongArray(codec.registerBytes(registers[0]))
+        return StakeRecord(
+            boxId=inputBox.getId().toString(),
+            checkpoint=checkpoint,
+            stakeTime=stakeTime,
+            amountStaked=int(inputBox.getTokens()[1].getValue()),
+            stakeKey=codec.decodeByteArray(codec.registerBytes(registers[1])).hex(),
+        )
+
+    @staticmethod
+    def fromJson(box: Dict[str, Any]) -> "StakeRecord":
+        registers = jsonRegisters(box)
+        checkpoint, stakeTime = codec.decodeLongArray(registers[0])
+        return StakeRecord(
+            boxId=box["boxId"],
+            checkpoint=checkpoint,
+            stakeTime=stakeTime,
+            amountStaked=int(box["assets"][1]["amount"]),
+            stakeKey=codec.decodeByteArray(registers[1]).hex(),
+        )
+
+    @staticmethod
+    def fromBox(stakeBox: StakeBox, boxId: str = None) -> "StakeRecord":
+        return StakeRecord(
+            boxId=boxId,
+            checkpoint=stakeBox.checkpoint,
+            stakeTime=stakeBox.stakeTime,
+            amountStaked=stakeBox.amountStaked,
+            stakeKey=stakeBox.stakeKey,
+        )
+
+    def toBox(self, stakeContract: StakeContract) -> StakeBox:
+        return StakeBox(
+            appKit=stakeContract.appKit,
+            stakeContract=stakeContract,
+            checkpoint=self.checkpoint,
+            stakeTime=self.stakeTime,
+            amountStaked=self.amountStaked,
+            stakeKey=self.stakeKey,
+        )
+
+
+class EmissionRecord(StakingRecord):
+    __slots__ = (
+        "boxId",
+        "emissionRemaining",
+        "amountStaked",
+        "checkpoint",
+        "stakers",
+        "emissionAmount",
+    )
+
+    def __init__(
+        self,
+        boxId: str,
+        emissionRemaining: int,
+        amountStaked: int,
+        checkpoint: int,
+        stakers: int,
+        emissionAmount: int,
+    ) -> None:
+        self.boxId = boxId
+        self.emissionRemaining = emissionRemaining
+        self.amountStaked = amountStaked
+        self.checkpoint = checkpoint
+        self.stakers = stakers
+        self.emissionAmount = emissionAmount
+
+    @staticmethod
+    def fromInputBox(inputBox: InputBox) -> "EmissionRecord":
+        registers = inputBox.getRegisters()
+        amountStaked, checkpoint, stakers, emissionAmount = codec.decodeLongArray(
+            codec.registerBytes(registers[0])
+        )
+        tokens = inputBox.getTokens()
+        return EmissionRecord(
+            boxId=inputBox.getId().toString(),
+            emissionRemaining=int(tokens[1].getValue()) if len(tokens) > 1 else 0,
+            amountStaked=amountStaked,
+            checkpoint=checkpoint,
+            stakers=stakers,
+            emissionAmount=emissionAmount,
+        )
+
+    @staticmethod
+    def fromJson(box: Dict[str, Any]) -> "EmissionRecord":
+        amountStaked, checkpoint, stakers, emissionAmount = codec.decodeLongArray(
+            jsonRegisters(box)[0]
+        )
+        assets = box["assets"]
+        return EmissionRecord(
+            boxId=box["boxId"],
+            emissionRemaining=int(assets[1]["amount"]) if len(assets) > 1 else 0,
+            amountStaked=amountStaked,
+            checkpoint=checkpoint,
+            stakers=stakers,
+            emissionAmount=emissionAmount,
+        )
+
+    @staticmethod
+    def fromBox(emissionBox: EmissionBox, boxId: str = None) -> "EmissionRecord":
+        return EmissionRecord(
+            boxId=boxId,
+            emissionRemaining=emissionBox.emissionRemaining,
+            amountStaked=emissionBox.amountStaked,
+            checkpoint=emissionBox.checkpoint,
+            stakers=emissionBox.stakers,
+            emissionAmount=emissionBox.emissionAmount,
+        )
+
+    def toBox(self, emissionContract: EmissionContract) -> EmissionBox:
+        return EmissionBox(
+            appKit=emissionContract.appKit,
+            emissionContract=emissionContract,
+            emissionRemaining=self.emissionRemaining,
+            amountStaked=self.amountStaked,
+            checkpoint=self.checkpoint,
+            stakers=self.stakers,
+            emissionAmount=self.emissionAmount,
+        )
+
+
+class StakeStateRecord(StakingRecord):
+    __slots__ = (
+        "boxId",
+        "checkpoint",
+        "checkpointTime",
+        "amountStaked",
+        "cycleDuration",
+        "stakers",
+    )
+
+    def __init__(
+        self,
+        boxId: str,
+        checkpoint: int,
+        checkpointTime: int,
+        amountStaked: int,
+        cycleDuration: int,
+        stakers: int,
+    ) -> None:
+        self.boxId = boxId
+        self.checkpoint = checkpoint
+        self.checkpointTime = checkpointTime
+        self.amountStaked = amountStaked
+        self.cycleDuration = cycleDuration
+        self.stakers = stakers
+
+    @staticmethod
+    def fromInputBox(inputBox: InputBox) -> "StakeStateRecord":
+        registers = inputBox.getRegisters()
+        (
+            amountStaked,
+            checkpoint,
+            stakers,
+            checkpointTime,
+            cycleDuration,
+        ) = codec.decodeLongArray(codec.registerBytes(registers[0]))
+        return StakeStateRecord(
+            boxId=inputBox.getId().toString(),
+            checkpoint=checkpoint,
+            checkpointTime=checkpointTime,
+            amountStaked=amountStaked,
+            cycleDuration=cycleDuration,
+            stakers=stakers,
+        )
+
+    @staticmethod
+    def fromJson(box: Dict[str, Any]) -> "StakeStateRecord":
+        (
+            amountStaked,
+            checkpoint,
+            stakers,
+            checkpointTime,
+            cycleDuration,
+        ) = codec.decodeLongArray(jsonRegisters(box)[0])
+        return StakeStateRecord(
+            boxId=box["boxId"],
+            checkpoint=checkpoint,
+            checkpointTime=checkpointTime,
+            amountStaked=amountStaked,
+            cycleDuration=cycleDuration,
+            stakers=stakers,
+        )
+
+    @staticmethod
+    def fromBox(stakeStateBox: StakeStateBox, boxId: str = None) -> "StakeStateRecord":
+        return StakeStateRecord(
+            boxId=boxId,
+            checkpoint=stakeStateBox.checkpoint,
+            checkpointTime=stakeStateBox.checkpointTime,
+            amountStaked=stakeStateBox.amountStaked,
+            cycleDuration=stakeStateBox.cycleDuration,
+            stakers=stakeStateBox.stakers,
+        )
+
+    def toBox(self, stakeStateContract: StakeStateContract) -> StakeStateBox:
+        return StakeStateBox(
+            appKit=stakeStateContract.appKit,
+            stakeStateContract=stakeStateContract,
+            checkpoint=self.checkpoint,
+            checkpointTime=self.checkpointTime,
+            amountStaked=self.amountStaked,
+            cycleDuration=self.cycleDuration,
+            stakers=self.stakers,
+        )
+
+
+class StakePoolRecord(StakingRecord):
+    __slots__ = ("boxId", "emissionAmount", "remaining")
+
+    def __init__(self, boxId: str, emissionAmount: int, remaining: int) -> None:
+        self.boxId = boxId
+        self.emissionAmount = emissionAmount
+        self.remaining = remaining
+
+    @staticmethod
+    def fromInputBox(inputBox: InputBox) -> "StakePoolRecord":
+        registers = inputBox.getRegisters()
+        (emissionAmount,) = codec.decodeLongArray(codec.registerBytes(registers[0]))
+        return StakePoolRecord(
+            boxId=inputBox.getId().toString(),
+            emissionAmount=emissionAmount,
+            remaining=int(inputBox.getTokens()[1].getValue()),
+        )
+
+    @staticmethod
+    def fromJson(box: Dict[str, Any]) -> "StakePoolRecord":
+        (emissionAmount,) = codec.decodeLongArray(jsonRegisters(box)[0])
+        return StakePoolRecord(
+            boxId=box["boxId"],
+            emissionAmount=emissionAmount,
+            remaining=int(box["assets"][1]["amount"]),
+        )
+
+    @staticmethod
+    def fromBox(stakePoolBox: StakePoolBox, boxId: str = None) -> "StakePoolRecord":
+        return StakePoolRecord(
+            boxId=boxId,
+            emissionAmount=stakePoolBox.emissionAmount,
+            remaining=stakePoolBox.remaining,
+        )
+
+    def toBox(self, stakePoolContract: StakePoolContract) -> StakePoolBox:
+        return StakePoolBox(
+            appKit=stakePoolContract.appKit,
+            stakePoolContract=stakePoolContract,
+            emissionAmount=self.emissionAmount,
+            remaining=self.remaining,
+        )
@@ -0,0 +1,89 @@
+from array import array
+from typing import Sequence
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Compound rewards as computed by emission.es and stake.es:
+#   reward = (stakedAmount.toBigInt * emissionAmount) / totalAmountStaked
+# BigInt division truncates towards zero. Floats lose precision once the quotient
+# or the product no longer fit the 53 bit mantissa, so everything here is exact.
+
+_int64Max = 2**63 - 1
+
+
+def bigIntDivide(numerator: int, denominator: int) -> int:
+    quotient = abs(numerator) // abs(denominator)
+    return quotient if (numerator < 0) == (denominator < 0) else -quotient
+
+
+def compoundReward(amountStaked: int, emissionAmount: int, totalStaked: int) -> int:
+    return bigIntDivide(amountStaked * emissionAmount, totalStaked)
+
+
+def floatCompoundReward(
+    amountStaked: int, emissionAmount: int, totalStaked: int
+) -> int:
+    # The formula CompoundTransaction used before, kept to compare against
+    return int(amountStaked * emissionAmount / totalStaked)
+
+
+def _exactRewards(
+    amountsStaked: Sequence[int], emissionAmount: int, totalStaked: int
+) -> array:
+    return array(
+        "q",
+        (compoundReward(a, emissionAmount, totalStaked) for a in amountsStaked),
+    )
+
+
+def _numpyRewards(amounts, emissionAmount: int, totalStaked: int) -> array:
+    if emissionAmount == 0 or int(amounts.max()) <= _int64Max // emissionAmount:
+        # No product overflows an int64
+        return array("q", (amounts * emissionAmount // totalStaked).tobytes())
+    # Estimate the quotient with floats, then correct it using the remainder
+    # product - quotient * total. The true remainder is small, so computing it
+    # modulo 2**64 with wrapping uint64 arithmetic still gives its exact value.
+    estimate = numpy.floor(
+        amounts.astype(numpy.float64) * (emissionAmount / totalStaked)
+    )
+    quotient = numpy.clip(estimate, 0, emissionAmount).astype(numpy.int64)
+    total = numpy.uint64(totalStaked)
+    with numpy.errstate(over="ignore"):
+        remainder = (
+            amounts.astype(numpy.uint64) * numpy.uint64(emissionAmount)
+            - quotient.astype(numpy.uint64) * total
+        ).view(numpy.int64)
+        while True:
+            low = remainder < 0
+            high = remainder >= totalStaked
+            if not (low.any() or high.any()):
+                break
+            quotient += high.astype(numpy.int64) - low.astype(numpy.int64)
+            remainder += numpy.where(low, totalStaked, 0) - numpy.where(
+                high, totalStaked, 0
+            )
+    return array("q", quotient.tobytes())
+
+
+def compoundRewards(
+    amountsStaked: Sequence[int], emissionAmount: int, totalStaked: int
+) -> array:
+    # Rewards for a column of staked amounts, with NumPy when it is installed
+    if totalStaked == 0:
+        raise ZeroDivisionError("Total amount staked is zero")
+    # The bounds keep the float estimate within a few units of the quotient and
+    # the remainder within an int64, anything outside them takes the exact path
+    if (
+        numpy is None
+        or len(amountsStaked) == 0
+        or not 0 <= emissionAmount <= 2**53
+        or not 0 < totalStaked <= 2**60
+    ):
+        return _exactRewards(amountsStaked, emissionAmount, totalStaked)
+    amounts = numpy.asarray(amountsStaked, dtype=numpy.int64)
+    if int(amounts.min()) < 0 or int(amounts.max()) > totalStaked:
+        return _exactRewards(amountsStaked, emissionAmount, totalStaked)
+    return _numpyRewards(amounts, emissionAmount, totalStaked)
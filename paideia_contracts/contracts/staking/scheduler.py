@@ -0,0 +1,243 @@
+import asyncio
+from collections import Counter, deque
+from concurrent.futures import Executor, ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import partial
+from time import monotonic
+from typing import (
+    Any,
+    Callable,
+    Counter as CounterT,
+    Deque,
+    Dict,
+    List,
+    Optional,
+    Set,
+    Tuple,
+)
+
+from ergo_python_appkit.appkit import ErgoAppKit
+
+from paideia_contracts.contracts.staking import (
+    AHTConfig,
+    EGIOConfig,
+    Ergo_Crux_LPConfig,
+    NETAConfig,
+    PaideiaConfig,
+    StakingConfig,
+    compileStakingConfigs,
+    ergopadv5testConfig,
+)
+
+poolFactories: Dict[str, Callable[[ErgoAppKit, bool], StakingConfig]] = {
+    "paideia": PaideiaConfig,
+    "egio": EGIOConfig,
+    "neta": NETAConfig,
+    "aht": AHTConfig,
+    "ergo_crux_lp": Ergo_Crux_LPConfig,
+    "ergopadv5test": ergopadv5testConfig,
+}
+
+
+def poolConfigs(
+    appKit: ErgoAppKit, pools: List[str] = None, maxWorkers: int = 4
+) -> Dict[str, StakingConfig]:
+    # All pools on the same appKit, with the contracts compiled once and shared
+    # through the contract registry
+    configs = {
+        pool: poolFactories[pool](appKit, lazy=True)
+        for pool in (pools if pools is not None else poolFactories)
+    }
+    compileStakingConfigs(list(configs.values()), maxWorkers)
+    return configs
+
+
+@dataclass
+class PoolMetrics:
+    inFlight: int = 0
+    completed: int = 0
+    failed: int = 0
+    busyTime: float = 0.0
+    waitTime: float = 0.0
+    lastError: str = None
+
+    def throughput(self, elapsed: float) -> float:
+        # Duties finished per second
+        return (self.completed + self.failed) / elapsed if elapsed > 0 else 0.0
+
+
+class Duty:
+    __slots__ = ("pool", "name", "function", "future", "enqueued")
+
+    def __init__(
+        self, pool: str, name: str, function: Callable[[], Any], future, enqueued
+    ) -> None:
+        self.pool = pool
+        self.name = name
+        self.function = function
+        self.future = future
+        self.enqueued = enqueued
+
+
+class PoolScheduler:
+    # Runs the emit, compound, proxy and dust duties of several pools in one
+    # process. Duties are blocking appkit calls and run on a shared thread pool.
+    # Every pool has its own queue, served round robin, and at most maxPerPool
+    # of its duties run at once, so a slow pool only holds up its own queue.
+    def __init__(
+        self,
+        configs: Dict[str, StakingConfig],
+        maxWorkers: int = 4,
+        maxPerPool: int = 1,
+        clock: Callable[[], float] = monotonic,
+        executor: Executor = None,
+    ) -> None:
+        self.configs = configs
+        self.maxWorkers = maxWorkers
+        self.maxPerPool = maxPerPool
+        self.clock = clock
+        self.queues: Dict[str, Deque[Duty]] = {pool: deque() for pool in configs}
+        self.metrics: Dict[str, PoolMetrics] = {pool: PoolMetrics() for pool in configs}
+        self._pools = list(configs)
+        self._nextPool = 0
+        # Queued and running duties per (pool, name)
+        self._active: CounterT[Tuple[str, str]] = Counter()
+        self._recurring: List[asyncio.Task] = []
+        # An executor passed in may be shared, only our own is shut down
+        self._ownsExecutor = executor is None
+        self._executor = (
+            ThreadPoolExecutor(maxWorkers) if executor is None else executor
+        )
+        self._wakeup: asyncio.Event = None
+        self._stopping = False
+        self.started: float = None
+
+    def _event(self) -> asyncio.Event:
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        return self._wakeup
+
+    def submit(
+        self, pool: str, name: str, function: Callable[..., Any], *args
+    ) -> asyncio.Future:
+        # Queues a duty for the pool, the future resolves to its result
+        if self._stopping:
+            raise RuntimeError("Scheduler is stopping")
+        duty = Duty(
+            pool,
+            name,
+            partial(function, *args),
+            asyncio.get_running_loop().create_future(),
+            self.clock(),
+        )
+        self.queues[pool].append(duty)
+        self._active[(pool, name)] += 1
+        self._event().set()
+        return duty.future
+
+    def every(
+        self, pool: str, name: str, interval: float, function: Callable[..., Any], *args
+    ) -> asyncio.Task:
+        # Queues the duty every interval seconds, unless the previous one is
+        # still queued or running
+        async def repeat():
+            while not self._stopping:
+                if self._active[(pool, name)] == 0:
+                    future = self.submit(pool, name, function, *args)
+                    future.add_done_callback(lambda f: f.cancelled() or f.exception())
+                await asyncio.sleep(interval)
+
+        task = asyncio.ensure_future(repeat())
+        self._recurring.append(task)
+        return task
+
+    def _nextDuty(self) -> Optional[Duty]:
+        for i in range(len(self._pools)):
+            pool = self._pools[(self._nextPool + i) % len(self._pools)]
+            if (
+                len(self.queues[pool]) > 0
+                and self.metrics[pool].inFlight < self.maxPerPool
+            ):
+                self._nextPool = (self._nextPool + i + 1) % len(self._pools)
+                return self.queues[pool].popleft()
+        return None
+
+    async def _execute(self, duty: Duty) -> None:
+        metrics = self.metrics[duty.pool]
+        start = self.clock()
+        metrics.waitTime += start - duty.enqueued
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(
+                self._executor, duty.function
+            )
+        except Exception as e:
+            metrics.failed += 1
+            metrics.lastError = f"{duty.name}: {e}"
+            # The caller may have cancelled the future in the meantime
+            if not duty.future.done():
+                duty.future.set_exception(e)
+        else:
+            metrics.completed += 1
+            if not duty.future.done():
+                duty.future.set_result(result)
+        finally:
+            metrics.busyTime += self.clock() - start
+            metrics.inFlight -= 1
+            self._active[(duty.pool, duty.name)] -= 1
+            if self._active[(duty.pool, duty.name)] == 0:
+                del self._active[(duty.pool, duty.name)]
+            self._event().set()
+
+    async def run(self) -> None:
+        # Dispatches duties until stop() is called and the queues are drained
+        self.started = self.clock()
+        wakeup = self._event()
+        tasks: Set[asyncio.Task] = set()
+        while True:
+            wakeup.clear()
+            while self.inFlight() < self.maxWorkers:
+                duty = self._nextDuty()
+                if duty is None:
+                    break
+                # Counted in flight right away, the task only starts on the next
+                # iteration of the event loop
+                self.metrics[duty.pool].inFlight += 1
+                task = asyncio.ensure_future(self._execute(duty))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if self._stopping and self.inFlight() == 0 and self.queueDepth() == 0:
+                break
+            await wakeup.wait()
+        if self._ownsExecutor:
+            self._executor.shutdown(wait=False)
+
+    def stop(self) -> None:
+        self._stopping = True
+        for task in self._recurring:
+            task.cancel()
+        self._event().set()
+
+    def inFlight(self) -> int:
+        return sum(metrics.inFlight for metrics in self.metrics.values())
+
+    def queueDepth(self, pool: str = None) -> int:
+        if pool is not None:
+            return len(self.queues[pool])
+        return sum(len(queue) for queue in self.queues.values())
+
+    def report(self) -> Dict[str, Dict[str, Any]]:
+        elapsed = self.clock() - self.started if self.started is not None else 0.0
+        return {
+            pool: {
+                "queueDepth": len(self.queues[pool]),
+                "inFlight": metrics.inFlight,
+                "completed": metrics.completed,
+                "failed": metrics.failed,
+                "throughput": metrics.throughput(elapsed),
+                "busyTime": metrics.busyTime,
+                "averageWait": metrics.waitTime
+                / max(metrics.completed + metrics.failed, 1),
+                "lastError": metrics.lastError,
+            }
+            for pool, metrics in self.metrics.items()
+        }
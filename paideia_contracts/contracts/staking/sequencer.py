@@ -0,0 +1,322 @@
+from dataclasses import dataclass, field
+from time import time
+from typing import Callable, Dict, List, Optional
+
+from org.ergoplatform.appkit import InputBox, SignedTransaction, UnsignedTransaction
+
+from paideia_contracts.contracts.staking import (
+    AddStakeTransaction,
+    InvalidInputBoxException,
+    StakeTransaction,
+    StakingConfig,
+    UnstakeTransaction,
+    codec,
+)
+from paideia_contracts.contracts.staking.pipeline import (
+    ChainRejectedException,
+    TransactionChain,
+    rejectionExceptions,
+)
+from paideia_contracts.contracts.staking.records import StakeRecord, StakeStateRecord
+
+STAKE = "stake"
+ADD_STAKE = "addStake"
+UNSTAKE = "unstake"
+
+# stakeState.es only accepts a new stake box with a stake time less than 30
+# minutes before the block timestamp
+stakeTimeWindow = 1800000
+
+
+@dataclass
+class ProxyRequest:
+    kind: str
+    proxyInput: InputBox
+    amount: int
+    stakeKey: str = None
+    stakeTime: int = None
+
+    @property
+    def boxId(self) -> str:
+        return self.proxyInput.getId().toString()
+
+    @staticmethod
+    def fromInputBox(
+        inputBox: InputBox, stakingConfig: StakingConfig
+    ) -> "ProxyRequest":
+        tokens = inputBox.getTokens()
+        registers = inputBox.getRegisters()
+        if stakingConfig.stakeProxyContract.validateInputBox(inputBox):
+            (stakeTime,) = codec.decodeLongArray(codec.registerBytes(registers[0]))
+            return ProxyRequest(
+                kind=STAKE,
+                proxyInput=inputBox,
+                amount=int(tokens[0].getValue()),
+                stakeTime=stakeTime,
+            )
+        if stakingConfig.addStakeProxyContract.validateInputBox(inputBox):
+            return ProxyRequest(
+                kind=ADD_STAKE,
+                proxyInput=inputBox,
+                amount=int(tokens[1].getValue()),
+                stakeKey=tokens[0].getId().toString(),
+            )
+        if stakingConfig.unstakeProxyContract.validateInputBox(inputBox):
+            (amountToUnstake,) = codec.decodeLongArray(
+                codec.registerBytes(registers[0])
+            )
+            return ProxyRequest(
+                kind=UNSTAKE,
+                proxyInput=inputBox,
+                amount=amountToUnstake,
+                stakeKey=tokens[0].getId().toString(),
+            )
+        raise InvalidInputBoxException("Input box is not a proxy box of this pool")
+
+
+@dataclass
+class SequencePlan:
+    ordered: List[ProxyRequest] = field(default_factory=list)
+    # Requests that can not go in this chain but might later, for instance
+    # because the stake box is awaiting a compound
+    deferred: List[ProxyRequest] = field(default_factory=list)
+    # Stake requests past the stake time window, these can only be refunded
+    expired: List[ProxyRequest] = field(default_factory=list)
+
+
+@dataclass
+class ChainedRequest:
+    request: ProxyRequest
+    signedTx: SignedTransaction
+    stakeKey: str
+    stakeOutput: Optional[int]
+    txId: str = None
+
+    @property
+    def stakeStateOutput(self) -> InputBox:
+        return self.signedTx.getOutputsToSpend()[0]
+
+    @property
+    def stakeBoxOutput(self) -> Optional[InputBox]:
+        if self.stakeOutput is None:
+            return None
+        return self.signedTx.getOutputsToSpend()[self.stakeOutput]
+
+
+@dataclass
+class SequenceResult:
+    txIds: List[str] = field(default_factory=list)
+    processed: List[ProxyRequest] = field(default_factory=list)
+    deferred: List[ProxyRequest] = field(default_factory=list)
+    expired: List[ProxyRequest] = field(default_factory=list)
+    stakeStateOutput: InputBox = None
+    # Last stake box of every stake key the chain touched, None after a full
+    # unstake
+    stakeOutputs: Dict[str, Optional[InputBox]] = field(default_factory=dict)
+
+
+def orderRequests(
+    requests: List[ProxyRequest],
+    stakeBoxes: Dict[str, StakeRecord],
+    checkpoint: int,
+    now: int,
+    stakeTimeMargin: int = 120000,
+) -> SequencePlan:
+    # Orders the requests so as many as possible go through. New stakes go
+    # first, oldest stake time first, before their window closes. Add stakes
+    # come before unstakes, so an unstake can use tokens added in the same
+    # chain. Unstakes are only taken while the stake box holds enough.
+    plan = SequencePlan()
+    for request in sorted(
+        (r for r in requests if r.kind == STAKE), key=lambda r: r.stakeTime
+    ):
+        if request.stakeTime < now - stakeTimeWindow + stakeTimeMargin:
+            plan.expired.append(request)
+        else:
+            plan.ordered.append(request)
+    balances = {
+        stakeKey: stakeBox.amountStaked
+        for stakeKey, stakeBox in stakeBoxes.items()
+        if stakeBox is not None and stakeBox.checkpoint == checkpoint
+    }
+    for request in requests:
+        if request.kind != ADD_STAKE:
+            continue
+        if request.stakeKey in balances:
+            balances[request.stakeKey] += request.amount
+            plan.ordered.append(request)
+        else:
+            plan.deferred.append(request)
+    for request in requests:
+        if request.kind != UNSTAKE:
+            continue
+        if request.amount <= balances.get(request.stakeKey, 0):
+            balances[request.stakeKey] -= request.amount
+            if balances[request.stakeKey] == 0:
+                del balances[request.stakeKey]
+            plan.ordered.append(request)
+        else:
+            plan.deferred.append(request)
+    return plan
+
+
+class StakeStateSequencer(TransactionChain):
+    # Stake, add stake and unstake txs all spend the stake state box. Instead of
+    # one request per block, the sequencer chains the queued proxy boxes through
+    # the predicted stake state outputs and submits them together.
+    # stakeBoxSource returns the unspent stake box of a stake key, or None, see
+    # StakingIndexer.stakeBoxSource.
+    def __init__(
+        self,
+        stakingConfig: StakingConfig,
+        address: str,
+        stakeBoxSource: Callable[[str], Optional[InputBox]],
+        maxChainLength: int = 50,
+        maxRebuilds: int = 3,
+        clock: Callable[[], float] = time,
+    ) -> None:
+        super().__init__(stakingConfig.appKit)
+        self.stakingConfig = stakingConfig
+        self.address = address
+        self.stakeBoxSource = stakeBoxSource
+        self.maxChainLength = maxChainLength
+        self.maxRebuilds = maxRebuilds
+        self.clock = clock
+
+    def transaction(
+        self,
+        request: ProxyRequest,
+        stakeStateInput: InputBox,
+        stakeInput: InputBox,
+    ) -> UnsignedTransaction:
+        if request.kind == STAKE:
+            return StakeTransaction(
+                stakeStateInput, request.proxyInput, self.stakingConfig, self.address
+            ).unsignedTx
+        if request.kind == ADD_STAKE:
+            return AddStakeTransaction(
+                stakeStateInput,
+                stakeInput,
+                request.proxyInput,
+                self.stakingConfig,
+                self.address,
+            ).unsignedTx
+        return UnstakeTransaction(
+            stakeStateInput,
+            stakeInput,
+            request.proxyInput,
+            self.stakingConfig,
+            self.address,
+        ).unsignedTx
+
+    def plan(
+        self,
+        stakeStateInput: InputBox,
+        requests: List[ProxyRequest],
+        stakeInputs: Dict[str, InputBox],
+    ) -> SequencePlan:
+        plan = orderRequests(
+            requests,
+            {
+                stakeKey: StakeRecord.fromInputBox(stakeInput)
+                for stakeKey, stakeInput in stakeInputs.items()
+                if stakeInput is not None
+            },
+            StakeStateRecord.fromInputBox(stakeStateInput).checkpoint,
+            int(self.clock() * 1000),
+        )
+        plan.deferred = plan.ordered[self.maxChainLength :] + plan.deferred
+        plan.ordered = plan.ordered[: self.maxChainLength]
+        return plan
+
+    def build(
+        self,
+        stakeStateInput: InputBox,
+        requests: List[ProxyRequest],
+        stakeInputs: Dict[str, InputBox],
+    ) -> List[ChainedRequest]:
+        # stakeInputs is copied, the caller keeps the boxes before the chain
+        stakeInputs = dict(stakeInputs)
+        chain = []
+        for request in requests:
+            stakeInput = stakeInputs.get(request.stakeKey)
+            if request.kind == STAKE:
+                # The stake key is minted with the id of the stake state input
+                stakeKey = stakeStateInput.getId().toString()
+                stakeOutput = 1
+            elif request.kind == ADD_STAKE:
+                stakeKey = request.stakeKey
+                stakeOutput = 1
+            else:
+                stakeKey = request.stakeKey
+                fullUnstake = (
+                    StakeRecord.fromInputBox(stakeInput).amountStaked <= request.amount
+                )
+                stakeOutput = None if fullUnstake else 2
+            link = ChainedRequest(
+                request,
+                self.signTransaction(
+                    self.transaction(request, stakeStateInput, stakeInput)
+                ),
+                stakeKey,
+                stakeOutput,
+            )
+            stakeStateInput = link.stakeStateOutput
+            stakeInputs[link.stakeKey] = link.stakeBoxOutput
+            chain.append(link)
+        return chain
+
+    def run(
+        self, stakeStateInput: InputBox, proxyInputs: List[InputBox]
+    ) -> SequenceResult:
+        # Submits as many of the proxy requests as possible in one chain. When a
+        # tx is rejected the rest of the chain is derived again from the last
+        # accepted stake state, with the proxy and stake boxes still unspent.
+        requests = [
+            ProxyRequest.fromInputBox(proxyInput, self.stakingConfig)
+            for proxyInput in proxyInputs
+        ]
+        stakeInputs = {
+            r.stakeKey: self.stakeBoxSource(r.stakeKey)
+            for r in requests
+            if r.stakeKey is not None
+        }
+        result = SequenceResult()
+        for _ in range(self.maxRebuilds + 1):
+            plan = self.plan(stakeStateInput, requests, stakeInputs)
+            chain = self.build(stakeStateInput, plan.ordered, stakeInputs)
+            rejection = None
+            for link in chain:
+                try:
+                    link.txId = self.sendTransaction(link.signedTx)
+                except rejectionExceptions as e:
+                    rejection = e
+                    break
+                result.txIds.append(link.txId)
+                result.processed.append(link.request)
+                result.stakeOutputs[link.stakeKey] = link.stakeBoxOutput
+                stakeStateInput = link.stakeStateOutput
+                stakeInputs[link.stakeKey] = link.stakeBoxOutput
+            if rejection is None:
+                result.deferred = plan.deferred
+                result.expired = plan.expired
+                result.stakeStateOutput = stakeStateInput
+                return result
+            if not self.isUnspent(stakeStateInput):
+                raise ChainRejectedException(
+                    f"Stake state box spent outside of the chain: {rejection}"
+                )
+            processed = set(r.boxId for r in result.processed)
+            unspent = set(
+                b.getId().toString()
+                for b in self.unspentBoxes(
+                    [r.boxId for r in requests if r.boxId not in processed]
+                )
+            )
+            requests = [r for r in requests if r.boxId in unspent]
+            for stakeKey, stakeInput in stakeInputs.items():
+                if stakeInput is not None and not self.isUnspent(stakeInput):
+                    stakeInputs[stakeKey] = self.stakeBoxSource(stakeKey)
+        raise ChainRejectedException(
+            f"Stake state chain still rejected after {self.maxRebuilds} rebuilds: {rejection}"
+        )
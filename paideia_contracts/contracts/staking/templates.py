@@ -0,0 +1,98 @@
+import random
+import sys
+from typing import List
+
+from ergo_python_appkit.appkit import ErgoAppKit
+
+from paideia_contracts.contracts.staking import (
+    StakingConfig,
+    compilation,
+    contractDependencies,
+)
+from paideia_contracts.contracts.staking.compilation import (
+    ErgoTreeTemplate,
+    templatePath,
+)
+
+versions = ["1.0", "1.1", "latest"]
+
+
+def sentinelConfig(
+    appKit: ErgoAppKit, version: str, rng: random.Random
+) -> StakingConfig:
+    def tokenId() -> str:
+        return rng.randbytes(32).hex()
+
+    def amount() -> int:
+        # Large enough that the serialized value is unlikely to occur by accident
+        return rng.randrange(2**60, 2**62)
+
+    return StakingConfig(
+        appKit=appKit,
+        version=version,
+        stakeStateNFT=tokenId(),
+        stakePoolNFT=tokenId(),
+        emissionNFT=tokenId(),
+        stakeTokenId=tokenId(),
+        stakedTokenId=tokenId(),
+        stakePoolKey=tokenId(),
+        stakedTokenName="Sentinel",
+        stakedTokenDecimals=0,
+        proxyToStakingIncentive=amount(),
+        proxyAddToStakingIncentive=amount(),
+        proxyExecutorReward=amount(),
+        proxyMinerFee=amount(),
+        dustCollectionReward=amount(),
+        dustCollectionMinerFee=amount(),
+        emitReward=amount(),
+        emitMinerFee=amount(),
+        baseCompoundReward=amount(),
+        baseCompoundMinerFee=amount(),
+        variableCompoundReward=amount(),
+        variableCompoundMinerFee=amount(),
+        lazy=True,
+    )
+
+
+def generateTemplates(appKit: ErgoAppKit, seed: int = 0) -> List[str]:
+    # Compiles every contract of every ergoscript version with sentinel constants
+    # and checks each template against a compile with a second set of constants
+    # before writing it next to the script.
+    rng = random.Random(seed)
+    written = []
+    ergoTreeCache = compilation.ergoTreeCache
+    compilation.ergoTreeCache = None
+    try:
+        for version in versions:
+            config = sentinelConfig(appKit, version, rng)
+            check = sentinelConfig(appKit, version, rng)
+            for field in contractDependencies:
+                contract = getattr(config, field)
+                checkContract = getattr(check, field)
+                script = contract._script
+                template = ErgoTreeTemplate.fromCompiled(
+                    appKit,
+                    script,
+                    contract._mapping,
+                    compilation.compileErgoTree(appKit, script, contract._mapping),
+                )
+                expected = bytes(
+                    compilation.compileErgoTree(
+                        appKit, script, checkContract._mapping
+                    ).bytes()
+                )
+                if template.substitute(checkContract._mapping) != expected:
+                    raise ValueError(f"{script}: constants can not be substituted")
+                template.toFile(templatePath(script))
+                written.append(templatePath(script))
+    finally:
+        compilation.ergoTreeCache = ergoTreeCache
+    compilation.ergoTreeTemplates.clear()
+    return written
+
+
+if __name__ == "__main__":
+    nodeUrl = sys.argv[1] if len(sys.argv) > 1 else "http://213.239.193.208:9053"
+    appKit = ErgoAppKit(nodeUrl, "mainnet", "https://api.ergoplatform.com/")
+    for path in generateTemplates(appKit):
+        print(path)
@@ -21,7 +21,12 @@ setuptools.setup(
     long_description=long_description,
     long_description_content_type="text/markdown",
     url="https://github.com/ergo-pad/paideia-contracts",
-    package_data={"paideia_contracts": [*glob_fix("paideia_contracts", "**/*.es")]},
+    package_data={
+        "paideia_contracts": [
+            *glob_fix("paideia_contracts", "**/*.es"),
+            *glob_fix("paideia_contracts", "**/*.json"),
+        ]
+    },
     include_package_data=True,
     classifiers=[
         "Programming Language :: Python :: 3",
@@ -29,4 +34,5 @@ setuptools.setup(
         "Operating System :: OS Independent",
     ],
     install_requires=["ergo_python_appkit>=0.2.1", "requests>=2.27.1"],
+    extras_require={"numpy": ["numpy"]},
 )
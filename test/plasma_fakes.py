@@ -0,0 +1,104 @@
+import hashlib
+import json
+from types import SimpleNamespace
+from ergo_python_appkit import appkit
+from jpype import JImplements, JOverride
+from scala.collection import JavaConverters
+import java
+
+# Not every appkit release ships getblok_plasma. Without it the plasma staking
+# package is imported with the stand-in below, a dict whose digest runs over
+# the operations it went through, so like an AVL+ tree the digest depends on
+# their order. Call installGetblokPlasma before importing the package.
+
+def _values(seq):
+    return list(JavaConverters.seqAsJavaListConverter(seq).asJava())
+
+# A java interface so it passes through scala.Option and back unchanged
+@JImplements("java.util.function.Supplier")
+class FakeManifest:
+    def __init__(self, digest, items):
+        self.digest = digest
+        self.items = items
+
+    @JOverride
+    def get(self):
+        return None
+
+    def toHexStrings(self):
+        seq = JavaConverters.asScalaIteratorConverter(java.util.ArrayList([]).iterator()).asScala().toSeq()
+        return SimpleNamespace(_1=lambda: self.digest, _2=lambda: json.dumps(self.items), _3=lambda: seq)
+
+    @staticmethod
+    def fromHexStrings(digest, manifest, subtrees):
+        return FakeManifest(digest, json.loads(manifest))
+
+class FakeProvenResult:
+    def __init__(self, values):
+        self.values = values
+
+    def response(self):
+        return self
+
+    def apply(self, i):
+        value = self.values[int(str(i))]
+        found = None if value is None else SimpleNamespace(value=lambda: value)
+        return SimpleNamespace(tryOp=lambda: SimpleNamespace(getOrElse=lambda default: default if found is None else found))
+
+    def proof(self):
+        return SimpleNamespace(bytes=lambda: bytes(40 * len(self.values)))
+
+class FakePlasmaMap:
+    def __init__(self, flags, parameters, manifest, convertsKey, convertsValue):
+        if manifest.isDefined():
+            self.items = dict(manifest.get().items)
+            self.digest = bytes.fromhex(manifest.get().digest)
+        else:
+            self.items = {}
+            self.digest = hashlib.sha256().digest()
+
+    def _advance(self, op, entries):
+        self.digest = hashlib.sha256(self.digest + json.dumps([op, entries]).encode()).digest()
+
+    def insert(self, seq):
+        entries = [(t._1().toString(), int(t._2())) for t in _values(seq)]
+        for key, value in entries:
+            if key in self.items:
+                raise Exception(f"{key} already in the tree")
+            self.items[key] = value
+        self._advance("insert", entries)
+        return FakeProvenResult([None] * len(entries))
+
+    def update(self, seq):
+        entries = [(t._1().toString(), int(t._2())) for t in _values(seq)]
+        old = [self.items[key] for key, _ in entries]
+        self.items.update(entries)
+        self._advance("update", entries)
+        return FakeProvenResult(old)
+
+    def delete(self, seq):
+        keys = [k.toString() for k in _values(seq)]
+        old = [self.items.pop(key) for key in keys]
+        self._advance("delete", keys)
+        return FakeProvenResult(old)
+
+    def lookUp(self, seq):
+        return FakeProvenResult([self.items.get(k.toString()) for k in _values(seq)])
+
+    def ergoValue(self):
+        digest = self.digest
+        return SimpleNamespace(getValue=lambda: SimpleNamespace(digest=lambda: SimpleNamespace(toArray=lambda: digest)))
+
+    def getManifest(self, depth):
+        return FakeManifest(self.digest.hex(), dict(self.items))
+
+    def __len__(self):
+        return len(self.items)
+
+def installGetblokPlasma():
+    if hasattr(appkit, "getblok_plasma"):
+        return
+    appkit.getblok_plasma = SimpleNamespace(
+        PlasmaParameters=SimpleNamespace(default=lambda: None),
+        ByteConversion=SimpleNamespace(convertsId=lambda: None, convertsLongVal=lambda: None),
+        collections=SimpleNamespace(PlasmaMap=FakePlasmaMap, Manifest=FakeManifest, ProvenResult=FakeProvenResult))
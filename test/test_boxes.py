@@ -0,0 +1,80 @@
+from ergo_python_appkit.appkit import ErgoAppKit, ErgoValueT
+from paideia_contracts.contracts.staking import AddStakeProxyBox, EmissionBox, StakeBox, StakeStateBox, PaideiaTestConfig
+
+
+class TestDeferredRegisters:
+    appKit = ErgoAppKit("http://213.239.193.208:9053","mainnet","https://api.ergoplatform.com/")
+    config = PaideiaTestConfig(appKit)
+
+    def countEncodes(self, box, monkeypatch):
+        calls = []
+        encodeRegisters = box.encodeRegisters
+
+        def countingEncodeRegisters():
+            calls.append(1)
+            return encodeRegisters()
+
+        monkeypatch.setattr(box, "encodeRegisters", countingEncodeRegisters)
+        return calls
+
+    def test_setters_encode_once(self, monkeypatch):
+        emissionBox = EmissionBox(
+            appKit=self.appKit,
+            emissionContract=self.config.emissionContract,
+            emissionRemaining=9,
+            amountStaked=9569595,
+            checkpoint=0,
+            stakers=0,
+            emissionAmount=293000
+        )
+        calls = self.countEncodes(emissionBox, monkeypatch)
+        emissionBox.checkpoint = 1
+        emissionBox.amountStaked = 10000000
+        emissionBox.stakers = 10
+        emissionBox.emissionAmount = 290070
+        assert len(calls) == 0
+        expected = EmissionBox(
+            appKit=self.appKit,
+            emissionContract=self.config.emissionContract,
+            emissionRemaining=9,
+            amountStaked=10000000,
+            checkpoint=1,
+            stakers=10,
+            emissionAmount=290070
+        )
+        assert [r.toHex() for r in emissionBox.registers] == [r.toHex() for r in expected.registers]
+        emissionBox.registers
+        assert len(calls) == 1
+        emissionBox.stakers = 9
+        assert emissionBox.registers[0].getValue().apply(2) == 9
+        assert len(calls) == 2
+
+    def test_registers_match_constructor(self):
+        stakeKey = "ab" * 32
+        stakeBox = StakeBox(self.appKit, self.config.stakeContract, 3, 1650000000000, 5000, stakeKey)
+        assert stakeBox.registers[0].toHex() == ErgoAppKit.ergoValue([3, 1650000000000], ErgoValueT.LongArray).toHex()
+        assert stakeBox.registers[1].toHex()[4:] == stakeKey
+        stakeStateBox = StakeStateBox(self.appKit, self.config.stakeStateContract, 1, 1650000000000, 10000000, 86400000, 10)
+        assert [int(v) for v in stakeStateBox.registers[0].getValue().toArray()] == [10000000, 1, 10, 1650000000000, 86400000]
+        addStakeProxyBox = AddStakeProxyBox(self.appKit, self.config.addStakeProxyContract, 100, "0008cd" + "02" * 33, stakeBox)
+        assert [int(v) for v in addStakeProxyBox.registers[0].getValue().toArray()] == [0]
+
+
+class TestStakeBoxColumns:
+    appKit = ErgoAppKit("http://213.239.193.208:9053","mainnet","https://api.ergoplatform.com/")
+    config = PaideiaTestConfig(appKit)
+
+    def test_matches_single_decode(self):
+        stakeInputs = [
+            StakeBox(self.appKit, self.config.stakeContract, i, 1650000000000 + i, 10000 * (i + 1), ("%02x" % i) * 32).inputBox()
+            for i in range(10)
+        ]
+        columns = StakeBox.fromInputBoxes(stakeInputs, self.config.stakeContract)
+        assert len(columns) == len(stakeInputs)
+        for i, stakeInput in enumerate(stakeInputs):
+            single = StakeBox.fromInputBox(stakeInput, self.config.stakeContract)
+            assert columns.checkpoint[i] == single.checkpoint
+            assert columns.stakeTime[i] == single.stakeTime
+            assert columns.amountStaked[i] == single.amountStaked
+            assert columns.stakeKey[i] == single.stakeKey
+            assert columns.stakeBox(i, self.config.stakeContract).registers[1].toHex() == single.registers[1].toHex()
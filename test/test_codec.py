@@ -0,0 +1,51 @@
+import random
+import pytest
+from ergo_python_appkit.appkit import ErgoAppKit, ErgoValueT
+from paideia_contracts.contracts.staking import codec
+
+longs = [0, 1, -1, 63, -64, 64, 127, 128, 300, -300, 86400000, 1650000000000, 2**31, -2**31, 2**62, 2**63 - 1, -2**63]
+
+
+class TestCodec:
+    rng = random.Random(7)
+
+    def randomLongs(self, n):
+        return [self.rng.randint(-2**63, 2**63 - 1) >> self.rng.randint(0, 63) for _ in range(n)]
+
+    def test_long_matches_appkit(self):
+        for value in longs + self.randomLongs(200):
+            appkitHex = ErgoAppKit.ergoValue(value, ErgoValueT.Long).toHex()
+            assert codec.encodeLong(value).hex() == appkitHex
+            assert codec.decodeLong(bytes.fromhex(appkitHex)) == value
+            assert codec.longValue(value).toHex() == appkitHex
+
+    def test_long_array_matches_appkit(self):
+        for values in [[], longs, [5], *[self.randomLongs(self.rng.randint(0, 200)) for _ in range(50)]]:
+            appkitHex = ErgoAppKit.ergoValue(values, ErgoValueT.LongArray).toHex()
+            assert codec.encodeLongArray(values).hex() == appkitHex
+            assert codec.decodeLongArray(bytes.fromhex(appkitHex)) == values
+            ergoValue = codec.longArrayValue(values)
+            assert ergoValue.toHex() == appkitHex
+            assert [int(v) for v in ergoValue.getValue().toArray()] == values
+
+    def test_byte_array_matches_appkit(self):
+        for size in [0, 1, 32, 36, 127, 128, 255, 300, 16384]:
+            value = self.rng.randbytes(size)
+            appkitHex = ErgoAppKit.ergoValue(value.hex(), ErgoValueT.ByteArrayFromHex).toHex()
+            assert codec.encodeByteArray(value).hex() == appkitHex
+            assert codec.decodeByteArray(bytes.fromhex(appkitHex)) == value
+            assert codec.byteArrayValue(value.hex()).toHex() == appkitHex
+            assert codec.registerBytes(codec.byteArrayValue(value.hex())) == codec.encodeByteArray(value)
+
+    def test_decode_register(self):
+        assert codec.decodeRegister(codec.encodeLong(-7)) == -7
+        assert codec.decodeRegister(codec.encodeLongArray([1, 2])) == [1, 2]
+        assert codec.decodeRegister(codec.encodeByteArray(b"\x01\x02")) == b"\x01\x02"
+
+    def test_invalid_input(self):
+        with pytest.raises(ValueError):
+            codec.decodeLongArray(codec.encodeByteArray(b"\x01"))
+        with pytest.raises(ValueError):
+            codec.decodeLongArray(bytes.fromhex("1102"))
+        with pytest.raises(ValueError):
+            codec.decodeByteArray(bytes.fromhex("0e0501"))
@@ -0,0 +1,173 @@
+from concurrent.futures import ThreadPoolExecutor
+import os
+import threading
+import pytest
+from ergo_python_appkit.appkit import ErgoAppKit, ErgoValueT
+from paideia_contracts.contracts.staking import compilation, compileStakingConfigs, AHTConfig, PaideiaConfig, PaideiaTestConfig, ergopadv5testConfig
+from paideia_contracts.contracts.staking.compilation import ContractRegistry, ErgoTreeCache
+
+contractFields = [
+    "stakeContract",
+    "stakeStateContract",
+    "stakePoolContract",
+    "emissionContract",
+    "stakingIncentiveContract",
+    "stakeProxyContract",
+    "addStakeProxyContract",
+    "unstakeProxyContract",
+]
+
+
+class TestErgoTreeCache:
+    appKit = ErgoAppKit("http://213.239.193.208:9053","mainnet","https://api.ergoplatform.com/")
+
+    def test_warm_cache_skips_compiler(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(compilation, "ergoTreeCache", ErgoTreeCache(str(tmp_path)))
+        monkeypatch.setattr(compilation, "ergoTreeFromTemplate", lambda appKit, script, mapping: None)
+        monkeypatch.setattr(compilation, "contractRegistry", ContractRegistry())
+        cold = PaideiaTestConfig(self.appKit)
+        assert len(os.listdir(tmp_path)) == len(contractFields)
+
+        def compileErgoScript(ergoScript, constants={}):
+            raise AssertionError("Compiler invoked with a warm cache")
+
+        monkeypatch.setattr(self.appKit, "compileErgoScript", compileErgoScript)
+        monkeypatch.setattr(compilation, "contractRegistry", ContractRegistry())
+        warm = PaideiaTestConfig(self.appKit)
+        for field in contractFields:
+            assert getattr(warm, field)._ergoTree.bytesHex() == getattr(cold, field)._ergoTree.bytesHex()
+            assert getattr(warm, field)._ergoTree == getattr(cold, field)._ergoTree
+
+    def test_key_depends_on_mapping(self, tmp_path):
+        cache = ErgoTreeCache(str(tmp_path))
+        script = os.path.join(os.path.dirname(compilation.__file__), "ergoscript/latest/stakingIncentive.es")
+        key1 = cache.key(self.appKit, script, {"_emitReward": ErgoAppKit.ergoValue(1, ErgoValueT.Long).getValue()})
+        key2 = cache.key(self.appKit, script, {"_emitReward": ErgoAppKit.ergoValue(2, ErgoValueT.Long).getValue()})
+        assert key1 != key2
+        assert key1 == cache.key(self.appKit, script, {"_emitReward": ErgoAppKit.ergoValue(1, ErgoValueT.Long).getValue()})
+
+
+class TestLazyStakingConfig:
+    appKit = ErgoAppKit("http://213.239.193.208:9053","mainnet","https://api.ergoplatform.com/")
+
+    def test_compiles_on_first_access(self, monkeypatch):
+        compiled = []
+        compileErgoTreeOrig = compilation.compileErgoTree
+
+        def compileErgoTree(appKit, script, mapping):
+            compiled.append(os.path.basename(script))
+            return compileErgoTreeOrig(appKit, script, mapping)
+
+        monkeypatch.setattr(compilation, "compileErgoTree", compileErgoTree)
+        monkeypatch.setattr(compilation, "ergoTreeFromTemplate", lambda appKit, script, mapping: None)
+        monkeypatch.setattr(compilation, "contractRegistry", ContractRegistry())
+        config = PaideiaTestConfig(self.appKit, lazy=True)
+        assert compiled == []
+        stakeStateContract = config.stakeStateContract
+        assert compiled == ["stake.es", "stakeState.es"]
+        assert config.stakeStateContract is stakeStateContract
+        config.emissionContract
+        config.stakeContract
+        assert compiled == ["stake.es", "stakeState.es", "emission.es"]
+
+    def test_lazy_matches_eager(self):
+        lazy = PaideiaTestConfig(self.appKit, lazy=True)
+        eager = PaideiaTestConfig(self.appKit)
+        for field in contractFields:
+            assert getattr(lazy, field)._ergoTree.bytesHex() == getattr(eager, field)._ergoTree.bytesHex()
+
+
+class TestContractRegistry:
+    appKit = ErgoAppKit("http://213.239.193.208:9053","mainnet","https://api.ergoplatform.com/")
+
+    def test_configs_share_contracts(self, monkeypatch):
+        registry = ContractRegistry()
+        monkeypatch.setattr(compilation, "contractRegistry", registry)
+        config1 = PaideiaTestConfig(self.appKit)
+        assert registry.misses == len(contractFields)
+        assert registry.hits == 0
+        config2 = PaideiaTestConfig(self.appKit)
+        assert registry.misses == len(contractFields)
+        assert registry.hits == len(contractFields)
+        for field in contractFields:
+            assert getattr(config1, field) is not getattr(config2, field)
+            assert getattr(config1, field)._ergoTree is getattr(config2, field)._ergoTree
+            assert getattr(config1, field).contract is getattr(config2, field).contract
+        stats = registry.stats()
+        assert stats["contracts"] == len(contractFields)
+        assert stats["treeBytes"] == sum(len(getattr(config1, field)._ergoTree.bytes()) for field in contractFields)
+
+    def test_different_mapping_not_shared(self, monkeypatch):
+        registry = ContractRegistry()
+        monkeypatch.setattr(compilation, "contractRegistry", registry)
+        test = PaideiaTestConfig(self.appKit)
+        main = PaideiaConfig(self.appKit)
+        assert test.stakeContract._ergoTree is not main.stakeContract._ergoTree
+        assert test.stakeContract._ergoTree.bytesHex() != main.stakeContract._ergoTree.bytesHex()
+
+
+class TestParallelCompile:
+    appKit = ErgoAppKit("http://213.239.193.208:9053","mainnet","https://api.ergoplatform.com/")
+
+    def test_graph_respects_dependencies(self):
+        finished = []
+        lock = threading.Lock()
+
+        def task(name):
+            def run():
+                with lock:
+                    finished.append(name)
+                return name.upper()
+            return run
+
+        tasks = {name: task(name) for name in ["a", "b", "c", "d"]}
+        dependencies = {"b": ["a"], "c": ["a"], "d": ["b", "c"]}
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results = compilation.compileGraph(tasks, dependencies, executor)
+        assert results == {"a": "A", "b": "B", "c": "C", "d": "D"}
+        assert finished[0] == "a"
+        assert finished[-1] == "d"
+
+    def test_graph_cycle(self):
+        tasks = {"a": lambda: 1, "b": lambda: 2}
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            with pytest.raises(ValueError):
+                compilation.compileGraph(tasks, {"a": ["b"], "b": ["a"]}, executor)
+
+    def test_parallel_matches_sequential(self, monkeypatch):
+        monkeypatch.setattr(compilation, "contractRegistry", ContractRegistry())
+        sequential = PaideiaTestConfig(self.appKit)
+        monkeypatch.setattr(compilation, "contractRegistry", ContractRegistry())
+        configs = [PaideiaTestConfig(self.appKit, lazy=True), PaideiaConfig(self.appKit, lazy=True)]
+        compileStakingConfigs(configs, maxWorkers=4)
+        for field in contractFields:
+            assert getattr(configs[0], field)._ergoTree.bytesHex() == getattr(sequential, field)._ergoTree.bytesHex()
+            assert getattr(configs[1], field) is not None
+
+
+class TestErgoTreeTemplates:
+    appKit = ErgoAppKit("http://213.239.193.208:9053","mainnet","https://api.ergoplatform.com/")
+
+    def test_templates_match_compiler(self, monkeypatch):
+        monkeypatch.setattr(compilation, "ergoTreeCache", None)
+        monkeypatch.setattr(compilation, "contractRegistry", ContractRegistry())
+        # Versions 1.0, latest and 1.1
+        for configFactory in [PaideiaConfig, PaideiaTestConfig, AHTConfig]:
+            config = configFactory(self.appKit)
+            for field in contractFields:
+                contract = getattr(config, field)
+                fromTemplate = compilation.ergoTreeFromTemplate(self.appKit, contract._script, contract._mapping)
+                assert fromTemplate is not None
+                compiled = compilation.compileErgoTree(self.appKit, contract._script, contract._mapping)
+                assert bytes(fromTemplate.bytes()) == bytes(compiled.bytes())
+                assert fromTemplate == compiled
+
+    def test_stale_template_falls_back(self, monkeypatch):
+        config = ergopadv5testConfig(self.appKit)
+        contract = config.stakeContract
+        template = compilation.loadTemplate(contract._script)
+        assert template.isCurrent(self.appKit, contract._script, contract._mapping)
+        monkeypatch.setattr(template, "scriptHash", "00" * 32)
+        assert compilation.ergoTreeFromTemplate(self.appKit, contract._script, contract._mapping) is None
+        monkeypatch.setattr(compilation, "contractRegistry", ContractRegistry())
+        assert ergopadv5testConfig(self.appKit).stakeContract._ergoTree == contract._ergoTree
@@ -0,0 +1,145 @@
+import pytest
+from ergo_python_appkit.appkit import ErgoAppKit, ErgoValueT
+from paideia_contracts.contracts.staking import PaideiaTestConfig
+from paideia_contracts.contracts.staking.cycle import CycleOrchestrator
+from paideia_contracts.contracts.staking.pipeline import CompoundPipeline
+
+class FakeId:
+    def __init__(self, boxId):
+        self.boxId = boxId
+
+    def toString(self):
+        return self.boxId
+
+class FakeBox:
+    def __init__(self, boxId, r4=[]):
+        self.boxId = boxId
+        self.registers = [ErgoAppKit.ergoValue(r4, ErgoValueT.LongArray)]
+
+    def getId(self):
+        return FakeId(self.boxId)
+
+    def getRegisters(self):
+        return self.registers
+
+    def getTokens(self):
+        return []
+
+class FakeSignedTx:
+    def __init__(self, outputs):
+        self.outputs = outputs
+
+    def getOutputsToSpend(self):
+        return self.outputs
+
+class FakePipeline(CompoundPipeline):
+    def __init__(self, config, clock, stakers):
+        super().__init__(config, "9hxT7sAZEmLWGNp3gN8RRw4qS1NxDMsCtuJkrQ5oEq5w1g7s97U", planner=object())
+        self.clock = clock
+        self.stakers = stakers
+        self.runs = []
+
+    def signTransaction(self, unsignedTx):
+        return FakeSignedTx([FakeBox("stakeState"), FakeBox("stakePool"), FakeBox("emission", [100, 7, self.stakers, 10]), FakeBox("fee"), FakeBox("incentive"), FakeBox("operator")])
+
+    def sendTransaction(self, signedTx):
+        self.clock.now += 0.2
+        return "emitTx"
+
+    def run(self, emissionInput, stakeInputs, stakingIncentiveInput):
+        self.runs.append((emissionInput.boxId, [b.boxId for b in stakeInputs], stakingIncentiveInput.boxId))
+        self.clock.now += 1.5
+        stakers = emissionInput.registers[0].getValue().apply(2) - len(stakeInputs)
+        self.emissionOutput = FakeBox(f"emission{len(self.runs) + 1}", [100, 7, stakers, 10])
+        self.stakingIncentiveOutput = FakeBox(f"incentive{len(self.runs) + 1}")
+        return [f"compound{len(self.runs)}a", f"compound{len(self.runs)}b"]
+
+class FakeClock:
+    def __init__(self, now):
+        self.now = now
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+class TestCycleOrchestrator:
+    appKit = ErgoAppKit("http://213.239.193.208:9053","mainnet","https://api.ergoplatform.com/")
+    config = PaideiaTestConfig(appKit, lazy=True)
+
+    def orchestrator(self, clock, stakeBoxes, nodeLag=0, stakers=None):
+        # stakeBoxes are the stake boxes per checkpoint, or a list of them for
+        # the successive queries of a lagging indexer
+        queries = iter(stakeBoxes) if isinstance(stakeBoxes, list) else None
+        orchestrator = CycleOrchestrator(
+            self.config,
+            "9hxT7sAZEmLWGNp3gN8RRw4qS1NxDMsCtuJkrQ5oEq5w1g7s97U",
+            stakeBoxSource=lambda checkpoint: (next(queries, stakeBoxes[-1]) if queries is not None else stakeBoxes)[checkpoint],
+            pipeline=FakePipeline(self.config, clock, stakers if stakers is not None else len(stakeBoxes[7])),
+            clock=clock,
+            sleeper=clock.sleep,
+            # The node's last block, nodeLag seconds behind the clock
+            nodeTime=lambda: int((clock.now - nodeLag) * 1000)
+        )
+        orchestrator.emitTransaction = lambda *inputs: None
+        return orchestrator
+
+    def test_cycle(self):
+        clock = FakeClock(1650000000.0)
+        stakeBoxes = {7: [FakeBox("stake1"), FakeBox("stake2"), FakeBox("stake3")]}
+        orchestrator = self.orchestrator(clock, stakeBoxes)
+        # Stake state: total staked, checkpoint, stakers, checkpoint time, cycle duration
+        stakeState = FakeBox("stakeState", [100, 7, 3, 1650000000000 - 86400000 + 60000, 86400000])
+        report = orchestrator.runCycle(stakeState, FakeBox("stakePool"), FakeBox("emission"), FakeBox("incentive"))
+        assert report.emissionTime == 1650000060000
+        # Waited for the emission time and the margin before submitting the emit tx
+        assert clock.sleeps[0] > 60
+        assert report.emitSubmitted >= report.emissionTime + orchestrator.margin
+        assert orchestrator.pipeline.runs == [("emission", ["stake1", "stake2", "stake3"], "incentive")]
+        assert report.compoundTxIds == ["compound1a", "compound1b"]
+        assert report.stakeBoxes == 3
+        assert report.stakersRemaining == 0
+        assert report.latency == report.lastCompoundSubmitted - report.emissionTime
+        assert report.latency - report.emitLatency == 1500
+
+    def test_cycle_time_passed(self):
+        clock = FakeClock(1650000000.0)
+        orchestrator = self.orchestrator(clock, {7: []})
+        stakeState = FakeBox("stakeState", [100, 7, 0, 1650000000000 - 86400000 - 5000, 86400000])
+        report = orchestrator.runCycle(stakeState, FakeBox("stakePool"), FakeBox("emission"), FakeBox("incentive"))
+        assert clock.sleeps == []
+        assert report.emitLatency == 5200
+
+    def test_node_behind_clock(self):
+        clock = FakeClock(1650000000.0)
+        orchestrator = self.orchestrator(clock, {7: []}, nodeLag=30)
+        stakeState = FakeBox("stakeState", [100, 7, 0, 1650000000000 - 86400000 + 60000, 86400000])
+        report = orchestrator.runCycle(stakeState, FakeBox("stakePool"), FakeBox("emission"), FakeBox("incentive"))
+        # The margin passed on the clock, then it polled until the node caught up
+        assert clock.sleeps[1:] == [orchestrator.pollInterval] * (len(clock.sleeps) - 1) and len(clock.sleeps) > 1
+        assert report.emitSubmitted >= report.emissionTime + 30000
+
+    def test_stake_box_missing_from_indexer(self):
+        clock = FakeClock(1650000000.0)
+        stake = [FakeBox("stake1"), FakeBox("stake2"), FakeBox("stake3")]
+        # stake3 only shows up on the second query
+        orchestrator = self.orchestrator(clock, [{7: stake[:2]}, {7: stake}], stakers=3)
+        stakeState = FakeBox("stakeState", [100, 7, 3, 1650000000000 - 86400000 - 5000, 86400000])
+        report = orchestrator.runCycle(stakeState, FakeBox("stakePool"), FakeBox("emission"), FakeBox("incentive"))
+        assert orchestrator.pipeline.runs == [("emission", ["stake1", "stake2"], "incentive"), ("emission2", ["stake3"], "incentive2")]
+        assert report.compoundTxIds == ["compound1a", "compound1b", "compound2a", "compound2b"]
+        assert report.stakeBoxes == 3
+        assert report.stakersRemaining == 0
+        # The latency runs until the compound of stake3
+        assert report.latency - report.emitLatency == 1500 + orchestrator.pollInterval * 1000 + 1500
+
+    def test_stake_box_never_found(self):
+        clock = FakeClock(1650000000.0)
+        orchestrator = self.orchestrator(clock, {7: [FakeBox("stake1")]}, stakers=2)
+        stakeState = FakeBox("stakeState", [100, 7, 2, 1650000000000 - 86400000 - 5000, 86400000])
+        with pytest.raises(Exception, match="1 stakers of checkpoint 7 left after 10 attempts"):
+            orchestrator.runCycle(stakeState, FakeBox("stakePool"), FakeBox("emission"), FakeBox("incentive"))
+        assert len(orchestrator.pipeline.runs) == 1
@@ -0,0 +1,42 @@
+import random
+from itertools import combinations
+import pytest
+from paideia_contracts.contracts.staking import dust
+
+class TestDust:
+    rng = random.Random(17)
+    reward = int(5e5)
+    minerFee = int(1e6)
+
+    def values(self, n):
+        return [self.rng.choice([self.rng.randint(1, 10**6), self.rng.randint(10**5, 10**7)]) for _ in range(n)]
+
+    def test_first_batch_is_largest_valid_subset(self):
+        for _ in range(200):
+            values = self.values(self.rng.randint(0, 10))
+            # Only boxes holding more than the reward are worth consolidating
+            worth = [v for v in values if v > self.reward]
+            largest = 0
+            for size in range(2, len(worth) + 1):
+                if any(dust.validConsolidation(c, self.reward, self.minerFee) for c in combinations(worth, size)):
+                    largest = size
+            batches = dust.consolidationBatches(values, self.reward, self.minerFee)
+            assert (len(batches[0]) if len(batches) > 0 else 0) == largest
+
+    def test_batches_are_valid_and_bounded(self):
+        values = self.values(3000)
+        batches = dust.consolidationBatches(values, self.reward, self.minerFee, 100)
+        spent = [i for batch in batches for i in batch]
+        assert len(spent) == len(set(spent))
+        for batch in batches:
+            assert 2 <= len(batch) <= 100
+            assert dust.validConsolidation([values[i] for i in batch], self.reward, self.minerFee)
+        # Whatever is left does not make another valid tx
+        left = sorted(values[i] for i in set(range(len(values))) - set(spent) if values[i] > self.reward)
+        for size in range(2, 101):
+            for end in range(size, len(left) + 1):
+                assert not dust.validConsolidation(left[end - size:end], self.reward, self.minerFee)
+
+    def test_rejects_single_input_limit(self):
+        with pytest.raises(ValueError):
+            dust.consolidationBatches([10**7, 10**7], self.reward, self.minerFee, 1)
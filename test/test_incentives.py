@@ -0,0 +1,89 @@
+import pytest
+from ergo_python_appkit.appkit import ErgoAppKit
+from paideia_contracts.contracts.staking import PaideiaTestConfig
+from paideia_contracts.contracts.staking.incentives import NoIncentiveBoxException, StakingIncentivePool
+
+class FakeId:
+    def __init__(self, boxId):
+        self.boxId = boxId
+
+    def toString(self):
+        return self.boxId
+
+class FakeBox:
+    def __init__(self, boxId, value):
+        self.boxId = boxId
+        self.value = value
+
+    def getId(self):
+        return FakeId(self.boxId)
+
+    def getValue(self):
+        return self.value
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+class TestStakingIncentivePool:
+    appKit = ErgoAppKit("http://213.239.193.208:9053","mainnet","https://api.ergoplatform.com/")
+    config = PaideiaTestConfig(appKit, lazy=True)
+    txOperator = "9hxT7sAZEmLWGNp3gN8RRw4qS1NxDMsCtuJkrQ5oEq5w1g7s97U"
+
+    def pool(self, boxes, parallelism=2):
+        self.boxes = boxes
+        self.clock = FakeClock()
+        pool = StakingIncentivePool(self.config, self.txOperator, lambda: self.boxes, parallelism=parallelism, leaseTimeout=60, clock=self.clock)
+        pool.refresh()
+        return pool
+
+    def test_lease_is_exclusive(self):
+        pool = self.pool([FakeBox("a", int(5e7)), FakeBox("b", int(2e8)), FakeBox("c", int(1e6))])
+        first = pool.lease("compound", int(4e7))
+        second = pool.lease("emit", int(4e7))
+        # Best fit, the large box goes to the second builder
+        assert (first.boxId, second.boxId) == ("a", "b")
+        with pytest.raises(NoIncentiveBoxException):
+            pool.lease("compound", int(4e7))
+        pool.refresh()
+        with pytest.raises(NoIncentiveBoxException):
+            pool.lease("compound", int(4e7))
+
+    def test_release_hands_over_chain_output(self):
+        pool = self.pool([FakeBox("a", int(5e7))])
+        lease = pool.lease("compound", int(1e7))
+        # The chain spent "a", its new staking incentive box is not confirmed yet
+        self.boxes = []
+        pool.release(lease, FakeBox("a2", int(4e7)))
+        pool.refresh()
+        assert pool.lease("emit", int(1e7)).boxId == "a2"
+
+    def test_expired_lease_returns_box(self):
+        pool = self.pool([FakeBox("a", int(5e7))])
+        pool.lease("compound", int(1e7))
+        self.clock.now = 61
+        pool.refresh()
+        assert pool.lease("emit", int(1e7)).boxId == "a"
+
+    def test_source_replaces_spent_box(self):
+        pool = self.pool([FakeBox("a", int(5e7)), FakeBox("b", int(6e7))])
+        source = pool.source("compound", int(1e7))
+        assert source().boxId == "a"
+        self.boxes = [FakeBox("b", int(6e7))]
+        assert source().boxId == "b"
+        assert len(pool.leases) == 1
+
+    def test_plan_consolidates_and_splits(self):
+        minValue = int(2e7)
+        pool = self.pool([FakeBox("big", int(1e8))] + [FakeBox(f"dust{i}", int(3e6)) for i in range(5)], parallelism=4)
+        maintenance = pool.plan(minValue)
+        assert sorted(b.boxId for b in maintenance.consolidations[0]) == [f"dust{i}" for i in range(5)]
+        assert [b.boxId for b in maintenance.splitInputs] == ["big"]
+        assert maintenance.splitValues[:4] == [minValue] * 4
+        assert sum(maintenance.splitValues) == int(1e8) - int(1e6)
+        # Enough boxes already, nothing to split
+        pool = self.pool([FakeBox(f"box{i}", minValue) for i in range(4)], parallelism=4)
+        assert pool.plan(minValue).splitInputs == []
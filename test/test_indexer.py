@@ -0,0 +1,111 @@
+import json
+import os
+from ergo_python_appkit.appkit import ErgoAppKit
+from paideia_contracts.contracts.staking import PaideiaTestConfig
+from paideia_contracts.contracts.staking.indexer import ADD_STAKE_PROXY, EMISSION, STAKE, STAKE_POOL, STAKE_PROXY, STAKE_STATE, STAKING_INCENTIVE, IndexKeys, StakingIndexer
+from paideia_contracts.contracts.staking.records import StakeRecord, StakeStateRecord
+
+# Blocks in the json of the node api, for the boxes of the PaideiaTest pool:
+# pool creation with a stake proxy, a stake tx, an emit tx with an add stake
+# proxy and a compound tx, plus a competing block for the last height
+with open(os.path.join(os.path.dirname(__file__), "fixtures", "staking_blocks.json")) as f:
+    fixture = json.load(f)
+
+class FakeId:
+    def __init__(self, boxId):
+        self.boxId = boxId
+
+    def toString(self):
+        return self.boxId
+
+class FakeBox:
+    def __init__(self, boxId):
+        self.boxId = boxId
+
+    def getId(self):
+        return FakeId(self.boxId)
+
+class TestStakingIndexer:
+    appKit = ErgoAppKit("http://213.239.193.208:9053","mainnet","https://api.ergoplatform.com/")
+    config = PaideiaTestConfig(appKit, lazy=True)
+    keys = IndexKeys.fromStakingConfig(config)
+    blocks = fixture["blocks"]
+    startHeight = blocks[0]["header"]["height"]
+
+    def source(self, blocks):
+        byHeight = {b["header"]["height"]: b for b in blocks}
+        return lambda height: byHeight.get(height)
+
+    def indexer(self, path=":memory:"):
+        return StakingIndexer(self.keys, path, startHeight=self.startHeight)
+
+    def test_follow_blocks(self):
+        indexer = self.indexer()
+        assert indexer.follow(self.source(self.blocks)) == 4
+        compound = self.blocks[3]["blockTransactions"]["transactions"][0]
+        emit = self.blocks[2]["blockTransactions"]["transactions"][0]
+        assert indexer.single(STAKE_STATE).boxId == emit["outputs"][0]["boxId"]
+        assert indexer.single(STAKE_POOL).boxId == emit["outputs"][1]["boxId"]
+        assert indexer.single(EMISSION).boxId == compound["outputs"][0]["boxId"]
+        stake = self.blocks[1]["blockTransactions"]["transactions"][0]
+        # The stake tx adds a staking incentive box of its own
+        assert set(indexer.byKind[STAKING_INCENTIVE]) == {stake["outputs"][3]["boxId"], compound["outputs"][2]["boxId"]}
+        assert len(indexer.byKind[STAKE_PROXY]) == 0
+        assert len(indexer.byKind[ADD_STAKE_PROXY]) == 1
+        assert indexer.stakeBoxes(0) == []
+        (stakeBox,) = indexer.stakeBoxes(1)
+        assert stakeBox.amountStaked == 295070
+        assert len(indexer.boxes) == 7
+
+    def test_records_match_input_boxes(self):
+        indexer = self.indexer()
+        indexer.follow(self.source(self.blocks))
+        stakeBox = indexer.byKind[STAKE][indexer.stakeBoxes(1)[0].boxId]
+        assert StakeRecord.fromInputBox(stakeBox.inputBox()) == stakeBox.record
+        stakeState = indexer.single(STAKE_STATE)
+        assert StakeStateRecord.fromInputBox(stakeState.inputBox()) == stakeState.record
+
+    def test_fork_rolls_back(self):
+        indexer = self.indexer()
+        indexer.follow(self.source(self.blocks))
+        indexer.follow(self.source(self.blocks[:3] + [fixture["fork"]]))
+        assert indexer.headerId == fixture["fork"]["header"]["id"]
+        emit = self.blocks[2]["blockTransactions"]["transactions"][0]
+        assert indexer.single(EMISSION).boxId == emit["outputs"][2]["boxId"]
+        assert indexer.stakeBoxes(1) == []
+        assert len(indexer.stakeBoxes(0)) == 1
+
+    def test_restart_from_database(self, tmp_path):
+        path = str(tmp_path / "index.sqlite")
+        indexer = self.indexer(path)
+        indexer.follow(self.source(self.blocks[:3]))
+        indexer.close()
+        indexer = self.indexer(path)
+        assert indexer.height == self.startHeight + 2
+        assert indexer.follow(self.source(self.blocks)) == 1
+        expected = self.indexer()
+        expected.follow(self.source(self.blocks))
+        assert indexer.boxes.keys() == expected.boxes.keys()
+        assert indexer.stakeByCheckpoint == expected.stakeByCheckpoint
+        # The rollback data survives the restart as well
+        indexer.follow(self.source(self.blocks[:3] + [fixture["fork"]]))
+        assert len(indexer.stakeBoxes(0)) == 1
+
+    def test_stake_key_index(self):
+        indexer = self.indexer()
+        indexer.follow(self.source(self.blocks[:3]))
+        # The stake key is minted with the id of the stake state input
+        stakeKey = self.blocks[0]["blockTransactions"]["transactions"][0]["outputs"][0]["boxId"]
+        assert (indexer.stakeBox(stakeKey).checkpoint, indexer.stakeBox(stakeKey).amountStaked) == (0, 5000)
+        assert indexer.stakeBox("00" * 32) is None and indexer.stakeBoxSource("00" * 32) is None
+        compound = self.blocks[3]["blockTransactions"]["transactions"][0]
+        indexer.trackPending({stakeKey: FakeBox(compound["outputs"][1]["boxId"])})
+        assert indexer.stakeBoxSource(stakeKey).boxId == compound["outputs"][1]["boxId"]
+        indexer.follow(self.source(self.blocks))
+        assert len(indexer.pendingStakeBoxes) == 0
+        assert indexer.stakeBoxSource(stakeKey).getId().toString() == compound["outputs"][1]["boxId"]
+        assert indexer.stakeBox(stakeKey).checkpoint == 1
+        indexer.trackPending({stakeKey: None})
+        assert indexer.stakeBoxSource(stakeKey) is None
+        indexer.follow(self.source(self.blocks[:3] + [fixture["fork"]]))
+        assert indexer.stakeBox(stakeKey).checkpoint == 0
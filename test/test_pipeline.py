@@ -0,0 +1,114 @@
+import pytest
+from ergo_python_appkit.appkit import ErgoAppKit
+from org.ergoplatform.appkit import ErgoClientException
+from paideia_contracts.contracts.staking import PaideiaTestConfig
+from paideia_contracts.contracts.staking.pipeline import ChainedCompound, ChainRejectedException, CompoundPipeline, TransactionChain
+from paideia_contracts.contracts.staking.planner import CompoundBatch
+from paideia_contracts.contracts.staking.records import StakeRecord
+
+class FakeId:
+    def __init__(self, boxId):
+        self.boxId = boxId
+
+    def toString(self):
+        return self.boxId
+
+class FakeBox:
+    def __init__(self, boxId):
+        self.boxId = boxId
+
+    def getId(self):
+        return FakeId(self.boxId)
+
+class FakeSignedTx:
+    def __init__(self, txId, outputs):
+        self.txId = txId
+        self.outputs = outputs
+
+    def getOutputsToSpend(self):
+        return self.outputs
+
+class FakePipeline(CompoundPipeline):
+    # Replaces tx building and the node with fakes, compound txs take 2 stake boxes
+    def __init__(self, config, rejections, spent=()):
+        super().__init__(config, "9hxT7sAZEmLWGNp3gN8RRw4qS1NxDMsCtuJkrQ5oEq5w1g7s97U", planner=object(), stakingIncentiveSource=lambda: FakeBox("incentive-new"))
+        self.rejections = list(rejections)
+        self.spent = set(spent)
+        self.builds = []
+        self.txCount = 0
+
+    def build(self, emissionInput, stakeInputs, stakingIncentiveInput):
+        self.builds.append((emissionInput.boxId, [b.boxId for b in stakeInputs], stakingIncentiveInput.boxId))
+        chain = []
+        for i in range(0, len(stakeInputs), 2):
+            self.txCount += 1
+            txId = f"tx{self.txCount}"
+            batch = CompoundBatch(stakeBoxes=[StakeRecord(b.boxId, 0, 0, 0, "") for b in stakeInputs[i:i + 2]])
+            outputs = [FakeBox(f"{txId}-emission")] + [FakeBox(f"{txId}-stake{j}") for j in range(len(batch))] + [FakeBox(f"{txId}-incentive")]
+            chain.append(ChainedCompound(batch, FakeSignedTx(txId, outputs)))
+        return chain
+
+    def sendTransaction(self, signedTx):
+        if signedTx.txId in self.rejections:
+            self.rejections.remove(signedTx.txId)
+            raise ErgoClientException("Double spend", None)
+        return signedTx.txId
+
+    def unspentBoxes(self, boxIds):
+        return [FakeBox(boxId) for boxId in boxIds if boxId not in self.spent]
+
+class FakeAppKit:
+    # getBoxesById the way appkit does it, a spent box after the first one comes
+    # back as the box before it
+    def __init__(self, unspent):
+        self.unspent = set(unspent)
+
+    def getBoxesById(self, boxIds):
+        boxes = []
+        for boxId in boxIds:
+            if boxId in self.unspent:
+                boxes.append(FakeBox(boxId))
+            elif len(boxes) == 0:
+                raise ErgoClientException("Box not found", None)
+            else:
+                boxes.append(boxes[-1])
+        return boxes
+
+class TestTransactionChain:
+    def test_spent_box_in_the_middle(self):
+        chain = TransactionChain(FakeAppKit(["a", "c"]))
+        assert [b.boxId for b in chain.unspentBoxes(["a", "b", "c"])] == ["a", "c"]
+        assert not chain.isUnspent(FakeBox("b"))
+
+class TestCompoundPipeline:
+    appKit = ErgoAppKit("http://213.239.193.208:9053","mainnet","https://api.ergoplatform.com/")
+    config = PaideiaTestConfig(appKit, lazy=True)
+    stakeInputs = [FakeBox(f"stake{i}") for i in range(6)]
+
+    def test_whole_chain_accepted(self):
+        pipeline = FakePipeline(self.config, [])
+        assert pipeline.run(FakeBox("emission"), self.stakeInputs, FakeBox("incentive")) == ["tx1", "tx2", "tx3"]
+        assert len(pipeline.builds) == 1
+
+    def test_rebuild_after_rejection(self):
+        # tx2 is rejected because stake3 got unstaked, the rest is rebuilt on top of tx1
+        pipeline = FakePipeline(self.config, ["tx2"], spent=["stake3"])
+        txIds = pipeline.run(FakeBox("emission"), self.stakeInputs, FakeBox("incentive"))
+        assert txIds == ["tx1", "tx4", "tx5"]
+        assert pipeline.builds[1] == ("tx1-emission", ["stake2", "stake4", "stake5"], "tx1-incentive")
+
+    def test_staking_incentive_replaced(self):
+        pipeline = FakePipeline(self.config, ["tx1"], spent=["incentive"])
+        pipeline.run(FakeBox("emission"), self.stakeInputs, FakeBox("incentive"))
+        assert pipeline.builds[1] == ("emission", [b.boxId for b in self.stakeInputs], "incentive-new")
+
+    def test_emission_spent_elsewhere(self):
+        pipeline = FakePipeline(self.config, ["tx2"], spent=["tx1-emission"])
+        with pytest.raises(ChainRejectedException):
+            pipeline.run(FakeBox("emission"), self.stakeInputs, FakeBox("incentive"))
+
+    def test_rebuild_limit(self):
+        pipeline = FakePipeline(self.config, ["tx1", "tx4", "tx7", "tx10"])
+        with pytest.raises(ChainRejectedException):
+            pipeline.run(FakeBox("emission"), self.stakeInputs, FakeBox("incentive"))
+        assert len(pipeline.builds) == 4
@@ -0,0 +1,139 @@
+import random
+import jpype
+from ergo_python_appkit.appkit import ErgoAppKit, ErgoValueT
+from java.util import ArrayList
+from org.ergoplatform import ErgoScriptPredef
+from org.ergoplatform.appkit import ErgoToken, JavaHelpers
+from paideia_contracts.contracts.staking import PaideiaTestConfig
+from paideia_contracts.contracts.staking.planner import CompoundCostModel, CompoundPlanner, ConsolidationPlanner, DustCostModel
+from paideia_contracts.contracts.staking.records import EmissionRecord, StakeRecord
+
+class TestCompoundPlanner:
+    appKit = ErgoAppKit("http://213.239.193.208:9053","mainnet","https://api.ergoplatform.com/")
+    config = PaideiaTestConfig(appKit, lazy=True)
+    txOperator = "9hxT7sAZEmLWGNp3gN8RRw4qS1NxDMsCtuJkrQ5oEq5w1g7s97U"
+    rng = random.Random(3)
+
+    def stakeBoxes(self, n, checkpoint=5):
+        return [StakeRecord(None, checkpoint, 1650000000000 + i, self.rng.randint(1000, 10**12), self.rng.randbytes(32).hex()) for i in range(n)]
+
+    def emission(self, stakeBoxes, checkpoint=5):
+        return EmissionRecord(None, 293000000, sum(s.amountStaked for s in stakeBoxes), checkpoint, len(stakeBoxes), 293000000)
+
+    def candidate(self, value, tree, tokens, registers, height):
+        return JavaHelpers.createBoxCandidate(
+            value,
+            tree,
+            JavaHelpers.toIndexedSeq(ArrayList([ErgoToken(t, a) for t, a in tokens])),
+            JavaHelpers.toIndexedSeq(ArrayList(registers)),
+            height
+        )
+
+    def serializedSize(self, planner, emission, batch):
+        # Serializes the compound tx the planner sized, with the worst case values it assumes
+        height = planner.creationHeight
+        outputs = [self.candidate(
+            int(1e6),
+            self.config.emissionContract.contract.getErgoTree(),
+            [(self.config.emissionNFT, 1), (self.config.stakedTokenId, emission.emissionRemaining)],
+            [ErgoAppKit.ergoValue([emission.amountStaked, emission.checkpoint, emission.stakers, emission.emissionAmount], ErgoValueT.LongArray)],
+            height
+        )]
+        for stakeBox, reward in zip(batch.stakeBoxes, batch.rewards):
+            outputs.append(self.candidate(
+                int(1e6),
+                self.config.stakeContract.contract.getErgoTree(),
+                [(self.config.stakeTokenId, 1), (self.config.stakedTokenId, stakeBox.amountStaked + reward)],
+                [
+                    ErgoAppKit.ergoValue([stakeBox.checkpoint + 1, stakeBox.stakeTime], ErgoValueT.LongArray),
+                    ErgoAppKit.ergoValue(stakeBox.stakeKey, ErgoValueT.ByteArrayFromHex)
+                ],
+                height
+            ))
+        outputs.append(self.candidate(2**63 - 1, self.config.stakingIncentiveContract.contract.getErgoTree(), [], [], height))
+        outputs.append(self.candidate(batch.reward, self.appKit.contractFromAddress(self.txOperator).getErgoTree(), [], [], height))
+        outputs.append(self.candidate(batch.minerFee, ErgoScriptPredef.feeProposition(720), [], [], height))
+        Input = jpype.JClass("org.ergoplatform.Input")
+        proverResult = getattr(jpype.JClass("sigmastate.interpreter.ProverResult$"), "MODULE$")
+        inputs = [Input(jpype.JArray(jpype.JByte)(self.rng.randbytes(32)), proverResult.empty()) for _ in range(len(batch) + 2)]
+        tx = jpype.JClass("org.ergoplatform.ErgoLikeTransaction")(
+            JavaHelpers.toIndexedSeq(ArrayList(inputs)),
+            JavaHelpers.toIndexedSeq(ArrayList([])),
+            JavaHelpers.toIndexedSeq(ArrayList(outputs))
+        )
+        serializer = getattr(jpype.JClass("org.ergoplatform.ErgoLikeTransactionSerializer$"), "MODULE$")
+        return len(serializer.toBytes(tx))
+
+    def test_size_matches_serialized_tx(self):
+        planner = CompoundPlanner(self.config, self.txOperator)
+        for n in [1, 17, 150]:
+            stakeBoxes = self.stakeBoxes(n)
+            emission = self.emission(stakeBoxes)
+            batches = planner.plan(emission, stakeBoxes)
+            assert len(batches) == 1
+            assert batches[0].size == self.serializedSize(planner, emission, batches[0])
+
+    def test_batches_fit_limits(self):
+        planner = CompoundPlanner(self.config, self.txOperator)
+        stakeBoxes = self.stakeBoxes(1000)
+        emission = self.emission(stakeBoxes)
+        batches = planner.plan(emission, stakeBoxes + self.stakeBoxes(10, checkpoint=4))
+        assert sorted(s.stakeKey for b in batches for s in b.stakeBoxes) == sorted(s.stakeKey for s in stakeBoxes)
+        # The lower bound ignores that boxes do not split, first fit decreasing stays within one tx of it
+        assert len(batches) <= planner.minimumBatches(emission, stakeBoxes) + 1
+        for batch in batches:
+            assert batch.size <= planner.maxSize
+            assert batch.cost <= planner.maxCost
+            assert batch.size == self.serializedSize(planner, emission, batch)
+        assert sum(b.stakeRewards for b in batches) <= emission.emissionAmount
+
+    def test_uniform_boxes_reach_lower_bound(self):
+        planner = CompoundPlanner(self.config, self.txOperator)
+        stakeBoxes = [StakeRecord(None, 5, 1650000000000, 10**9, self.rng.randbytes(32).hex()) for _ in range(2000)]
+        emission = self.emission(stakeBoxes)
+        assert len(planner.plan(emission, stakeBoxes)) == planner.minimumBatches(emission, stakeBoxes)
+
+    def test_cost_bound(self):
+        costModel = CompoundCostModel(baseCost=10000, stakeBoxCost=1000, indexOfCost=100)
+        maxCount = costModel.maxStakeBoxes(200000)
+        assert costModel.cost(maxCount) <= 200000 < costModel.cost(maxCount + 1)
+        planner = CompoundPlanner(self.config, self.txOperator, maxCost=200000, costModel=costModel)
+        stakeBoxes = self.stakeBoxes(100)
+        batches = planner.plan(self.emission(stakeBoxes), stakeBoxes)
+        assert max(len(b) for b in batches) == maxCount
+        assert len(batches) == -(-100 // maxCount)
+
+class TestConsolidationPlanner:
+    appKit = TestCompoundPlanner.appKit
+    config = TestCompoundPlanner.config
+    txOperator = TestCompoundPlanner.txOperator
+    rng = random.Random(5)
+
+    def serializedSize(self, planner, inputs):
+        helper = TestCompoundPlanner()
+        height = planner.creationHeight
+        outputs = [
+            helper.candidate(2**63 - 1, self.config.stakingIncentiveContract.contract.getErgoTree(), [], [], height),
+            helper.candidate(self.config.dustCollectionReward * inputs, self.appKit.contractFromAddress(self.txOperator).getErgoTree(), [], [], height),
+            helper.candidate(self.config.dustCollectionMinerFee, ErgoScriptPredef.feeProposition(720), [], [], height)
+        ]
+        Input = jpype.JClass("org.ergoplatform.Input")
+        proverResult = getattr(jpype.JClass("sigmastate.interpreter.ProverResult$"), "MODULE$")
+        tx = jpype.JClass("org.ergoplatform.ErgoLikeTransaction")(
+            JavaHelpers.toIndexedSeq(ArrayList([Input(jpype.JArray(jpype.JByte)(self.rng.randbytes(32)), proverResult.empty()) for _ in range(inputs)])),
+            JavaHelpers.toIndexedSeq(ArrayList([])),
+            JavaHelpers.toIndexedSeq(ArrayList(outputs))
+        )
+        serializer = getattr(jpype.JClass("org.ergoplatform.ErgoLikeTransactionSerializer$"), "MODULE$")
+        return len(serializer.toBytes(tx))
+
+    def test_size_matches_serialized_tx(self):
+        planner = ConsolidationPlanner(self.config, self.txOperator)
+        for n in [2, 100, 200]:
+            assert planner.size(n) == self.serializedSize(planner, n)
+
+    def test_max_inputs_within_limits(self):
+        planner = ConsolidationPlanner(self.config, self.txOperator)
+        assert planner.costModel.cost(planner.maxInputs) <= planner.maxCost
+        sizeBound = ConsolidationPlanner(self.config, self.txOperator, maxSize=5000, costModel=DustCostModel(0, 1, 0))
+        assert sizeBound.size(sizeBound.maxInputs) <= 5000 < sizeBound.size(sizeBound.maxInputs + 1)
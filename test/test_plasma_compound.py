@@ -0,0 +1,110 @@
+from types import SimpleNamespace
+import jpype
+import pytest
+from .plasma_fakes import installGetblokPlasma
+installGetblokPlasma()
+import scala
+from org.ergoplatform.appkit import ErgoType, ErgoValue
+from paideia_contracts.contracts.plasma_staking import PlasmaCompoundCostModel, PlasmaCompoundPlanner, PlasmaStakingBox
+from paideia_contracts.contracts.staking import rewards
+from paideia_contracts.contracts.staking.planner import vlqSize
+
+class FakeResult:
+    def __init__(self, proofSize):
+        self.proofSize = proofSize
+
+    def proof(self):
+        return self
+
+    def bytes(self):
+        return bytes(self.proofSize)
+
+class FakeState:
+    # Sorted keys and stakes of a tree, every looked up key adds proofBytes to
+    # the proof
+    def __init__(self, stakes, proofBytes=100):
+        self.stakes = stakes
+        self._sortedKeys = sorted(stakes)
+        self.proofBytes = proofBytes
+
+    def getKeys(self, i=0, n=1):
+        return self._sortedKeys[i:i+n]
+
+    def getStakes(self, keys):
+        return FakeResult(self.proofBytes * len(keys))
+
+    def currentStakes(self, keys):
+        return [self.stakes[key] for key in keys]
+
+def serializedSize(ergoValue):
+    return len(ergoValue.toHex()) // 2
+
+class TestPlasmaCompoundPlanner:
+    def test_size_matches_context_vars(self):
+        planner = PlasmaCompoundPlanner(baseSize=0)
+        pairType = ErgoType.pairType(ErgoType.collType(ErgoType.byteType()), ErgoType.collType(ErgoType.byteType()))
+        def operations(n):
+            # Context var 1, (key, stake) pairs as CompoundTransaction builds them
+            pair = scala.Tuple2(ErgoValue.of(bytes(32)).getValue(), ErgoValue.of(bytes(8)).getValue())
+            return serializedSize(ErgoValue.of(jpype.JArray(scala.Tuple2)([pair] * n), pairType))
+        # Only the type in front of each context var is left to baseSize
+        header = operations(1) - (planner.size(1, 0, 0) - 2 * vlqSize(0))
+        for n in [3, 127, 128, 300]:
+            assert operations(n) - header == planner.size(n, 0, 0) - 2 * vlqSize(0)
+        proofHeader = serializedSize(ErgoValue.of(bytes(1))) - (planner.size(0, 1, 0) - planner.size(0, 0, 0))
+        for proof in [127, 128, 5000]:
+            assert serializedSize(ErgoValue.of(bytes(proof))) - proofHeader == planner.size(0, proof, 0) - planner.size(0, 0, 0)
+            assert planner.size(0, 0, proof) == planner.size(0, proof, 0)
+
+    def test_within_limits(self):
+        costModel = PlasmaCompoundCostModel()
+        planner = PlasmaCompoundPlanner(maxSize=PlasmaCompoundPlanner().size(10, 1000, 2000), costModel=costModel)
+        assert planner.withinLimits(10, 1000, 2000)
+        assert not planner.withinLimits(10, 1001, 2000)
+        assert not planner.withinLimits(11, 1000, 2000)
+        planner = PlasmaCompoundPlanner(maxCost=costModel.cost(10, 3000), costModel=costModel)
+        assert planner.withinLimits(10, 1000, 2000)
+        assert not planner.withinLimits(10, 1000, 2001)
+        assert not planner.withinLimits(11, 1000, 2000)
+
+    def test_batches_are_staking_or_unstaked(self):
+        planner = PlasmaCompoundPlanner()
+        snapshot = SimpleNamespace(state=FakeState({"a": 1, "b": 2, "c": 3, "d": 4, "e": 5}))
+        # c unstaked and f staked since the snapshot
+        stakers = FakeState({"a": 1, "b": 2, "d": 4, "e": 5, "f": 6})
+        assert planner.nextBatch(stakers, snapshot) == ["a", "b", "d", "e"]
+        snapshot.state = FakeState({"c": 3, "d": 4, "e": 5})
+        assert planner.nextBatch(stakers, snapshot) == ["c"]
+        snapshot.state = FakeState({})
+        assert planner.nextBatch(stakers, snapshot) == []
+
+    def test_batch_limited_by_proofs(self):
+        snapshot = SimpleNamespace(state=FakeState({key: 1 for key in "abcdefgh"}))
+        stakers = FakeState({key: 1 for key in "abcdefgh"})
+        # The snapshot proof is estimated at removalFactor times the lookup proof
+        planner = PlasmaCompoundPlanner(maxSize=PlasmaCompoundPlanner().size(3, 300, 600))
+        assert planner.nextBatch(stakers, snapshot) == ["a", "b", "c"]
+        planner = PlasmaCompoundPlanner(maxSize=PlasmaCompoundPlanner().size(1, 100, 200) - 1)
+        with pytest.raises(Exception, match="A single key does not fit"):
+            planner.nextBatch(stakers, snapshot)
+
+class TestCompoundedStakes:
+    def box(self, stakes):
+        return SimpleNamespace(_stakers=FakeState(stakes), _config=SimpleNamespace(emissionAmount=1000))
+
+    def test_staking_keys_get_rewards(self):
+        snapshot = SimpleNamespace(state=FakeState({"a": 100, "b": 300}), totalStaked=400)
+        # a added to its stake since the snapshot, the reward is on the snapshot
+        box = self.box({"a": 150, "b": 300})
+        assert PlasmaStakingBox.compoundedStakes(box, snapshot, ["a", "b"]) == {
+            "a": 150 + rewards.compoundReward(100, 1000, 400),
+            "b": 300 + rewards.compoundReward(300, 1000, 400)}
+
+    def test_unstaked_keys_get_zero(self):
+        snapshot = SimpleNamespace(state=FakeState({"a": 100, "b": 300}), totalStaked=400)
+        assert PlasmaStakingBox.compoundedStakes(self.box({}), snapshot, ["a", "b"]) == {"a": 0, "b": 0}
+
+    def test_mixed_batch(self):
+        snapshot = SimpleNamespace(state=FakeState({"a": 100, "b": 300}), totalStaked=400)
+        with pytest.raises(Exception, match="need separate compound txs"):
+            PlasmaStakingBox.compoundedStakes(self.box({"b": 300}), snapshot, ["a", "b"])
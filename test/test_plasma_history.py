@@ -0,0 +1,109 @@
+import shutil
+from types import SimpleNamespace
+import pytest
+from .plasma_fakes import installGetblokPlasma
+installGetblokPlasma()
+from paideia_contracts.contracts.plasma_staking import PlasmaStakingConfig, PlasmaStakingHistory, PlasmaStakingState
+from paideia_contracts.contracts.plasma_staking.store import PlasmaStakingStore
+
+config = PlasmaStakingConfig(
+    nftId="29d6c2d943d7f5a2800095dba6b6168f1602d355480218f4a8a8c6575245a907",
+    stakedTokenId="0cd8c9f416e5b1ca9f986a7f10a84191dfb85941619e49e53c0dc30ebf83324b",
+    emissionAmount=1000,
+    emissionDelay=2,
+    cycleLength=3600000)
+
+def key(i):
+    return f"{i:064x}"
+
+def digest(snapshot):
+    return bytes(snapshot.ergoValue().getValue().digest().toArray()).hex()
+
+class FakeR6:
+    # Coll[(Long,(Long,AvlTree))] of the snapshots, newest first
+    def __init__(self, snapshots):
+        self.entries = [(s.numberOfStakers, s.totalStaked, s.ergoValue().getValue()) for s in snapshots]
+
+    def length(self):
+        return len(self.entries)
+
+    def apply(self, i):
+        stakers, totalStaked, avlTree = self.entries[i]
+        return SimpleNamespace(_1=lambda: stakers, _2=lambda: SimpleNamespace(_1=lambda: totalStaked, _2=lambda: avlTree))
+
+def inputBox(history):
+    registers = [None, None, SimpleNamespace(getValue=lambda: FakeR6(history.snapshots))]
+    return SimpleNamespace(getRegisters=lambda: SimpleNamespace(get=lambda i: registers[i]))
+
+class TestPlasmaStakingHistory:
+    def history(self, path):
+        # Two snapshots with stakers joining, changing their stake and leaving
+        # in between, and the oldest partly compounded
+        state = PlasmaStakingState(config, store=PlasmaStakingStore(path, checkpointInterval=3))
+        history = PlasmaStakingHistory(state, config.emissionDelay)
+        state.stakeMany({key(i): 100 for i in range(6)})
+        history.snapshot()
+        state.changeStakes({key(1): 150})
+        state.unstake(key(2))
+        state.stakeMany({key(7): 50, key(8): 60})
+        history.snapshot()
+        state.unstake(key(3))
+        state.changeStakes({key(7): 55})
+        with state.transaction():
+            history.compounding().remove([key(0), key(1)])
+            history.compounded([key(0), key(1)])
+        return state, history
+
+    def restored(self, path, box=None):
+        state = PlasmaStakingState.fromStore(config, PlasmaStakingStore(path))
+        return state, PlasmaStakingHistory.fromStore(state, config.emissionDelay, box)
+
+    def test_restart(self, tmp_path):
+        path = str(tmp_path / "plasma.sqlite")
+        state, history = self.history(path)
+        # Restarted on a copy, so the two go on with stores of their own
+        shutil.copy(path, path + ".copy")
+        restoredState, restored = self.restored(path + ".copy", inputBox(history))
+        assert restoredState.digest == state.digest
+        assert [(s.numberOfStakers, s.totalStaked, digest(s)) for s in restored.snapshots] == [(s.numberOfStakers, s.totalStaked, digest(s)) for s in history.snapshots]
+        assert list(restored.compounding().state.getKeys(0, 10)) == [key(i) for i in range(2, 6)]
+        # Both go on the same way
+        for s, h in [(state, history), (restoredState, restored)]:
+            with s.transaction():
+                h.compounding().remove([key(i) for i in range(2, 6)])
+                h.compounded([key(i) for i in range(2, 6)])
+            h.snapshot()
+            s.stakeMany({key(9): 10})
+        assert restoredState.digest == state.digest
+        assert [digest(s) for s in restored.snapshots] == [digest(s) for s in history.snapshots]
+        assert restored._oldest.digest == history._oldest.digest
+        # The dropped snapshot left the store, the next restart starts from the
+        # oldest tree saved with the drop
+        for p in [path, path + ".copy"]:
+            _, again = self.restored(p, inputBox(history))
+            assert [digest(s) for s in again.snapshots] == [digest(s) for s in history.snapshots]
+            assert len(PlasmaStakingStore(p).snapshots()) == 2
+
+    def test_fresh_store(self, tmp_path):
+        _, history = self.restored(str(tmp_path / "plasma.sqlite"))
+        assert history.snapshots == [] and history.compounding() is None
+
+    def test_r6_mismatch(self, tmp_path):
+        path = str(tmp_path / "plasma.sqlite")
+        _, history = self.history(path)
+        history.snapshots[0].totalStaked += 1
+        box = inputBox(history)
+        with pytest.raises(Exception, match="Snapshot 0 of R6"):
+            self.restored(path, box)
+
+    def test_journal_out_of_order(self, tmp_path):
+        path = str(tmp_path / "plasma.sqlite")
+        self.history(path)
+        store = PlasmaStakingStore(path)
+        # The update and the insert of the first journal swapped
+        rows = store._db.execute("SELECT id, op, stakes FROM journal WHERE snapshot = 1 ORDER BY id").fetchall()
+        store._db.execute("UPDATE journal SET op = ?, stakes = ? WHERE id = ?", (rows[2][1], rows[2][2], rows[0][0]))
+        store._db.execute("UPDATE journal SET op = ?, stakes = ? WHERE id = ?", (rows[0][1], rows[0][2], rows[2][0]))
+        store._db.commit()
+        with pytest.raises(Exception, match="Rebuilt snapshot 2"):
+            self.restored(path)
@@ -0,0 +1,87 @@
+import importlib.util
+import os
+import pytest
+
+# Loaded from its file, importing the plasma_staking package needs getblok_plasma
+_spec = importlib.util.spec_from_file_location("plasma_store", os.path.join(os.path.dirname(__file__), "..", "paideia_contracts", "contracts", "plasma_staking", "store.py"))
+store = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(store)
+
+class TestPlasmaStakingStore:
+    def test_batches_merge_consecutive_operations(self):
+        s = store.PlasmaStakingStore()
+        s.record(store.INSERT, {"a": 1, "b": 2}, "d1", 3)
+        s.record(store.INSERT, {"c": 3}, "d2", 6)
+        s.record(store.UPDATE, {"a": 5}, "d3", 10)
+        s.record(store.UPDATE, {"b": 7, "a": 6}, "d4", 16)
+        s.record(store.DELETE, {"c": None}, "d5", 13)
+        s.record(store.INSERT, {"c": 4}, "d6", 17)
+        assert list(s.batches()) == [(store.INSERT, {"a": 1, "b": 2, "c": 3}), (store.UPDATE, {"a": 6, "b": 7}), (store.DELETE, {"c": None}), (store.INSERT, {"c": 4})]
+
+    def test_nested_transaction_commits_once(self, tmp_path):
+        path = str(tmp_path / "plasma.sqlite")
+        s = store.PlasmaStakingStore(path)
+        with s.transaction():
+            s.record(store.INSERT, {"a": 1}, "d1", 1)
+            with s.transaction():
+                s.record(store.INSERT, {"b": 2}, "d2", 3)
+            # The inner transaction does not commit on its own
+            assert store.PlasmaStakingStore(path).state() is None
+        assert store.PlasmaStakingStore(path).state() == ("d2", 3)
+
+    def test_rollback(self, tmp_path):
+        path = str(tmp_path / "plasma.sqlite")
+        s = store.PlasmaStakingStore(path)
+        s.record(store.INSERT, {"a": 1, "b": 2}, "d1", 3)
+        with pytest.raises(RuntimeError):
+            with s.transaction():
+                s.record(store.DELETE, {"a": None}, "d2", 2)
+                with s.transaction():
+                    s.record(store.UPDATE, {"b": 5}, "d3", 5)
+                raise RuntimeError()
+        for reopened in [s, store.PlasmaStakingStore(path)]:
+            assert reopened.state() == ("d1", 3)
+            assert reopened.stakes() == {"a": 1, "b": 2}
+            assert list(reopened.batches()) == [(store.INSERT, {"a": 1, "b": 2})]
+
+    def test_state_and_stakes(self):
+        s = store.PlasmaStakingStore()
+        assert s.state() is None and s.stakes() == {}
+        s.record(store.INSERT, {"a": 1, "b": 2}, "d1", 3)
+        s.record(store.UPDATE, {"a": 4}, "d2", 6)
+        s.record(store.DELETE, {"b": None}, "d3", 4)
+        assert s.state() == ("d3", 4)
+        assert s.stakes() == {"a": 4}
+
+    def test_checkpoint_truncates_operations(self):
+        s = store.PlasmaStakingStore(checkpointInterval=2)
+        s.record(store.INSERT, {"a": 1}, "d1", 1)
+        assert not s.checkpointDue()
+        s.record(store.INSERT, {"b": 2}, "d2", 3)
+        assert s.checkpointDue()
+        s.saveCheckpoint("d2", "00ff", ["01", "02"])
+        assert list(s.batches()) == [] and not s.checkpointDue()
+        s.record(store.UPDATE, {"a": 5}, "d3", 7)
+        assert s.checkpoint() == ("d2", "00ff", ["01", "02"])
+        assert list(s.batches()) == [(store.UPDATE, {"a": 5})]
+        assert s.stakes() == {"a": 5, "b": 2}
+
+    def test_snapshots(self):
+        s = store.PlasmaStakingStore()
+        s.recordSnapshot(2, 3, "d1")
+        s.saveOldest("d1", "00ff", [])
+        s.recordJournal(store.INSERT, {"c": 3})
+        s.recordSnapshot(3, 6, "d2")
+        s.recordJournal(store.UPDATE, {"a": 4})
+        s.recordCompounded(["a"])
+        s.recordJournal(store.DELETE, {"c": None})
+        assert s.snapshots() == [(1, 2, 3, "d1"), (2, 3, 6, "d2")]
+        # Journals go to the newest snapshot, compounded keys to the oldest
+        assert s.journal(1) == [(store.INSERT, {"c": 3})]
+        assert s.journal(2) == [(store.UPDATE, {"a": 4}), (store.DELETE, {"c": None})]
+        assert s.compounded(1) == [["a"]]
+        s.dropSnapshot()
+        s.saveOldest("d2", "01ff", [])
+        assert s.snapshots() == [(2, 3, 6, "d2")]
+        assert s.journal(1) == [] and s.compounded(1) == []
+        assert s.oldest() == ("d2", "01ff", [])
@@ -0,0 +1,40 @@
+import sys
+from ergo_python_appkit.appkit import ErgoAppKit
+from paideia_contracts.contracts.staking import EmissionBox, StakeBox, StakePoolBox, StakeStateBox, PaideiaTestConfig
+from paideia_contracts.contracts.staking.records import EmissionRecord, StakePoolRecord, StakeRecord, StakeStateRecord
+
+
+class TestRecords:
+    appKit = ErgoAppKit("http://213.239.193.208:9053","mainnet","https://api.ergoplatform.com/")
+    config = PaideiaTestConfig(appKit)
+
+    def test_stake_round_trip(self):
+        stakeBox = StakeBox(self.appKit, self.config.stakeContract, 4, 1650000000000, 123456, "ab" * 32)
+        record = StakeRecord.fromBox(stakeBox, "cd" * 32)
+        assert record == StakeRecord("cd" * 32, 4, 1650000000000, 123456, "ab" * 32)
+        box = record.toBox(self.config.stakeContract)
+        assert [r.toHex() for r in box.registers] == [r.toHex() for r in stakeBox.registers]
+        assert box.tokens == stakeBox.tokens
+        assert not hasattr(record, "__dict__")
+
+    def test_emission_round_trip(self):
+        emissionBox = EmissionBox(self.appKit, self.config.emissionContract, 9, 9569595, 3, 10, 293000)
+        box = EmissionRecord.fromBox(emissionBox).toBox(self.config.emissionContract)
+        assert [r.toHex() for r in box.registers] == [r.toHex() for r in emissionBox.registers]
+        assert box.tokens == emissionBox.tokens
+
+    def test_stake_state_round_trip(self):
+        stakeStateBox = StakeStateBox(self.appKit, self.config.stakeStateContract, 1, 1650000000000, 10000000, 86400000, 10)
+        box = StakeStateRecord.fromBox(stakeStateBox).toBox(self.config.stakeStateContract)
+        assert [r.toHex() for r in box.registers] == [r.toHex() for r in stakeStateBox.registers]
+        assert box.tokens == stakeStateBox.tokens
+
+    def test_stake_pool_round_trip(self):
+        stakePoolBox = StakePoolBox(self.appKit, self.config.stakePoolContract, 293000, 900000000)
+        box = StakePoolRecord.fromBox(stakePoolBox).toBox(self.config.stakePoolContract)
+        assert [r.toHex() for r in box.registers] == [r.toHex() for r in stakePoolBox.registers]
+        assert box.tokens == stakePoolBox.tokens
+
+    def test_record_size(self):
+        record = StakeRecord("cd" * 32, 4, 1650000000000, 123456, "ab" * 32)
+        assert sys.getsizeof(record) < 100
@@ -0,0 +1,62 @@
+import random
+from array import array
+import pytest
+from paideia_contracts.contracts.staking import rewards
+
+class TestRewards:
+    rng = random.Random(11)
+
+    def randomCase(self):
+        totalStaked = self.rng.choice([self.rng.randint(1, 10**6), self.rng.randint(1, 2**40), self.rng.randint(1, 2**60)])
+        emissionAmount = self.rng.choice([self.rng.randint(0, 10**4), self.rng.randint(0, 2**32), self.rng.randint(0, 2**53)])
+        amounts = [self.rng.randint(0, totalStaked) for _ in range(self.rng.randint(1, 500))]
+        return amounts, emissionAmount, totalStaked
+
+    def test_big_int_divide_truncates(self):
+        assert rewards.bigIntDivide(7, 2) == 3
+        assert rewards.bigIntDivide(-7, 2) == -3
+        assert rewards.bigIntDivide(7, -2) == -3
+        assert rewards.bigIntDivide(-7, -2) == 3
+
+    def test_numpy_matches_exact(self):
+        pytest.importorskip("numpy")
+        for _ in range(200):
+            amounts, emissionAmount, totalStaked = self.randomCase()
+            expected = [rewards.compoundReward(a, emissionAmount, totalStaked) for a in amounts]
+            assert list(rewards.compoundRewards(array("q", amounts), emissionAmount, totalStaked)) == expected
+
+    def test_without_numpy(self, monkeypatch):
+        monkeypatch.setattr(rewards, "numpy", None)
+        for _ in range(50):
+            amounts, emissionAmount, totalStaked = self.randomCase()
+            expected = [rewards.compoundReward(a, emissionAmount, totalStaked) for a in amounts]
+            assert list(rewards.compoundRewards(amounts, emissionAmount, totalStaked)) == expected
+
+    def test_out_of_bounds_inputs(self):
+        # Amounts above the total, negative amounts and huge emissions take the exact path
+        for amounts, emissionAmount, totalStaked in [
+            ([2**62, 5], 3, 7),
+            ([-5, 10], 3, 7),
+            ([2**40, 1], 2**62, 2**41),
+            ([], 10, 10),
+        ]:
+            expected = [rewards.compoundReward(a, emissionAmount, totalStaked) for a in amounts]
+            assert list(rewards.compoundRewards(amounts, emissionAmount, totalStaked)) == expected
+        with pytest.raises(ZeroDivisionError):
+            rewards.compoundRewards([1], 1, 0)
+
+    def test_float_formula_diverges(self):
+        # 2**53 + 1 has no float representation
+        assert rewards.compoundReward(2**53 + 1, 7, 7) == 2**53 + 1
+        assert rewards.floatCompoundReward(2**53 + 1, 7, 7) != 2**53 + 1
+        assert list(rewards.compoundRewards([2**53 + 1], 7, 7)) == [2**53 + 1]
+        diverged = 0
+        for _ in range(200):
+            totalStaked = self.rng.randint(2**50, 2**60)
+            emissionAmount = self.rng.randint(2**40, 2**53)
+            amount = self.rng.randint(0, totalStaked)
+            exact = rewards.compoundReward(amount, emissionAmount, totalStaked)
+            if rewards.floatCompoundReward(amount, emissionAmount, totalStaked) != exact:
+                diverged += 1
+            assert rewards.compoundRewards([amount], emissionAmount, totalStaked)[0] == exact
+        assert diverged > 0
@@ -0,0 +1,107 @@
+import asyncio
+from time import monotonic, sleep
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from paideia_contracts.contracts.staking.scheduler import PoolScheduler, poolFactories
+
+class TestPoolScheduler:
+    def test_slow_pool_does_not_starve(self):
+        async def scenario():
+            scheduler = PoolScheduler({"slow": None, "fast1": None, "fast2": None}, maxWorkers=2)
+            runner = asyncio.ensure_future(scheduler.run())
+            start = monotonic()
+            slow = [scheduler.submit("slow", "compound", sleep, 0.2) for _ in range(5)]
+            fast = [scheduler.submit(pool, "proxy", sleep, 0.01) for _ in range(10) for pool in ["fast1", "fast2"]]
+            assert scheduler.queueDepth() == 25
+            await asyncio.gather(*fast)
+            fastDone = monotonic() - start
+            await asyncio.gather(*slow)
+            slowDone = monotonic() - start
+            scheduler.stop()
+            await runner
+            return scheduler, fastDone, slowDone
+
+        scheduler, fastDone, slowDone = asyncio.run(scenario())
+        # The slow pool only ever holds one of the two workers
+        assert fastDone < 0.6
+        assert slowDone >= 1.0
+        report = scheduler.report()
+        assert report["slow"]["completed"] == 5
+        assert report["fast1"]["completed"] == 10
+        assert report["fast2"]["throughput"] > report["slow"]["throughput"]
+        assert scheduler.queueDepth() == 0
+
+    def test_round_robin(self):
+        order = []
+
+        async def scenario():
+            scheduler = PoolScheduler({"a": None, "b": None, "c": None}, maxWorkers=1)
+            futures = [scheduler.submit(pool, "emit", order.append, pool) for pool in ["a"] * 3 + ["b"] * 3 + ["c"] * 3]
+            runner = asyncio.ensure_future(scheduler.run())
+            await asyncio.gather(*futures)
+            scheduler.stop()
+            await runner
+
+        asyncio.run(scenario())
+        assert order == ["a", "b", "c"] * 3
+
+    def test_failures_and_recurring(self):
+        def fail():
+            raise ValueError("box spent")
+
+        async def scenario():
+            scheduler = PoolScheduler({"a": None}, maxWorkers=2)
+            runner = asyncio.ensure_future(scheduler.run())
+            with pytest.raises(ValueError):
+                await scheduler.submit("a", "dust", fail)
+            calls = []
+            scheduler.every("a", "emit", 0.01, calls.append, 1)
+            await asyncio.sleep(0.1)
+            scheduler.stop()
+            await runner
+            return scheduler, calls
+
+        scheduler, calls = asyncio.run(scenario())
+        assert len(calls) >= 3
+        assert scheduler.report()["a"]["failed"] == 1
+        assert scheduler.report()["a"]["lastError"] == "dust: box spent"
+
+    def test_duplicate_names_and_cancelled_futures(self):
+        async def scenario():
+            scheduler = PoolScheduler({"a": None}, maxWorkers=1)
+            first = scheduler.submit("a", "emit", sleep, 0.05)
+            second = scheduler.submit("a", "emit", sleep, 0.05)
+            second.cancel()
+            runner = asyncio.ensure_future(scheduler.run())
+            await first
+            # The second emit is still queued or running
+            assert scheduler._active[("a", "emit")] == 1
+            while scheduler.inFlight() > 0 or scheduler.queueDepth() > 0:
+                await asyncio.sleep(0.01)
+            assert scheduler._active[("a", "emit")] == 0
+            scheduler.stop()
+            await runner
+            return scheduler
+
+        scheduler = asyncio.run(scenario())
+        assert scheduler.report()["a"]["completed"] == 2
+        assert scheduler._executor._shutdown
+
+    def test_shared_executor(self):
+        executor = ThreadPoolExecutor(1)
+
+        async def scenario():
+            scheduler = PoolScheduler({"a": None}, executor=executor)
+            future = scheduler.submit("a", "emit", sleep, 0)
+            runner = asyncio.ensure_future(scheduler.run())
+            await future
+            scheduler.stop()
+            await runner
+
+        asyncio.run(scenario())
+        # Still usable by its other users
+        assert executor.submit(sum, [1, 2]).result() == 3
+        executor.shutdown()
+
+    def test_pools(self):
+        assert sorted(poolFactories) == ["aht", "egio", "ergo_crux_lp", "ergopadv5test", "neta", "paideia"]
@@ -0,0 +1,179 @@
+import pytest
+from ergo_python_appkit.appkit import ErgoAppKit, ErgoValueT
+from org.ergoplatform.appkit import ErgoClientException
+from paideia_contracts.contracts.staking import InvalidInputBoxException, PaideiaTestConfig
+from paideia_contracts.contracts.staking.pipeline import ChainRejectedException
+from paideia_contracts.contracts.staking.records import StakeRecord
+from paideia_contracts.contracts.staking.sequencer import ADD_STAKE, STAKE, UNSTAKE, ProxyRequest, StakeStateSequencer, orderRequests
+
+now = 1650000000000
+
+class FakeId:
+    def __init__(self, boxId):
+        self.boxId = boxId
+
+    def toString(self):
+        return self.boxId
+
+class FakeToken:
+    def __init__(self, tokenId, value):
+        self.tokenId = tokenId
+        self.value = value
+
+    def getId(self):
+        return FakeId(self.tokenId)
+
+    def getValue(self):
+        return self.value
+
+class FakeBox:
+    def __init__(self, boxId, ergoTree=None, tokens=[], registers=[]):
+        self.boxId = boxId
+        self.ergoTree = ergoTree
+        self.tokens = [FakeToken(*t) for t in tokens]
+        self.registers = [ErgoAppKit.ergoValue(r, ErgoValueT.LongArray) for r in registers]
+
+    def getId(self):
+        return FakeId(self.boxId)
+
+    def getErgoTree(self):
+        return self.ergoTree
+
+    def getTokens(self):
+        return self.tokens
+
+    def getRegisters(self):
+        return self.registers
+
+class FakeSignedTx:
+    def __init__(self, txId, outputs):
+        self.txId = txId
+        self.outputs = outputs
+
+    def getOutputsToSpend(self):
+        return self.outputs
+
+class FakeSequencer(StakeStateSequencer):
+    # Every tx moves the stake state to a new box and the stake box to a new box with the new amount
+    def __init__(self, config, stakeBoxes, rejections=(), spent=()):
+        super().__init__(config, "9hxT7sAZEmLWGNp3gN8RRw4qS1NxDMsCtuJkrQ5oEq5w1g7s97U", stakeBoxes.get, clock=lambda: now / 1000)
+        self.rejections = set(rejections)
+        self.spent = set(spent)
+        self.txCount = 0
+        self.builds = []
+
+    def build(self, stakeStateInput, requests, stakeInputs):
+        self.builds.append((stakeStateInput.boxId, [r.boxId for r in requests]))
+        return super().build(stakeStateInput, requests, stakeInputs)
+
+    def transaction(self, request, stakeStateInput, stakeInput):
+        return (request, stakeStateInput, stakeInput)
+
+    def signTransaction(self, unsignedTx):
+        request, stakeStateInput, stakeInput = unsignedTx
+        self.txCount += 1
+        txId = f"tx{self.txCount}"
+        if request.kind == STAKE:
+            stakeBox = stakeRecordBox(f"{txId}-stake", request.amount)
+        elif request.kind == ADD_STAKE:
+            stakeBox = stakeRecordBox(f"{txId}-stake", stakeInput.amount + request.amount)
+        else:
+            stakeBox = stakeRecordBox(f"{txId}-stake", stakeInput.amount - request.amount)
+        outputs = [stakeStateBox(f"{txId}-stakeState"), stakeBox, stakeBox, stakeBox]
+        return FakeSignedTx(txId, outputs)
+
+    def sendTransaction(self, signedTx):
+        if signedTx.txId in self.rejections:
+            raise ErgoClientException("Double spend", None)
+        return signedTx.txId
+
+    def unspentBoxes(self, boxIds):
+        return [FakeBox(boxId) for boxId in boxIds if boxId not in self.spent]
+
+class StakeInput(FakeBox):
+    def __init__(self, boxId, amount, checkpoint=3):
+        super().__init__(boxId, registers=[[checkpoint, now]], tokens=[("stakeToken", 1), ("paideia", amount)])
+        self.amount = amount
+        self.registers.append(ErgoAppKit.ergoValue("00" * 32, ErgoValueT.ByteArrayFromHex))
+
+def stakeRecordBox(boxId, amount):
+    return StakeInput(boxId, amount)
+
+def stakeStateBox(boxId):
+    # Total staked, checkpoint, stakers, checkpoint time, cycle duration
+    return FakeBox(boxId, registers=[[10**9, 3, 10, now, 86400000]])
+
+class TestStakeStateSequencer:
+    appKit = ErgoAppKit("http://213.239.193.208:9053","mainnet","https://api.ergoplatform.com/")
+    config = PaideiaTestConfig(appKit, lazy=True)
+
+    def proxy(self, boxId, contract, tokens, r4):
+        # Proxy boxes hold the user ergo tree in R5
+        box = FakeBox(boxId, contract._ergoTree, tokens, [r4])
+        box.registers.append(ErgoAppKit.ergoValue("0008cd", ErgoValueT.ByteArrayFromHex))
+        return box
+
+    def stakeProxy(self, boxId, amount, stakeTime):
+        return self.proxy(boxId, self.config.stakeProxyContract, [("paideia", amount)], [stakeTime])
+
+    def addStakeProxy(self, boxId, stakeKey, amount):
+        return self.proxy(boxId, self.config.addStakeProxyContract, [(stakeKey, 1), ("paideia", amount)], [0])
+
+    def unstakeProxy(self, boxId, stakeKey, amount):
+        return self.proxy(boxId, self.config.unstakeProxyContract, [(stakeKey, 1)], [amount])
+
+    def test_proxy_requests(self):
+        stake = ProxyRequest.fromInputBox(self.stakeProxy("p1", 5000, now), self.config)
+        assert (stake.kind, stake.amount, stake.stakeTime) == (STAKE, 5000, now)
+        add = ProxyRequest.fromInputBox(self.addStakeProxy("p2", "key", 7000), self.config)
+        assert (add.kind, add.amount, add.stakeKey) == (ADD_STAKE, 7000, "key")
+        unstake = ProxyRequest.fromInputBox(self.unstakeProxy("p3", "key", 9000), self.config)
+        assert (unstake.kind, unstake.amount, unstake.stakeKey) == (UNSTAKE, 9000, "key")
+        with pytest.raises(InvalidInputBoxException):
+            ProxyRequest.fromInputBox(self.proxy("p4", self.config.stakeContract, [], [0]), self.config)
+
+    def test_order(self):
+        requests = [
+            ProxyRequest(UNSTAKE, FakeBox("u1"), 1500, stakeKey="a"),
+            ProxyRequest(STAKE, FakeBox("s1"), 1000, stakeTime=now - 60000),
+            ProxyRequest(ADD_STAKE, FakeBox("a1"), 1000, stakeKey="a"),
+            ProxyRequest(STAKE, FakeBox("s2"), 1000, stakeTime=now - 600000),
+            ProxyRequest(STAKE, FakeBox("s3"), 1000, stakeTime=now - 1790000),
+            ProxyRequest(ADD_STAKE, FakeBox("a2"), 1000, stakeKey="b"),
+            ProxyRequest(UNSTAKE, FakeBox("u2"), 5000, stakeKey="c"),
+            ProxyRequest(UNSTAKE, FakeBox("u3"), 1000, stakeKey="a"),
+        ]
+        stakeBoxes = {
+            "a": StakeRecord(None, 3, now, 1000, "a"),
+            "b": StakeRecord(None, 2, now, 1000, "b"),
+            "c": StakeRecord(None, 3, now, 1000, "c"),
+        }
+        plan = orderRequests(requests, stakeBoxes, 3, now)
+        # Oldest stakes first, adds before unstakes, b awaits a compound and c does not hold enough
+        assert [r.proxyInput.boxId for r in plan.ordered] == ["s2", "s1", "a1", "u1"]
+        assert [r.proxyInput.boxId for r in plan.deferred] == ["a2", "u2", "u3"]
+        assert [r.proxyInput.boxId for r in plan.expired] == ["s3"]
+
+    def test_chain(self):
+        sequencer = FakeSequencer(self.config, {"key": StakeInput("stake1", 5000)})
+        proxies = [self.unstakeProxy("p1", "key", 2000), self.stakeProxy("p2", 3000, now), self.addStakeProxy("p3", "key", 1000)]
+        result = sequencer.run(stakeStateBox("stakeState"), proxies)
+        assert result.txIds == ["tx1", "tx2", "tx3"]
+        assert [r.boxId for r in result.processed] == ["p2", "p3", "p1"]
+        assert result.stakeStateOutput.boxId == "tx3-stakeState"
+        # The new stake key is the id of the stake state box the stake tx spent
+        assert {k: b.boxId for k, b in result.stakeOutputs.items()} == {"stakeState": "tx1-stake", "key": "tx3-stake"}
+
+    def test_rebuild_after_rejection(self):
+        sequencer = FakeSequencer(self.config, {"key": StakeInput("stake1", 5000)}, rejections=["tx2"], spent=["p3"])
+        proxies = [self.stakeProxy("p1", 3000, now), self.addStakeProxy("p2", "other", 1000), self.addStakeProxy("p3", "key", 1000), self.unstakeProxy("p4", "key", 2000)]
+        result = sequencer.run(stakeStateBox("stakeState"), proxies)
+        # The refunded p3 is dropped and the rest chained on top of tx1
+        assert sequencer.builds[1] == ("tx1-stakeState", ["p4"])
+        assert result.txIds == ["tx1", "tx4"]
+        assert [r.boxId for r in result.deferred] == ["p2"]
+
+    def test_stake_state_spent_elsewhere(self):
+        sequencer = FakeSequencer(self.config, {}, rejections=["tx1"], spent=["stakeState"])
+        with pytest.raises(ChainRejectedException):
+            sequencer.run(stakeStateBox("stakeState"), [self.stakeProxy("p1", 3000, now)])